@@ -7,13 +7,20 @@ from utils.parse.parse_non_AI import (
     get_schedule_entries,
 )
 from utils.parse.parse_AI import extract_availability_matrix
+from utils.schedule.alterations import EditRejected, ScheduleState, apply_bulk_edits
+from utils.schedule.availability import AvailabilityMatrix
+from utils.schedule.candidates import CoverageIndex
 from utils.schedule.scheduler import schedule_with_fallback_days_only
+from utils.schedule.solver import BATCH
 from utils.parse.parse_requests import process_note_against_schedule
 import asyncio
 import calendar
 from io import StringIO  # ✅ for in-memory CSV
 import pickle
 import os
+import queue
+import threading
+import time
 
 saving_values = False
 using_preset = True
@@ -24,6 +31,10 @@ if not saving_values and using_preset:
             preload = pickle.load(f)
             for k, v in preload.items():
                 st.session_state[k] = v
+            # older snapshots pickled the availability as a list of lists
+            st.session_state["availability_matrix"] = AvailabilityMatrix.coerce(
+                st.session_state["availability_matrix"]
+            )
 
 
 def render_calendar():
@@ -110,6 +121,171 @@ def generate_calendar_html(schedule_entries, final_schedule):
     return html_blocks, color_map
 
 
+def save_schedule_state(result, schedule_df, schedule_entries):
+    """
+    Stores a (possibly intermediate) ScheduleResult in session state:
+    calendar, assignments and the moonlighting export.
+    """
+    final_schedule, assignments_by_emp, uncovered = result
+
+    if result.has_solution:
+        st.session_state["solver_summary"] = (
+            f"Solver status: {result.status} · objective {result.objective:,.0f} · "
+            f"best bound {result.best_bound:,.0f} · {result.wall_time:.1f}s"
+        )
+    else:
+        st.session_state["solver_summary"] = (
+            f"⚠️ Solver returned {result.status} after {result.wall_time:.1f}s — no schedule was found."
+        )
+
+    calendar_html_blocks, color_map = generate_calendar_html(schedule_entries, final_schedule)
+    st.session_state["calendar_html_blocks"] = calendar_html_blocks
+    st.session_state["color_map"] = color_map
+    st.session_state["assignments_by_emp"] = assignments_by_emp
+    st.session_state["final_schedule"] = final_schedule
+    save_moonlighting_export(schedule_df, schedule_entries, final_schedule, uncovered)
+
+
+def save_moonlighting_export(schedule_df, schedule_entries, final_schedule, uncovered):
+    """
+    Stores the moonlighting CSV (the uncovered rows of *schedule_df*, with
+    suggested coverers) for the current schedule in session state.
+    """
+    st.session_state["schedule_df"] = schedule_df
+    if uncovered:
+        # up to three radiologists who could still pick up each open shift
+        coverage = CoverageIndex(
+            st.session_state["employee_names"], schedule_entries,
+            st.session_state["availability_matrix"], st.session_state["monthly_caps"], final_schedule
+        )
+        suggestions = {
+            (s["date"].strftime("%Y-%m-%d"), s["shift"]): ", ".join(c.name for c in coverage.candidates(s, limit=3))
+            for s in uncovered
+        }
+        keys = list(zip(schedule_df["Date"], schedule_df["Shift"]))
+        uncovered_df = schedule_df[[key in suggestions for key in keys]].assign(
+            Suggested_Coverers=[suggestions[key] for key in keys if key in suggestions]
+        )
+        csv_buffer = StringIO()
+        uncovered_df.to_csv(csv_buffer, index=False)
+        st.session_state["moon_csv"] = csv_buffer.getvalue()
+        st.session_state["moon_ready"] = True
+    else:
+        st.session_state["moon_ready"] = False
+
+
+def current_schedule_df():
+    """
+    The uploaded scheduling CSV, or its Date / Shift columns rebuilt from
+    schedule_entries for sessions preloaded without it.
+    """
+    if "schedule_df" in st.session_state:
+        return st.session_state["schedule_df"]
+    schedule_entries = st.session_state["schedule_entries"]
+    return pd.DataFrame({
+        "Date": [se["date"].strftime("%Y-%m-%d") for se in schedule_entries],
+        "Shift": [se["shift"] for se in schedule_entries],
+    })
+
+
+# ScheduleState attribute → the session_state key it must be built over
+STATE_KEYS = {
+    "final_schedule": "final_schedule",
+    "assignments_by_emp": "assignments_by_emp",
+    "schedule_entries": "schedule_entries",
+    "availability_matrix": "availability_matrix",
+    "requested_shift_map": "requested_shift_map",
+    "monthly_caps": "monthly_caps",
+    "employees": "employee_names",
+}
+
+
+def current_schedule_state():
+    """
+    The ScheduleState over the session's schedule, kept in session state so
+    Step 2 notes skip its O(slots) build.  Rebuilt once any of its objects
+    has been replaced (a new schedule, a bulk edit batch or a re-solve).
+    """
+    state = st.session_state.get("schedule_state")
+    if state is None or any(getattr(state, attr) is not st.session_state[key] for attr, key in STATE_KEYS.items()):
+        final_schedule = st.session_state["final_schedule"]
+        schedule_entries = st.session_state["schedule_entries"]
+        state = ScheduleState(
+            final_schedule,
+            st.session_state["assignments_by_emp"],
+            [se for se, name in zip(schedule_entries, final_schedule) if name is None],
+            schedule_entries,
+            st.session_state["availability_matrix"],
+            st.session_state["requested_shift_map"],
+            st.session_state["monthly_caps"],
+            st.session_state["employee_names"],
+        )
+        st.session_state["schedule_state"] = state
+    return state
+
+
+def run_scheduler_streaming(schedule_df, employee_names, schedule_entries, *args, **kwargs):
+    """
+    Runs the scheduler on a worker thread and re-renders the calendar for every
+    improving solution.  "Use this schedule" keeps the latest one and stops the search.
+
+    The final result is saved to session state as soon as the worker ends,
+    before any st.* call: a pending "Use this schedule" rerun fires at the
+    next st.* call and would otherwise drop it.
+    """
+    updates = queue.Queue()
+    stop_event = threading.Event()
+    outcome = []
+    drawn = []
+
+    def on_solution(progress):
+        updates.put(progress)
+        return stop_event.is_set()
+
+    worker = threading.Thread(
+        target=lambda: outcome.append(schedule_with_fallback_days_only(
+            employee_names, schedule_entries, *args,
+            progress_callback=on_solution, stop_event=stop_event, **kwargs
+        )),
+        daemon=True,
+    )
+
+    st.button("✅ Use this schedule", key="use_partial_schedule")
+    ticker = st.empty()
+    live = st.empty()
+    started = time.monotonic()
+    worker.start()
+    try:
+        while worker.is_alive() or not updates.empty():
+            try:
+                progress = updates.get(timeout=0.25)
+            except queue.Empty:
+                # an st.* call every tick, so a click interrupts the loop within ~0.25 s
+                ticker.caption(f"⏱️ Searching… {time.monotonic() - started:.1f}s")
+                continue
+            while not updates.empty():  # only draw the newest solution
+                progress = updates.get_nowait()
+            save_schedule_state(progress, schedule_df, schedule_entries)
+            drawn.append(progress)
+            with live.container():
+                st.caption(
+                    f"Best so far: objective {progress.objective:,.0f} "
+                    f"(bound {progress.best_bound:,.0f}) after {progress.wall_time:.1f}s"
+                )
+                for html in st.session_state["calendar_html_blocks"]:
+                    st.components.v1.html(html, height=600, scrolling=False)
+    finally:
+        # A click on "Use this schedule" interrupts this run: stop the solver
+        # and keep whatever it finished with (session state only, no st.* call).
+        stop_event.set()
+        worker.join()
+        if outcome and (outcome[0].has_solution or not drawn):
+            save_schedule_state(outcome[0], schedule_df, schedule_entries)
+    ticker.empty()
+    live.empty()
+    return outcome[0]
+
+
 # App Config
 st.set_page_config(page_title="Radiologist Shift Scheduler", layout="wide")
 st.title("Radiologist Shift Scheduling App")
@@ -138,26 +314,19 @@ if scheduling_csv and radiologist_csv:
         employee_names, monthly_caps = get_employee_names_and_caps(radiologist_df, start_date, end_date)
 
         with st.spinner("Extracting availability and requests..."):
+            call_counts, parsed_locally = {}, []
             availability_matrix, requested_shift_map = asyncio.run(
-                extract_availability_matrix(radiologist_df, start_date, end_date)
+                extract_availability_matrix(radiologist_df, start_date, end_date,
+                                            call_counts=call_counts, parsed_locally=parsed_locally,
+                                            schedule_entries=schedule_entries)
             )
+        st.caption(
+            f"⚡ {len(parsed_locally)} of {len(call_counts)} notes parsed locally · "
+            f"📡 {sum(call_counts.values())} agent calls "
+            f"(max {max(call_counts.values(), default=0)} per radiologist)"
+        )
 
-        with st.spinner("Running scheduler..."):
-            final_schedule, assignments_by_emp, uncovered = schedule_with_fallback_days_only(
-                employee_names,
-                schedule_entries,
-                availability_matrix,
-                monthly_caps,
-                requested_shift_map=requested_shift_map,
-            )
-
-        calendar_html_blocks, color_map = generate_calendar_html(schedule_entries, final_schedule)
-
-        # ✅ Save in session state to persist across reruns
-        st.session_state["calendar_html_blocks"] = calendar_html_blocks
-        st.session_state["color_map"] = color_map
-        st.session_state["assignments_by_emp"] = assignments_by_emp
-        st.session_state["final_schedule"] = final_schedule
+        # ✅ Save inputs in session state first, so an early "Use this schedule" keeps them
         st.session_state["schedule_entries"] = schedule_entries
         st.session_state["employee_names"] = employee_names
         st.session_state["monthly_caps"] = monthly_caps
@@ -165,19 +334,19 @@ if scheduling_csv and radiologist_csv:
         st.session_state["requested_shift_map"] = requested_shift_map
         st.session_state["start_date"] = start_date
 
-        if uncovered:
-            uncovered_df = schedule_df[
-                schedule_df.apply(lambda row: any(
-                    row["Date"] == s["date"].strftime("%Y-%m-%d") and row["Shift"] == s["shift"]
-                    for s in uncovered
-                ), axis=1)
-            ]
-            csv_buffer = StringIO()
-            uncovered_df.to_csv(csv_buffer, index=False)
-            st.session_state["moon_csv"] = csv_buffer.getvalue()
-            st.session_state["moon_ready"] = True
-        else:
-            st.session_state["moon_ready"] = False
+        with st.spinner("Running scheduler..."):
+            result = run_scheduler_streaming(
+                schedule_df,
+                employee_names,
+                schedule_entries,
+                availability_matrix,
+                monthly_caps,
+                requested_shift_map=requested_shift_map,
+                # one streamed model: the per-month process pool (decompose_months)
+                # reports no progress and ignores the stop button
+                config=BATCH,
+            )
+        # run_scheduler_streaming has already saved the result to session state
         if saving_values:
             snapshot = {
                 "calendar_html_blocks": st.session_state["calendar_html_blocks"],
@@ -191,7 +360,8 @@ if scheduling_csv and radiologist_csv:
                 "requested_shift_map": st.session_state["requested_shift_map"],
                 "start_date": st.session_state["start_date"],
                 "moon_ready": st.session_state["moon_ready"],
-                "moon_csv": st.session_state["moon_csv"]
+                "moon_csv": st.session_state["moon_csv"],
+                "schedule_df": st.session_state["schedule_df"],
             }
 
             with open("preload_state.pkl", "wb") as f:
@@ -200,6 +370,8 @@ if scheduling_csv and radiologist_csv:
 
 # 🔁 Re-render saved output after rerun (e.g. after clicking download)
 if "calendar_html_blocks" in st.session_state:
+    if st.session_state.get("solver_summary"):
+        st.caption(st.session_state["solver_summary"])
     render_calendar()
 
     if st.session_state.get("moon_ready"):
@@ -222,9 +394,21 @@ if "calendar_html_blocks" in st.session_state:
     st.header("Step 2: Make Final Edits")
     name_input = st.text_input("Requestor Name", key="edit_name")
     note_input = st.text_area("Natural Language Request", key="edit_request", height=150)
+    if "last_routing" in st.session_state:
+        routing = st.session_state["last_routing"]
+        st.caption(
+            f"🧭 Last note ran {', '.join(routing['intents']) or 'no'} agents; "
+            f"skipped {', '.join(routing['skipped']) or 'none'} ({routing['source']})"
+        )
+    edit_report = st.session_state.get("last_edit_report", {})
+    if edit_report.get("skipped"):
+        st.warning("⚠️ Edits not applied:\n" + "\n".join(f"- {line}" for line in edit_report["skipped"]))
+    if edit_report.get("warnings"):
+        st.warning("⚠️ Applied with warnings:\n" + "\n".join(f"- {line}" for line in edit_report["warnings"]))
 
     if name_input.strip() and note_input.strip() and st.button("Submit"):
         with st.spinner("Processing request..."):
+            routing, edit_report = {}, {}
             result = asyncio.run(
                 process_note_against_schedule(
                     note_input,
@@ -235,13 +419,18 @@ if "calendar_html_blocks" in st.session_state:
                     st.session_state["requested_shift_map"],
                     st.session_state["monthly_caps"],
                     st.session_state["schedule_entries"],
-                    st.session_state["final_schedule"]
+                    st.session_state["final_schedule"],
+                    routing=routing,
+                    edit_report=edit_report,
+                    state=current_schedule_state(),
                 )
             )
+            st.session_state["last_routing"] = routing
+            st.session_state["last_edit_report"] = edit_report
             (
                 new_final,
                 new_by_emp,
-                _,
+                new_uncovered,
                 new_availability,
                 new_requested_map,
                 new_caps,
@@ -261,5 +450,42 @@ if "calendar_html_blocks" in st.session_state:
             st.session_state["calendar_html_blocks"], st.session_state["color_map"] = generate_calendar_html(
                 st.session_state["schedule_entries"], new_final
             )
-            st.success("✅ Update successful. Schedule refreshed.")
-            st.rerun()  # 🚀 Force a clean refresh of the interface
\ No newline at end of file
+            save_moonlighting_export(current_schedule_df(), st.session_state["schedule_entries"], new_final,
+                                     new_uncovered)
+            if edit_report.get("skipped"):
+                st.warning("⚠️ Schedule refreshed, but some edits were not applied.")
+            else:
+                st.success("✅ Update successful. Schedule refreshed.")
+            st.rerun()  # 🚀 Force a clean refresh of the interface
+
+    st.subheader("Bulk Edits")
+    bulk_csv = st.file_uploader(
+        "Upload Edits CSV (action, radiologist, r1, r2, date, shift)", type=["csv"], key="bulk_edits_csv"
+    )
+    if bulk_csv and st.button("Apply All Edits"):
+        schedule_entries = st.session_state["schedule_entries"]
+        final_schedule = list(st.session_state["final_schedule"])
+        try:
+            new_final, new_by_emp, new_uncovered = apply_bulk_edits(
+                bulk_csv,
+                final_schedule,
+                st.session_state["assignments_by_emp"],
+                [se for se, name in zip(schedule_entries, final_schedule) if name is None],
+                schedule_entries,
+                st.session_state["availability_matrix"],
+                st.session_state["requested_shift_map"],
+                st.session_state["monthly_caps"],
+                st.session_state["employee_names"],
+            )
+        except EditRejected as e:
+            st.error(f"❌ No edits applied. {e}")
+        else:
+            # one calendar and moonlighting export refresh for the whole batch
+            st.session_state["final_schedule"] = new_final
+            st.session_state["assignments_by_emp"] = new_by_emp
+            st.session_state["calendar_html_blocks"], st.session_state["color_map"] = generate_calendar_html(
+                schedule_entries, new_final
+            )
+            save_moonlighting_export(current_schedule_df(), schedule_entries, new_final, new_uncovered)
+            st.success("✅ All edits applied. Schedule refreshed.")
+            st.rerun()
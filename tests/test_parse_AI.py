@@ -0,0 +1,465 @@
+# tests/test_parse_AI.py
+
+import asyncio
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+from unittest import mock
+
+import pandas as pd
+
+from agents import Agent
+
+from utils.parse import agent_cache, parse_AI
+from utils.parse.agent_cache import AgentCache, CachedRunner
+from utils.parse.availability_rules import (
+    AvailabilityRules, DateRule, RequestedShift, WeekdayRule,
+    compile_availability, compile_availability_matrix,
+)
+from utils.parse.parse_non_AI import parse_note_locally
+from utils.parse.throttle import CallLimiter
+
+# ------------------------------------------------------------------------- #
+#  Helpers
+# ------------------------------------------------------------------------- #
+START, END = date(2025, 7, 1), date(2025, 7, 10)          # 10 days → 4 chunks
+PROFILES_CSV = os.path.join(os.path.dirname(__file__), "..", "data", "radiologist_profiles.csv")
+
+
+def make_roster(n):
+    return pd.DataFrame({
+        "Radiologist_ID": [f"Rad_{i}" for i in range(n)],
+        "Notes": [f"note {i}" for i in range(n)],
+    })
+
+
+class FakeAgents:
+    """
+    Stands in for the two LLM extractors.  Each chunk answers with the
+    radiologist's number in every position after a delay that shrinks as
+    the chunk moves later, so calls finish out of order.
+    """
+
+    def __init__(self, short_first=0):
+        self.in_flight = 0
+        self.peak = 0
+        self.chunk_calls = 0
+        self.short_first = short_first       # this many calls answer one value / day short
+        self.windows = []
+
+    async def chunk(self, note, cs, ce, shifts=parse_AI.SHIFTS):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        self.chunk_calls += 1
+        await asyncio.sleep(0.02 * (END - cs).days / 10)
+        self.in_flight -= 1
+        value = int(note.split()[-1]) % 2
+        n = ((ce - cs).days + 1) * len(shifts)
+        if self.short_first:
+            self.short_first -= 1
+            n -= 1
+        return [value] * n
+
+    async def window(self, note, ws, we, shifts=parse_AI.SHIFTS):
+        self.chunk_calls += 1
+        self.windows.append((ws, we))
+        await asyncio.sleep(0)
+        days = [ws + timedelta(days=i) for i in range((we - ws).days + 1)]
+        if self.short_first:
+            self.short_first -= 1
+            days = days[1:]
+        value = int(note.split()[-1]) % 2
+        window = parse_AI.WindowAvailability(days=[
+            parse_AI.DayAvailability(date=d.isoformat(), available=[value] * len(shifts)) for d in days
+        ])
+        return parse_AI.window_to_list(window, ws, we, shifts)
+
+    async def rules(self, note, start, end, shifts=parse_AI.SHIFTS):
+        self.chunk_calls += 1
+        self.windows.append((start, end))
+        await asyncio.sleep(0)
+        if self.short_first:
+            self.short_first -= 1
+            return AvailabilityRules(default_available=True, weekday_rules=[WeekdayRule(weekdays=[7], available=False)])
+        return AvailabilityRules(default_available=bool(int(note.split()[-1]) % 2))
+
+    async def requests(self, note, schedule_entries):
+        await asyncio.sleep(0.01)
+        i = int(note.split()[-1])
+        return [{"date": (START + timedelta(days=i)).isoformat(), "shift": "L2"}]
+
+
+def run_extraction(fake, roster, **kwargs):
+    kwargs.setdefault("mode", "chunk")
+    with mock.patch.object(agent_cache, "_default_runner", CachedRunner()), \
+         mock.patch.object(parse_AI, "extract_availability_chunk", fake.chunk), \
+         mock.patch.object(parse_AI, "extract_availability_window", fake.window), \
+         mock.patch.object(parse_AI, "extract_availability_rules", fake.rules), \
+         mock.patch.object(parse_AI, "extract_requested_shifts", fake.requests):
+        return asyncio.run(parse_AI.extract_availability_matrix(roster, START, END, **kwargs))
+
+
+# ------------------------------------------------------------------------- #
+#  Concurrent extraction
+# ------------------------------------------------------------------------- #
+def test_concurrent_extraction_keeps_roster_and_chunk_order():
+    fake = FakeAgents()
+    availability, requests = run_extraction(fake, make_roster(5), max_concurrency=6)
+
+    assert availability.shape == (5, 30)
+    assert [row.tolist() for row in availability] == [[i % 2] * 30 for i in range(5)]
+    assert requests == {(i, START + timedelta(days=i), "L2"): 1 for i in range(5)}
+    assert fake.chunk_calls == 5 * 4
+    assert 1 < fake.peak <= 6
+
+
+def test_short_chunk_is_retried_on_its_own():
+    fake = FakeAgents(short_first=1)
+    availability, _ = run_extraction(fake, make_roster(1), max_concurrency=1)
+
+    assert availability.tolist() == [[0] * 30]
+    assert fake.chunk_calls == 4 + 1
+
+
+# ------------------------------------------------------------------------- #
+#  Horizon-sized windows
+# ------------------------------------------------------------------------- #
+def test_month_windows_follow_calendar_months():
+    windows = parse_AI.availability_windows(date(2025, 6, 20), date(2025, 8, 3), mode="month")
+    assert windows == [
+        (date(2025, 6, 20), date(2025, 6, 30)),
+        (date(2025, 7, 1), date(2025, 7, 31)),
+        (date(2025, 8, 1), date(2025, 8, 3)),
+    ]
+
+
+def test_adaptive_windows_fit_token_budget():
+    per_day = parse_AI.DAY_ENTRY_TOKENS + parse_AI.TOKENS_PER_SHIFT * 4
+    windows = parse_AI.availability_windows(START, END, mode="adaptive", num_shifts=4,
+                                            token_budget=per_day * 4)
+    assert [(ws.day, we.day) for ws, we in windows] == [(1, 4), (5, 8), (9, 10)]
+
+
+def test_month_mode_uses_one_call_per_radiologist_month():
+    fake = FakeAgents()
+    call_counts = {}
+    availability, _ = run_extraction(fake, make_roster(3), mode="month", call_counts=call_counts)
+
+    assert [row.tolist() for row in availability] == [[i % 2] * 30 for i in range(3)]
+    assert fake.windows == [(START, END)] * 3
+    assert call_counts == {f"Rad_{i}": 1 + 1 for i in range(3)}     # window + requests
+
+
+def test_window_with_missing_day_is_retried_and_counted():
+    fake = FakeAgents(short_first=1)
+    call_counts = {}
+    availability, _ = run_extraction(fake, make_roster(1), mode="month", call_counts=call_counts)
+
+    assert availability.tolist() == [[0] * 30]
+    assert fake.chunk_calls == 2
+    assert call_counts == {"Rad_0": 2 + 1}
+
+
+def test_window_shift_count_is_not_fixed_to_three():
+    shifts = ("Early", "Late")
+    fake = FakeAgents()
+    availability, _ = run_extraction(fake, make_roster(2), mode="month", shifts=shifts)
+    assert availability.shape == (2, 10 * 2)
+
+    bad = parse_AI.WindowAvailability(days=[parse_AI.DayAvailability(date="2025-07-01", available=[1, 1, 1])])
+    try:
+        parse_AI.window_to_list(bad, START, START, shifts)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("three values for two shifts should be rejected")
+
+
+# ------------------------------------------------------------------------- #
+#  Availability rules
+# ------------------------------------------------------------------------- #
+def test_rules_compile_in_layer_order():
+    entries = parse_AI.window_entries(START, END)          # 2025-07-01 is a Tuesday
+    rules = AvailabilityRules(
+        default_available=True,
+        weekday_rules=[WeekdayRule(weekdays=[5, 6], available=False)],           # no weekends
+        date_rules=[
+            DateRule(start="2025-07-02", end="2025-07-02", shifts=["L1", "L3"], available=False),
+            DateRule(start="2025-07-08", end="2025-07-10", available=False),
+        ],
+        requests=[RequestedShift(date="2025-07-06", shift="L2"),                # a Sunday
+                  RequestedShift(date="2025-07-09", shift="L1")],
+    )
+    row = compile_availability(rules, entries)
+
+    by_day = [row[i:i + 3].tolist() for i in range(0, len(row), 3)]
+    assert by_day == [
+        [1, 1, 1], [0, 1, 0], [1, 1, 1], [1, 1, 1],          # Tue–Fri
+        [0, 0, 0], [0, 1, 0],                                # Sat, Sun + request
+        [1, 1, 1],                                           # Mon
+        [0, 0, 0], [1, 0, 0], [0, 0, 0],                     # range + request
+    ]
+
+
+def test_rules_size_is_independent_of_horizon():
+    rules = AvailabilityRules(default_available=False,
+                              weekday_rules=[WeekdayRule(weekdays=[0], shifts=["L2"], available=True)])
+    year = parse_AI.window_entries(date(2025, 1, 1), date(2025, 12, 31))
+    matrix = compile_availability_matrix([rules, AvailabilityRules(default_available=True)], year)
+
+    assert matrix.shape == (2, 365 * 3)
+    assert matrix[0].sum() == sum(1 for e in year if e["date"].weekday() == 0 and e["shift"] == "L2")
+    assert matrix[1].sum() == 365 * 3
+
+
+def test_bad_rules_are_rejected():
+    entries = parse_AI.window_entries(START, END)
+    for rules in (
+        AvailabilityRules(default_available=True, weekday_rules=[WeekdayRule(weekdays=[7], available=False)]),
+        AvailabilityRules(default_available=True, date_rules=[DateRule(start="July 2", end="2025-07-02", available=False)]),
+        AvailabilityRules(default_available=True, date_rules=[DateRule(start="2025-07-05", end="2025-07-02", available=False)]),
+    ):
+        try:
+            compile_availability(rules, entries)
+        except ValueError:
+            continue
+        raise AssertionError(f"{rules} should be rejected")
+
+
+def test_rules_mode_uses_one_availability_call_per_radiologist():
+    fake = FakeAgents(short_first=1)
+    call_counts = {}
+    availability, _ = run_extraction(fake, make_roster(3), mode="rules",
+                                     max_concurrency=1, call_counts=call_counts)
+
+    assert [row.tolist() for row in availability] == [[i % 2] * 30 for i in range(3)]
+    assert fake.windows == [(START, END)] * 4                # one retry after the bad weekday
+    assert sum(call_counts.values()) == 3 + 1 + 3
+
+
+# ------------------------------------------------------------------------- #
+#  Agent call cache
+# ------------------------------------------------------------------------- #
+class FakeRunner:
+    """Replaces agents.Runner: echoes the input after a short delay, counting calls."""
+    calls = 0
+
+    @classmethod
+    async def run(cls, agent, input_text):
+        cls.calls += 1
+        await asyncio.sleep(0.01)
+        if agent.output_type is AvailabilityRules:
+            return mock.Mock(final_output=AvailabilityRules(default_available="no" not in input_text))
+        return mock.Mock(final_output=f"{agent.name}: {input_text}")
+
+
+def run_cached(runner, agent, inputs, check=None):
+    async def run_all():
+        return await asyncio.gather(*(runner.run(agent, text, check=check) for text in inputs))
+    FakeRunner.calls = 0
+    with mock.patch.object(agent_cache, "Runner", FakeRunner):
+        return [r.final_output for r in asyncio.run(run_all())]
+
+
+def test_cache_dedups_in_run_and_persists_across_runs():
+    agent = Agent(name="Echo", instructions="echo", model="gpt-4o")
+    notes = ["Cannot cover Friday, Saturday, or Sunday shifts."] * 5 + ["Any shift"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "calls.sqlite")
+        first = CachedRunner(AgentCache(path))
+        assert run_cached(first, agent, notes) == [f"Echo: {n}" for n in notes]
+        assert FakeRunner.calls == 2
+        assert first.stats() == {"calls": 2, "hits": 0, "shared": 4}
+
+        again = CachedRunner(AgentCache(path))            # a fresh process, same disk cache
+        assert run_cached(again, agent, notes) == [f"Echo: {n}" for n in notes]
+        assert FakeRunner.calls == 0
+        assert again.hits == 6
+
+        edited = Agent(name="Echo", instructions="echo, politely", model="gpt-4o")
+        run_cached(again, edited, notes[:1])
+        assert FakeRunner.calls == 1                       # new instructions, new key
+
+
+def test_cache_round_trips_structured_output_and_skips_rejected_results():
+    runner = CachedRunner(AgentCache(":memory:"))
+    [rules] = run_cached(runner, parse_AI.availability_rules_agent, ["no weekends"])
+    [again] = run_cached(runner, parse_AI.availability_rules_agent, ["no weekends"])
+    assert isinstance(again, AvailabilityRules) and again == rules
+    assert FakeRunner.calls == 0
+
+    def reject(output):
+        raise ValueError("bad output")
+
+    agent = Agent(name="Echo", instructions="echo", model="gpt-4o")
+    for _ in range(2):
+        try:
+            run_cached(runner, agent, ["note"], check=reject)
+        except ValueError:
+            pass
+        assert FakeRunner.calls == 1                       # never served from the cache
+
+
+def test_cache_evicts_by_age_and_size():
+    cache = AgentCache(":memory:", max_entries=3, max_age_days=1)
+    agent = Agent(name="Echo", instructions="echo")
+    for i in range(5):
+        cache.put(f"k{i}", agent, f"v{i}")
+    cache.get("k0", agent)                                 # recently used survives
+    cache.evict()
+    assert len(cache) == 3
+    assert cache.get("k0", agent).final_output == "v0"
+
+    with mock.patch.object(agent_cache.time, "time", return_value=time.time() + 2 * 86400):
+        assert cache.get("k0", agent) is None
+        cache.evict()
+    assert len(cache) == 0
+
+
+# ------------------------------------------------------------------------- #
+#  Fast-path note parser
+# ------------------------------------------------------------------------- #
+def test_profile_notes_take_the_fast_path():
+    roster = pd.read_csv(PROFILES_CSV)
+    fake = FakeAgents()
+    call_counts, parsed_locally = {}, []
+    availability, requests = run_extraction(
+        fake, roster, mode="rules", call_counts=call_counts, parsed_locally=parsed_locally
+    )
+
+    assert fake.chunk_calls == 0
+    assert set(call_counts.values()) == {0}
+    assert parsed_locally == list(roster["Radiologist_ID"])
+
+    slot = {(e["date"], e["shift"]): s for s, e in enumerate(parse_AI.window_entries(START, END))}
+    a, c, g = availability[0], availability[2], availability[6]
+    assert a[slot[date(2025, 7, 4), "L2"]] == 0                    # Friday, "Weekday Only"
+    assert c[slot[date(2025, 7, 6), "L2"]] == 1                    # Sunday, "Weekday + Sunday"
+    assert c[slot[date(2025, 7, 7), "L3"]] == 0                    # Unavailable on July 7
+    assert g[slot[date(2025, 7, 2), "L1"]] == 0 and g[slot[date(2025, 7, 2), "L3"]] == 1
+    assert (2, date(2025, 7, 5), "L1") in requests                 # "Requesting July 5."
+    assert c[slot[date(2025, 7, 5), "L1"]] == 1                    # request beats the Saturday block
+
+
+def test_unparsed_notes_fall_back_to_agents():
+    roster = pd.DataFrame({
+        "Radiologist_ID": ["Rad_0", "Rad_1", "Rad_2"],
+        "Availability_Constraint": ["Any Shift", "Any Shift", "Weekday Only"],
+        "Notes": ["Unavailable on 7/3, L3.", "Prefers mornings, note 1", "Requesting 2025-07-08, L1 and L2."],
+    })
+    fake = FakeAgents()
+    call_counts, parsed_locally = {}, []
+    availability, requests = run_extraction(
+        fake, roster, mode="rules", call_counts=call_counts, parsed_locally=parsed_locally
+    )
+
+    assert parsed_locally == ["Rad_0", "Rad_2"]
+    assert call_counts == {"Rad_0": 0, "Rad_1": 2, "Rad_2": 0}
+    assert availability[1].tolist() == [1] * 30
+    assert availability[0].tolist().count(0) == 1
+    assert {k for k in requests if k[0] == 2} == {(2, date(2025, 7, 8), "L1"), (2, date(2025, 7, 8), "L2")}
+
+
+def test_availability_constraint_applies_to_agent_rows():
+    roster = pd.DataFrame({
+        "Radiologist_ID": ["Rad_0"],
+        "Availability_Constraint": ["Weekday Only"],
+        "Notes": ["Prefers mornings, note 5"],                 # agents: free everywhere, asks July 6 L2
+    })
+    availability, requests = run_extraction(FakeAgents(), roster, mode="rules")
+
+    slot = {(e["date"], e["shift"]): s for s, e in enumerate(parse_AI.window_entries(START, END))}
+    row = availability[0]
+    assert (0, date(2025, 7, 6), "L2") in requests
+    assert row[slot[date(2025, 7, 4), "L1"]] == row[slot[date(2025, 7, 5), "L3"]] == 0   # Fri, Sat
+    assert row[slot[date(2025, 7, 6), "L1"]] == 0 and row[slot[date(2025, 7, 6), "L2"]] == 1
+    assert row[slot[date(2025, 7, 7), "L1"]] == 1
+    assert row.tolist().count(0) == 3 * 3 - 1                     # Fri–Sun, less the request
+
+
+def test_rows_follow_the_uploaded_schedule_entries():
+    # no L3 at weekends, and a one-shift July 8
+    schedule_entries = [
+        {"date": START + timedelta(days=i), "shift": shift}
+        for i in range(10) for shift in ("L1", "L2", "L3")
+        if not ((START + timedelta(days=i)).weekday() >= 5 and shift == "L3")
+        and not (i == 7 and shift != "L1")
+    ]
+    roster = pd.DataFrame({
+        "Radiologist_ID": ["Rad_0", "Rad_1"],
+        "Availability_Constraint": ["Any Shift", "Weekday Only"],
+        "Notes": ["Unavailable on July 8.", "Prefers mornings, note 1"],
+    })
+    slot = {(e["date"], e["shift"]): s for s, e in enumerate(schedule_entries)}
+
+    for mode in ("rules", "chunk"):
+        availability, _ = run_extraction(FakeAgents(), roster, mode=mode, schedule_entries=schedule_entries)
+
+        assert availability.num_slots == len(schedule_entries) == 26
+        assert availability[0].tolist().count(0) == 1 and availability[0][slot[date(2025, 7, 8), "L1"]] == 0
+        assert availability[1].tolist().count(0) == 3 + 2 + 2                 # Fri 3 slots, Sat/Sun 2 each
+        assert availability[1][slot[date(2025, 7, 8), "L1"]] == 1
+
+
+def test_fast_path_rejects_anything_unfamiliar():
+    for note, constraint in [
+        ("Cannot cover Fridays.", "Weekends Only"),                # unknown constraint
+        ("Cannot cover holidays.", "Any Shift"),                   # unknown weekday
+        ("Unavailable on July 2 L4.", "Any Shift"),                # unknown shift
+        ("Unavailable on Julember 2.", "Any Shift"),               # unknown month
+        ("Can cover any shift. Would rather not work nights.", None),
+    ]:
+        assert parse_note_locally(note, constraint, START, END) is None, note
+
+    rules = parse_note_locally("Cannot cover Saturdays or Sundays. Unavailable for Jul 3rd L1.", "", START, END)
+    assert rules.weekday_rules[0].weekdays == [5, 6]
+    assert rules.date_rules[0].start == "2025-07-03" and rules.date_rules[0].shifts == ["L1"]
+
+    notes = list(pd.read_csv(PROFILES_CSV)["Notes"]) * 100
+    started = time.perf_counter()
+    for note in notes:
+        parse_note_locally(note, "Weekday Only", START, END)
+    assert (time.perf_counter() - started) / len(notes) < 1e-3
+
+
+def test_call_limiter_spaces_calls_by_rate():
+    async def burst(limiter, n):
+        async def call():
+            async with limiter:
+                await asyncio.sleep(0)
+        await asyncio.gather(*(call() for _ in range(n)))
+
+    async def timed():
+        limiter = CallLimiter(max_concurrency=10, calls_per_second=40, burst=1)
+        started = time.perf_counter()
+        await burst(limiter, 9)
+        return time.perf_counter() - started, limiter.calls
+
+    elapsed, calls = asyncio.run(timed())
+    assert calls == 9
+    assert elapsed >= 8 / 40 * 0.9
+
+
+if __name__ == "__main__":
+    test_concurrent_extraction_keeps_roster_and_chunk_order()
+    test_short_chunk_is_retried_on_its_own()
+    test_month_windows_follow_calendar_months()
+    test_adaptive_windows_fit_token_budget()
+    test_month_mode_uses_one_call_per_radiologist_month()
+    test_window_with_missing_day_is_retried_and_counted()
+    test_window_shift_count_is_not_fixed_to_three()
+    test_rules_compile_in_layer_order()
+    test_rules_size_is_independent_of_horizon()
+    test_bad_rules_are_rejected()
+    test_rules_mode_uses_one_availability_call_per_radiologist()
+    test_cache_dedups_in_run_and_persists_across_runs()
+    test_cache_round_trips_structured_output_and_skips_rejected_results()
+    test_cache_evicts_by_age_and_size()
+    test_profile_notes_take_the_fast_path()
+    test_unparsed_notes_fall_back_to_agents()
+    test_availability_constraint_applies_to_agent_rows()
+    test_rows_follow_the_uploaded_schedule_entries()
+    test_fast_path_rejects_anything_unfamiliar()
+    test_call_limiter_spaces_calls_by_rate()
@@ -1,18 +1,24 @@
 from datetime import date, timedelta, datetime
 from utils.schedule.scheduler import schedule_with_fallback_days_only
 from utils.schedule.alterations import (
+    ScheduleState,
     update_monthly_caps,
     build_availability_matrix_from_changes,
     update_requested_shifts,
     update_assigned_shifts
 )
+from utils.parse import intent, parse_AI, parse_requests
+from utils.parse import context as prompt_context
+from utils.parse.context import assignment_context, estimate_tokens, shift_context
 from utils.parse.parse_requests import (
     extract_monthly_cap_updates,
     get_availability_flips,
     get_requested_shifts,
     get_assignment_edits
 )
+from unittest import mock
 import asyncio
+import time
 
 # ------------------------------------------------------------------------- #
 # Helpers
@@ -33,6 +39,293 @@ def print_result(label, result):
         print(f"    {emp}: {len(slots)} slots -> {slot_strs}")
     print(f"  uncovered slots: {len(uncovered)}")
 
+# ------------------------------------------------------------------------- #
+# Concurrent Step 2 agents (agents mocked, no network)
+# ------------------------------------------------------------------------- #
+def test_note_agents_run_concurrently_and_apply_in_order():
+    start_date = date(2025, 7, 1)
+    schedule_entries = make_schedule_entries([start_date + timedelta(days=i) for i in range(7)])
+    radiologists = ["Rad_0", "Rad_1", "Rad_2"]
+    monthly_caps = {(i, "2025-07"): 5 for i in range(3)}
+    availability_matrix = [[1] * len(schedule_entries) for _ in radiologists]
+    final_schedule = [radiologists[s % 3] for s in range(len(schedule_entries))]   # one shift a day each
+    assignments_by_emp = {r: [e for e, held in zip(schedule_entries, final_schedule) if held == r]
+                          for r in radiologists}
+    july_3_l2 = final_schedule[2 * 3 + 1]
+
+    in_flight, peak, seen_names = 0, 0, []
+
+    def agent(output):
+        async def call(*args, **kwargs):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.05)
+            in_flight -= 1
+            return output
+        return call
+
+    async def caps(note, name, year, month, names):
+        seen_names.append(list(names))
+        return await agent([{"name": "Rad_3", "new_max": 2, "month": "2025-07"}])()
+
+    patches = {
+        "extract_monthly_cap_updates": caps,
+        "get_availability_flips": agent([{"name": "Rad_3", "flips": [
+            {"date": "2025-07-04", "shift": "L1", "available": False}]}]),
+        "get_requested_shifts": agent([{"name": "Rad_3", "action": "add", "shifts": [
+            {"date": "2025-07-05", "shift": "L2"}]}]),
+        "get_assignment_edits": agent([{"action": "swap", "r1": july_3_l2, "r2": "Rad_3",
+                                        "date": "2025-07-03", "shift": "L2"}]),
+    }
+    with mock.patch.multiple(parse_requests, **patches):
+        started = time.perf_counter()
+        result = asyncio.run(parse_requests.process_note_against_schedule(
+            "Max 2 shifts. Unavailable July 4 L1. Please give me July 5 L2. Swap my July 3 L2.",
+            "Rad_3", start_date, availability_matrix, assignments_by_emp, {},
+            monthly_caps, schedule_entries, final_schedule,
+        ))
+        elapsed = time.perf_counter() - started
+    final_schedule, assignments_by_emp, _, availability, requested, caps_after, names = result
+
+    assert peak == 4 and elapsed < 4 * 0.05
+    assert seen_names == [radiologists]                    # cap agent saw the roster before the update
+    assert names == radiologists + ["Rad_3"]
+    assert caps_after[(3, "2025-07")] == 2
+    assert availability[3][3 * 3] == 0                     # flip landed on the new row
+    assert requested[(3, date(2025, 7, 5), "L2")] == 1
+    assert final_schedule[2 * 3 + 1] == "Rad_3"            # edit applied last, to the new radiologist
+
+def test_router_skips_agents_a_note_does_not_need():
+    schedule_entries = make_schedule_entries([date(2025, 7, 1), date(2025, 7, 2)])
+    radiologists = ["Rad_0", "Rad_1"]
+    final_schedule = ["Rad_0", "Rad_1", None] * 2
+    assignments_by_emp = {r: [e for e, held in zip(schedule_entries, final_schedule) if held == r]
+                          for r in radiologists}
+    called = []
+
+    def agent(label, output):
+        async def call(*args, **kwargs):
+            called.append(label)
+            return output
+        return call
+
+    patches = {
+        "extract_monthly_cap_updates": agent("caps", [{"name": "Rad_0", "new_max": 3, "month": "2025-07"}]),
+        "get_availability_flips": agent("availability", []),
+        "get_requested_shifts": agent("requests", []),
+        "get_assignment_edits": agent("edits", [{"action": "remove", "radiologist": "Rad_0",
+                                                 "date": "2025-07-02", "shift": "L1"}]),
+    }
+    stats = intent.RouterStats()
+    routing = {}
+    with mock.patch.multiple(parse_requests, **patches), mock.patch.object(intent, "ROUTER_STATS", stats):
+        result = asyncio.run(parse_requests.process_note_against_schedule(
+            "My maximum for this month is three shifts", "Rad_0", date(2025, 7, 1),
+            [[1] * 6, [1] * 6], assignments_by_emp, {}, {(0, "2025-07"): 5, (1, "2025-07"): 5},
+            schedule_entries, final_schedule, routing=routing,
+        ))
+
+    assert called == ["caps"]
+    assert routing == {"intents": ["caps"], "skipped": ["availability", "requests", "edits"],
+                       "source": "keywords"}
+    assert result[5][(0, "2025-07")] == 3
+    assert stats.notes == 1 and stats.calls_per_note == 1.0
+
+
+def test_live_schedule_state_is_reused_across_notes():
+    schedule_entries = make_schedule_entries([date(2025, 7, 1), date(2025, 7, 2)])
+    radiologists = ["Rad_0", "Rad_1"]
+    final_schedule = ["Rad_0", "Rad_1", None] * 2
+    assignments_by_emp = {r: [e for e, held in zip(schedule_entries, final_schedule) if held == r]
+                          for r in radiologists}
+    monthly_caps = {(0, "2025-07"): 5, (1, "2025-07"): 5}
+    state = ScheduleState(final_schedule, assignments_by_emp, [schedule_entries[2], schedule_entries[5]],
+                          schedule_entries, [[1] * 6, [1] * 6], {}, monthly_caps, radiologists)
+    edits = iter([
+        [{"action": "add", "radiologist": "Rad_1", "date": "2025-07-01", "shift": "L3"}],
+        [{"action": "add", "radiologist": "Rad_2", "date": "2025-07-02", "shift": "L3"}],
+    ])
+
+    async def get_assignment_edits(*args):
+        return next(edits)
+
+    async def get_requested_shifts(*args):
+        return []
+
+    reports = []
+    with mock.patch.multiple(parse_requests, get_assignment_edits=get_assignment_edits,
+                             get_requested_shifts=get_requested_shifts), \
+            mock.patch.object(parse_requests, "ScheduleState", side_effect=AssertionError("rebuilt")):
+        for _ in range(2):
+            reports.append({})
+            result = asyncio.run(parse_requests.process_note_against_schedule(
+                "Assign me the open shift", "Rad_1", date(2025, 7, 1), None, None, None,
+                None, None, None, edit_report=reports[-1], state=state,
+            ))
+
+    assert result[0] is final_schedule and result[6] is radiologists
+    assert final_schedule == ["Rad_0", "Rad_1", "Rad_1", "Rad_0", "Rad_1", "Rad_2"]
+    assert radiologists == ["Rad_0", "Rad_1", "Rad_2"] and monthly_caps[2, "2025-07"] == 5
+    assert state.uncovered == set()
+    assert reports[0] == {"skipped": [], "warnings": ["add Rad_1 2025-07-01 L3: Rad_1 now works 2 shifts on 2025-07-01"]}
+
+
+def test_router_classifies_typical_notes():
+    cases = {
+        "My maximum for this month is three shifts": {"caps"},
+        "I'm only free on July 7 L2 and L3.": {"availability"},
+        "Can you swap July 10 L3 from Rad_1 to Rad_2?": {"edits"},
+        "Please assign me July 7 L2.": {"requests", "edits"},
+        "Swap my July 3 shift with Rad_2": {"edits"},           # a date, not a shift count
+        "I'll do 4 shifts in July": {"caps"},
+    }
+    for note, expected in cases.items():
+        assert intent.classify_note_locally(note) == expected, note
+    assert intent.classify_note_locally("Hawaii July 3-5") is None
+
+
+def test_router_sends_ambiguous_notes_to_the_model():
+    needs = {
+        "Rad_2 will take my July 8 L1": "edits",
+        "I want Rad_2 to cover my July 8 L1": "edits",
+        "I prefer not to work July 4th": "availability",
+        "I want to work fewer shifts in July": "caps",
+        "I'd like to work 5 shifts in July.": "requests",
+    }
+
+    class FakeRunner:
+        async def run(self, agent, note, check=None):
+            return mock.Mock(final_output=intent.NoteIntents(
+                **{i: i == needs[note] for i in intent.INTENTS}))
+
+    with mock.patch.object(intent, "ROUTER_STATS", intent.RouterStats()), \
+            mock.patch.object(intent, "default_runner", FakeRunner):
+        for note, needed in needs.items():
+            assert intent.classify_note_locally(note) is None, note
+            route = asyncio.run(intent.route_note(note))
+            assert route.source == "model" and needed in route.intents, note
+
+
+def test_router_never_drops_an_intent_from_a_partially_explained_note():
+    partial = {
+        "I have jury duty July 7-9, please give me July 12 L2 instead.": {"requests", "edits"},
+        "I am in Hawaii July 3-5. Please put me on July 10.": {"requests"},
+        "I will be at a wedding July 12, please.": set(),
+    }
+    for note, cued in partial.items():
+        assert intent.classify_note_locally(note) is None, note
+        assert intent.keyword_intents(note) == cued, note
+
+    class FakeRunner:
+        async def run(self, agent, note, check=None):
+            return mock.Mock(final_output=intent.NoteIntents(
+                caps=False, availability=True, requests=False, edits=False))
+
+    with mock.patch.object(intent, "ROUTER_STATS", intent.RouterStats()):
+        with mock.patch.object(intent, "default_runner", FakeRunner):
+            routes = {note: asyncio.run(intent.route_note(note)) for note in partial}
+        offline = [asyncio.run(intent.route_note(note, model_fallback=False)) for note in partial]
+
+    for note, cued in partial.items():
+        assert routes[note].source == "model"
+        assert routes[note].intents == cued | {"availability"}, note   # keyword hits are kept
+    assert all(route.intents == set(intent.INTENTS) for route in offline)
+
+
+def test_router_falls_back_to_model_then_to_every_agent():
+    class FakeRunner:
+        def __init__(self, answer=None):
+            self.answer = answer
+
+        async def run(self, agent, note, check=None):
+            if self.answer is None:
+                raise RuntimeError("no network")
+            return mock.Mock(final_output=self.answer)
+
+    stats = intent.RouterStats()
+    answer = intent.NoteIntents(caps=False, availability=True, requests=False, edits=False)
+    with mock.patch.object(intent, "ROUTER_STATS", stats):
+        with mock.patch.object(intent, "default_runner", lambda: FakeRunner(answer)):
+            route = asyncio.run(intent.route_note("Hawaii July 3-5"))
+        assert route.intents == {"availability"} and route.source == "model"
+
+        with mock.patch.object(intent, "default_runner", lambda: FakeRunner()):
+            route = asyncio.run(intent.route_note("Hawaii July 3-5"))
+        assert route.intents == set(intent.INTENTS) and route.source == "all"
+
+        route = asyncio.run(intent.route_note("Hawaii July 3-5", model_fallback=False))
+        assert route.source == "all"
+
+    assert stats.notes == 3 and stats.router_calls == 1
+    assert stats.calls_per_note == (1 + 4 + 4 + 1) / 3
+
+# ------------------------------------------------------------------------- #
+# Prompt context
+# ------------------------------------------------------------------------- #
+def make_roster_schedule(num_rads=20, days=92):
+    entries = make_schedule_entries([date(2025, 7, 1) + timedelta(days=i) for i in range(days)])
+    names = [f"Rad_{i}" for i in range(num_rads)]
+    assignments_by_emp = {n: [] for n in names}
+    for s, entry in enumerate(entries):
+        assignments_by_emp[names[s % num_rads]].append(entry)
+    return entries, assignments_by_emp
+
+
+def test_assignment_context_keeps_named_people_and_dates():
+    _, assignments_by_emp = make_roster_schedule()
+    note = "Can you swap my July 10 L3 with Rad_1? I also hold 7/12."
+    context = assignment_context(note, "Rad_9", assignments_by_emp, date(2025, 7, 1))
+
+    assert context.splitlines() == [
+        "Rad_1: none",                                     # Rad_1 ≠ Rad_10 … Rad_19
+        "Rad_9: 2025-07-10 L3",                            # only inside July 9 – 13
+        "2025-07-10 Thu: L1 Rad_7, L2 Rad_8, L3 Rad_9",
+        "2025-07-12 Sat: L1 Rad_13, L2 Rad_14, L3 Rad_15",
+    ]
+    assert estimate_tokens(context) * 50 < estimate_tokens(str(assignments_by_emp))
+
+    everyone = assignment_context("Please fix my schedule", "Dr. New", assignments_by_emp, date(2025, 7, 1))
+    assert len(everyone.splitlines()) == 20
+
+
+def test_shift_context_limits_to_the_note_window():
+    entries, _ = make_roster_schedule()
+    assert shift_context("Requesting July 12, L1", entries).splitlines() == [
+        "2025-07-11 Fri: L1 L2 L3", "2025-07-12 Sat: L1 L2 L3", "2025-07-13 Sun: L1 L2 L3",
+    ]
+    assert len(shift_context("Any weekend works", entries).splitlines()) == 92
+
+
+def test_agent_prompts_carry_the_trimmed_context():
+    entries, assignments_by_emp = make_roster_schedule()
+    prompts = []
+
+    class FakeRunner:
+        async def run(self, agent, text, check=None):
+            prompts.append(text)
+            return mock.Mock(final_output="[]")
+
+    def run_both():
+        asyncio.run(get_assignment_edits("Give my July 10 L3 to Rad_2", "Rad_9", date(2025, 7, 1), assignments_by_emp))
+        asyncio.run(parse_AI.extract_requested_shifts("Requesting July 12, L1", entries))
+
+    trim_log = mock.Mock()
+    with mock.patch.object(parse_requests, "Runner", FakeRunner), \
+         mock.patch.object(parse_AI, "default_runner", FakeRunner), \
+         mock.patch.object(parse_requests, "log_context_trim", trim_log), \
+         mock.patch.object(parse_AI, "log_context_trim", trim_log):
+        run_both()
+        assert not trim_log.called                         # the untrimmed text is only built to log it
+        with mock.patch.object(prompt_context, "LOG_CONTEXT_TRIM", True):
+            run_both()
+        assert [c.args[0] for c in trim_log.call_args_list] == ["Assignment", "Requested-shift"]
+
+    edit_prompt, request_prompt = prompts[:2]
+    assert "datetime.date" not in edit_prompt and "Rad_9: 2025-07-10 L3" in edit_prompt
+    assert "Rad_5" not in edit_prompt
+    assert "2025-07-12 Sat: L1 L2 L3" in request_prompt and "2025-07-20" not in request_prompt
+
 # ------------------------------------------------------------------------- #
 # Full Test Script
 # ------------------------------------------------------------------------- #
@@ -0,0 +1,884 @@
+# tests/test_scheduler.py
+
+import copy
+import io
+import pickle
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+from ortools.sat.python import cp_model
+
+from utils.parse.parse_non_AI import get_schedule_entries
+
+from utils.schedule import scheduler, template
+from utils.schedule.alterations import (
+    EditRejected,
+    ScheduleState,
+    apply_bulk_edits,
+    build_availability_matrix_from_changes,
+    update_assigned_shifts,
+    update_monthly_caps,
+)
+from utils.schedule.availability import AvailabilityMatrix, slot_mask
+from utils.schedule.candidates import CoverageIndex
+from utils.schedule.index import ScheduleIndex
+from utils.schedule.scheduler import schedule_with_fallback_days_only
+from utils.schedule.solver import INTERACTIVE, SolverConfig
+from utils.schedule.variables import (
+    define_assignment_vars,
+    define_day_overlap_penalty,
+    define_day_work_vars,
+    define_multi_shift_penalties,
+    define_spacing_deviation_vars,
+    group_vars_by_slot,
+)
+
+# ------------------------------------------------------------------------- #
+#  Helpers
+# ------------------------------------------------------------------------- #
+SHIFTS = ["L1", "L2", "L3"]
+
+
+def make_schedule_entries(dates, shifts=SHIFTS):
+    return [{"date": d, "shift": sh} for d in dates for sh in shifts]
+
+
+def make_week(start=date(2025, 6, 1), days=7):
+    return make_schedule_entries([start + timedelta(days=i) for i in range(days)])
+
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+
+# Availability_Constraint → weekdays that cannot be worked (0=Mon … 6=Sun)
+BLOCKED_WEEKDAYS = {"Weekday Only": {4, 5, 6}, "Weekday + Sunday": {4, 5}, "Any Shift": set()}
+
+
+def load_july_data():
+    """Bundled July roster: (employees, schedule_entries, availability, caps)."""
+    profiles = pd.read_csv(DATA_DIR / "radiologist_profiles.csv")
+    schedule_entries = get_schedule_entries(pd.read_csv(DATA_DIR / "shift_data_single_month.csv"))
+    availability = [
+        [0 if se["date"].weekday() in BLOCKED_WEEKDAYS[rule] else 1 for se in schedule_entries]
+        for rule in profiles["Availability_Constraint"]
+    ]
+    caps = {(e, "2025-07"): int(cap) for e, cap in enumerate(profiles["Maximum_Shifts_Per_Month"])}
+    return list(profiles["Radiologist_ID"]), schedule_entries, availability, caps
+
+
+# ------------------------------------------------------------------------- #
+#  ScheduleIndex
+# ------------------------------------------------------------------------- #
+def test_schedule_index_groupings():
+    schedule_entries = make_schedule_entries([date(2025, 7, 31), date(2025, 8, 1)])
+    index = ScheduleIndex(schedule_entries)
+
+    assert index.month_to_slots == {"2025-07": [0, 1, 2], "2025-08": [3, 4, 5]}
+    assert index.date_to_slots[date(2025, 8, 1)] == [3, 4, 5]
+    assert index.slot_of[date(2025, 8, 1), "L2"] == 4
+    assert index.weekdays[:3] == [3, 3, 3]  # Thursday
+    assert index.ordinals[3] - index.ordinals[0] == 1
+
+
+# ------------------------------------------------------------------------- #
+#  AvailabilityMatrix
+# ------------------------------------------------------------------------- #
+def test_availability_matrix_behaves_like_list_of_lists():
+    rows = [[1, 0, 1], [0, 1, 1]]
+    matrix = AvailabilityMatrix(rows)
+
+    assert len(matrix) == 2 and matrix.shape == (2, 3)
+    assert matrix[0][1] == 0 and [list(row) for row in matrix] == rows
+    matrix[1][0] = 1
+    for _ in range(5):                   # grows past the initial buffer
+        matrix.append([0, 0, 1])
+    matrix.append()                      # all-available row
+    assert len(matrix) == 8
+    assert matrix.tolist()[1] == [1, 1, 1] and matrix.tolist()[-1] == [1, 1, 1]
+    assert matrix[:2].tolist() == [[1, 0, 1], [1, 1, 1]]
+
+
+def test_availability_matrix_bulk_updates_and_pickles_bit_packed():
+    schedule_entries = make_schedule_entries([date(2025, 7, 1) + timedelta(days=i) for i in range(31)])
+    index = ScheduleIndex(schedule_entries)
+    matrix = AvailabilityMatrix.ones(40, index.num_slots)
+
+    # radiologists 0 and 3 cannot cover Friday–Sunday
+    matrix.fill(0, rows=[0, 3], slots=slot_mask(index, weekdays={4, 5, 6}))
+    weekend = [s for s, wd in enumerate(index.weekdays) if wd >= 4]
+    assert all(matrix[0][s] == 0 and matrix[3][s] == 0 and matrix[1][s] == 1 for s in weekend)
+    assert matrix.array.sum() == 40 * index.num_slots - 2 * len(weekend)
+
+    restored = pickle.loads(pickle.dumps(matrix))
+    assert restored == matrix
+    as_lists = pickle.dumps(matrix.tolist())
+    assert len(pickle.dumps(matrix)) * 8 < len(as_lists)
+
+
+def test_alterations_accept_availability_matrix():
+    schedule_entries = make_week(days=2)
+    names = ["Alice"]
+    matrix = AvailabilityMatrix.ones(1, len(schedule_entries))
+
+    caps, names, matrix = update_monthly_caps(
+        [{"name": "Bob", "new_max": 2, "month": "2025-06"}], {}, names, matrix,
+        default_availability_length=len(schedule_entries)
+    )
+    flips = [{"name": "Bob", "flips": [
+        {"date": "2025-06-02", "shift": "L2", "available": False},
+        {"date": date(2025, 6, 1), "shift": "L1", "available": False},
+    ]}]
+    matrix = build_availability_matrix_from_changes(flips, matrix, names, schedule_entries)
+
+    assert isinstance(matrix, AvailabilityMatrix) and len(matrix) == 2
+    assert matrix.tolist()[1] == [0, 1, 1, 1, 0, 1]
+    assert caps == {(1, "2025-06"): 2}
+
+
+def test_scheduler_accepts_availability_matrix():
+    schedule_entries = make_week(days=3)
+    employees = ["Alice", "Bob"]
+    availability = [[1] * len(schedule_entries) for _ in employees]
+    availability[1][:4] = [0] * 4
+    monthly_caps = {(0, "2025-06"): 3, (1, "2025-06"): 3}
+    config = SolverConfig(num_workers=1, random_seed=0)
+    template.clear_template_cache()
+
+    from_lists = schedule_with_fallback_days_only(employees, schedule_entries, availability,
+                                                  monthly_caps, config=config)
+    from_matrix = schedule_with_fallback_days_only(employees, schedule_entries,
+                                                   AvailabilityMatrix(availability), monthly_caps,
+                                                   config=config)
+
+    index = ScheduleIndex(schedule_entries)
+    assert template.base_model(2, index, availability) is template.base_model(2, index, AvailabilityMatrix(availability))
+    assert from_matrix.status == from_lists.status == "OPTIMAL"
+    assert from_matrix.objective == from_lists.objective
+    assert from_matrix.model_stats == from_lists.model_stats
+
+
+# ------------------------------------------------------------------------- #
+#  Coverage candidates
+# ------------------------------------------------------------------------- #
+def test_candidates_respect_availability_caps_and_day_load():
+    schedule_entries = make_week(days=3)
+    employees = ["Alice", "Bob", "Cara", "Dan"]
+    availability = AvailabilityMatrix.ones(4, len(schedule_entries))
+    availability[3][4] = 0                                   # Dan: not June 2 L2
+    monthly_caps = {(0, "2025-06"): 1, (1, "2025-06"): 3, (2, "2025-06"): 5}  # Dan uncapped
+    final_schedule = [None] * len(schedule_entries)
+    final_schedule[0] = "Alice"                              # Alice is now at her cap
+    final_schedule[3] = "Bob"                                # Bob works June 2
+
+    coverage = CoverageIndex(employees, schedule_entries, availability, monthly_caps, final_schedule)
+
+    june_2_l2 = {"date": date(2025, 6, 2), "shift": "L2"}
+    assert [c.name for c in coverage.candidates(june_2_l2)] == ["Cara"]
+    assert [c.name for c in coverage.candidates(7)] == ["Dan", "Cara", "Bob"]
+    assert coverage.candidates(7)[0].remaining is None
+    assert coverage.candidates(7, limit=1)[0].name == "Dan"
+    assert "monthly cap" in coverage.violation("Alice", 7)
+    assert "already works" in coverage.violation("Bob", 4)
+    assert coverage.violation("Bob", 4, one_shift_per_day=False) is None
+    assert coverage.shifts_on_day("Bob", 4) == 1
+    assert "unavailable" in coverage.violation("Dan", 4)
+
+    coverage.unassign(0)
+    availability[3][4] = 1                                   # flips are read live
+    assert [c.name for c in coverage.candidates(june_2_l2)] == ["Dan", "Cara", "Alice"]
+    coverage.add_employee("Eve", {(4, "2025-06"): 0})
+    availability.append()
+    assert "Eve" not in [c.name for c in coverage.candidates(june_2_l2)]
+
+
+def test_assignment_edits_skip_moves_that_break_caps_and_warn_on_same_day():
+    schedule_entries = make_week(days=2)
+    employees = ["Alice", "Bob"]
+    availability = AvailabilityMatrix.ones(2, len(schedule_entries))
+    monthly_caps = {(0, "2025-06"): 2, (1, "2025-06"): 1}
+    final_schedule = ["Alice", None, None, "Bob", None, None]
+    assignments_by_emp = {"Alice": [schedule_entries[0]], "Bob": [schedule_entries[3]]}
+
+    edits = [
+        {"action": "swap", "r1": "Alice", "r2": "Bob", "date": "2025-06-01", "shift": "L1"},  # Bob at cap
+        {"action": "add", "radiologist": "Alice", "date": "2025-06-02", "shift": "L2"},
+        {"action": "add", "radiologist": "Alice", "date": "2025-06-02", "shift": "L3"},     # over cap
+        {"action": "add", "radiologist": "Bob", "date": "2025-06-01", "shift": "L2"},       # Bob at cap
+    ]
+    final_schedule, assignments_by_emp, _ = update_assigned_shifts(
+        edits, final_schedule, assignments_by_emp, [], schedule_entries, availability,
+        {}, monthly_caps, employees
+    )
+
+    assert final_schedule == ["Alice", None, None, "Bob", "Alice", None]
+    assert len(assignments_by_emp["Alice"]) == 2 and len(assignments_by_emp["Bob"]) == 1
+
+    # an explicit second shift the same day is applied, with a warning
+    monthly_caps[0, "2025-06"] = 3
+    state = ScheduleState(final_schedule, assignments_by_emp, [], schedule_entries,
+                          availability, {}, monthly_caps, employees)
+    state.apply_edits(edits)
+    assert final_schedule == ["Alice", None, None, "Bob", "Alice", "Alice"]
+    assert [reason for _, reason in state.skipped] == [
+        "Bob is at their monthly cap of 1", "2025-06-02 L2 is already covered by Alice",
+        "Bob is at their monthly cap of 1",
+    ]
+    assert state.warnings == [(edits[2], "Alice now works 2 shifts on 2025-06-02")]
+
+
+# ------------------------------------------------------------------------- #
+#  Indexed schedule state
+# ------------------------------------------------------------------------- #
+def test_schedule_state_applies_edit_batches_in_place():
+    schedule_entries = make_week(days=3)
+    employees = ["Alice", "Bob", "Cara"]
+    availability = AvailabilityMatrix.ones(3, len(schedule_entries))
+    monthly_caps = {(e, "2025-06"): 3 for e in range(3)}
+    requested_shift_map = {(0, date(2025, 6, 1), "L1"): 1}
+    final_schedule = ["Alice", None, None, "Bob", None, None, "Cara", None, None]
+    assignments_by_emp = {"Alice": [schedule_entries[0]], "Bob": [schedule_entries[3]],
+                          "Cara": [schedule_entries[6]]}
+    cara_list = assignments_by_emp["Cara"]
+    uncovered = [se for se, name in zip(schedule_entries, final_schedule) if name is None]
+
+    state = ScheduleState(final_schedule, assignments_by_emp, uncovered, schedule_entries,
+                          availability, requested_shift_map, monthly_caps, employees)
+    state.apply_edits([
+        {"action": "swap", "r1": "Alice", "r2": "Bob", "date": "2025-06-01", "shift": "L1"},
+        {"action": "remove", "radiologist": "Bob", "date": "2025-06-02", "shift": "L1"},
+    ]).result()
+
+    assert final_schedule[:4] == ["Bob", None, None, None]
+    assert assignments_by_emp["Alice"] == [] and assignments_by_emp["Bob"] == [schedule_entries[0]]
+    assert assignments_by_emp["Cara"] is cara_list             # untouched lists are left alone
+    assert requested_shift_map == {(1, date(2025, 6, 1), "L1"): 1}
+    assert availability[1][3] == 0 and schedule_entries[3] in uncovered
+
+    # the same state takes the next batch without a rebuild; Dan is new
+    state.update_monthly_caps([{"name": "Dan", "new_max": 1, "month": "2025-06"}])
+    state.apply_edits([
+        {"action": "add", "radiologist": "Dan", "date": "2025-06-02", "shift": "L1"},
+        {"action": "add", "radiologist": "Dan", "date": "2025-06-03", "shift": "L2"},   # over cap
+    ])
+    final_schedule, assignments_by_emp, uncovered = state.result()
+
+    assert employees == ["Alice", "Bob", "Cara", "Dan"] and len(availability) == 4
+    assert final_schedule[3] == "Dan" and final_schedule[7] is None
+    assert assignments_by_emp["Dan"] == [schedule_entries[3]]
+    assert schedule_entries[3] not in uncovered and len(uncovered) == 6
+    assert monthly_caps[3, "2025-06"] == 1
+
+
+def test_refused_adds_leave_the_roster_alone():
+    schedule_entries = make_week(days=2)
+    employees = ["Alice", "Bob"]
+    availability = AvailabilityMatrix.ones(2, len(schedule_entries))
+    monthly_caps = {(0, "2025-06"): 2}                       # Bob has no June cap yet
+    final_schedule = ["Alice", None, None, "Bob", None, None]
+    assignments_by_emp = {"Alice": [schedule_entries[0]], "Bob": [schedule_entries[3]]}
+
+    state = ScheduleState(final_schedule, assignments_by_emp, [], schedule_entries,
+                          availability, {}, monthly_caps, employees)
+    state.apply_edits([
+        {"action": "add", "radiologist": "Dan", "date": "2025-06-01", "shift": "L1"},        # covered
+        {"action": "swap", "r1": "Bob", "r2": "Eve", "date": "2025-06-01", "shift": "L2"},   # Bob doesn't hold it
+        {"action": "add", "radiologist": "Bob", "date": "2025-06-01", "shift": "L1"},        # covered
+    ])
+    assert len(state.skipped) == 3
+    assert employees == ["Alice", "Bob"] and len(availability) == 2
+    assert monthly_caps == {(0, "2025-06"): 2}
+    assert "Dan" not in state.result()[1]
+
+    state.apply_edits([
+        {"action": "swap", "r1": "Bob", "r2": "Eve", "date": "2025-06-02", "shift": "L1"},
+        {"action": "add", "radiologist": "Bob", "date": "2025-06-01", "shift": "L2"},
+    ])
+    assert not state.skipped
+    assert employees == ["Alice", "Bob", "Eve"] and len(availability) == 3
+    assert monthly_caps == {(0, "2025-06"): 2, (2, "2025-06"): 5}           # only Eve is new
+    assert final_schedule == ["Alice", "Bob", None, "Eve", None, None]
+
+
+# ------------------------------------------------------------------------- #
+#  Bulk edits
+# ------------------------------------------------------------------------- #
+def make_bulk_case(days=3):
+    schedule_entries = make_week(days=days)
+    employees = ["Alice", "Bob", "Cara"]
+    final_schedule = [employees[s % 3] if s % 3 != 2 else None for s in range(len(schedule_entries))]
+    return dict(
+        final_schedule=final_schedule,
+        assignments_by_emp={name: [se for se, n in zip(schedule_entries, final_schedule) if n == name]
+                            for name in employees},
+        uncovered_slots=[se for se, n in zip(schedule_entries, final_schedule) if n is None],
+        schedule_entries=schedule_entries,
+        availability_matrix=AvailabilityMatrix.ones(3, len(schedule_entries)),
+        requested_shift_map={},
+        monthly_caps={(e, "2025-06"): days for e in range(3)},
+        employees=employees,
+    )
+
+
+def test_bulk_edits_apply_from_csv():
+    case = make_bulk_case()
+    edits_csv = io.StringIO(
+        "action,radiologist,r1,r2,date,shift\n"
+        "swap,,Alice,Cara,2025-06-01,L1\n"
+        "remove,Bob,,,2025-06-02,L2\n"
+        "add,Dan,,,2025-06-02,L2\n"
+        "add,Alice,,,2025-06-01,L3\n"
+    )
+
+    final_schedule, assignments_by_emp, uncovered = apply_bulk_edits(edits_csv, **case)
+
+    assert final_schedule[:6] == ["Cara", "Bob", "Alice", "Alice", "Dan", None]
+    assert [se["shift"] for se in assignments_by_emp["Dan"]] == ["L2"]
+    assert case["employees"][-1] == "Dan" and case["monthly_caps"][3, "2025-06"] == 5
+    assert len(uncovered) == 2
+
+
+def test_bulk_edits_roll_back_on_first_bad_edit():
+    case = make_bulk_case()
+    case["availability_matrix"][2][4] = 0
+    before = copy.deepcopy({k: v for k, v in case.items() if k != "availability_matrix"})
+    availability_before = case["availability_matrix"].tolist()
+    edits = [
+        {"action": "add", "radiologist": "Dan", "date": "2025-06-01", "shift": "L3"},
+        {"action": "remove", "radiologist": "Bob", "date": "2025-06-01", "shift": "L2"},
+        {"action": "swap", "r1": "Alice", "r2": "Dan", "date": "2025-06-01", "shift": "L1"},  # Dan: 2nd shift that day, warned only
+        {"action": "swap", "r1": "Bob", "r2": "Cara", "date": "2025-06-02", "shift": "L2"},   # rejected: Cara unavailable
+    ]
+
+    try:
+        apply_bulk_edits(edits, **case)
+        assert False, "expected EditRejected"
+    except EditRejected as e:
+        assert e.index == 3 and "unavailable" in e.reason
+
+    assert {k: v for k, v in case.items() if k != "availability_matrix"} == before
+    assert case["availability_matrix"].tolist() == availability_before
+
+
+def test_bulk_edits_throughput():
+    case = make_bulk_case(days=365)
+    case["monthly_caps"] = {}
+    edits = [
+        {"action": "swap", "r1": name, "r2": "Cara", "date": se["date"].isoformat(), "shift": se["shift"]}
+        for se, name in zip(case["schedule_entries"], case["final_schedule"]) if name == "Alice"
+    ] + [
+        {"action": "remove", "radiologist": "Bob", "date": se["date"].isoformat(), "shift": se["shift"]}
+        for se, name in zip(case["schedule_entries"], case["final_schedule"]) if name == "Bob"
+    ]
+    case["availability_matrix"].fill(0, rows=[2], slots=None)
+    case["availability_matrix"].fill(1, rows=[2], slots=[s for s in range(0, 1095, 3)])
+    for s in range(1095):
+        if case["final_schedule"][s] == "Cara":
+            case["final_schedule"][s] = None
+
+    started = time.perf_counter()
+    final_schedule, _, _ = apply_bulk_edits(edits, **case)
+    elapsed = time.perf_counter() - started
+
+    assert len(edits) == 730
+    assert final_schedule.count("Cara") == 365 and "Bob" not in final_schedule
+    assert len(edits) / elapsed > 1000
+
+
+# ------------------------------------------------------------------------- #
+#  Sparse assignment variables
+# ------------------------------------------------------------------------- #
+def test_assignment_vars_only_for_available_pairs():
+    schedule_entries = make_week()
+    num_slots = len(schedule_entries)
+    availability = [
+        [1 if s % 2 == 0 else 0 for s in range(num_slots)],
+        [0] * num_slots,
+    ]
+
+    model = cp_model.CpModel()
+    a = define_assignment_vars(2, ScheduleIndex(schedule_entries), availability, model)
+
+    assert set(a) == {(0, s) for s in range(0, num_slots, 2)}
+    assert len(model.Proto().variables) == len(a)
+
+
+def test_unavailable_slots_are_never_assigned():
+    schedule_entries = make_week()
+    num_slots = len(schedule_entries)
+    employees = ["Alice", "Bob"]
+    # Alice: first three days only, Bob: nothing
+    availability = [[1 if s < 9 else 0 for s in range(num_slots)], [0] * num_slots]
+    monthly_caps = {(0, "2025-06"): 3, (1, "2025-06"): 3}
+
+    final_schedule, assignments_by_emp, uncovered = schedule_with_fallback_days_only(
+        employees, schedule_entries, availability, monthly_caps
+    )
+
+    assert assignments_by_emp["Bob"] == []
+    assert len(assignments_by_emp["Alice"]) == 3
+    assert all(s < 9 for s, name in enumerate(final_schedule) if name == "Alice")
+    assert len(uncovered) == num_slots - 3
+
+
+
+# ------------------------------------------------------------------------- #
+#  Spacing penalty
+# ------------------------------------------------------------------------- #
+def test_spacing_penalty_sees_across_month_boundary():
+    schedule_entries = make_schedule_entries(
+        [date(2025, 7, 30) + timedelta(days=i) for i in range(4)], shifts=["L1"]
+    )
+    monthly_caps = {(0, "2025-07"): 2, (0, "2025-08"): 2}
+
+    model = cp_model.CpModel()
+    index = ScheduleIndex(schedule_entries)
+    a = define_assignment_vars(1, index, [[1] * 4], model)
+    penalties = define_spacing_deviation_vars(index, a, monthly_caps, model)
+
+    # July 31 and August 1 are back-to-back
+    model.Add(a[0, 1] == 1)
+    model.Add(a[0, 2] == 1)
+    model.Minimize(sum(penalties))
+
+    solver = cp_model.CpSolver()
+    assert solver.Solve(model) == cp_model.OPTIMAL
+    assert solver.ObjectiveValue() >= 1
+
+
+def test_spacing_penalty_is_linear_in_slots():
+    def num_vars(days):
+        schedule_entries = make_week(start=date(2025, 7, 1), days=days)
+        num_slots = len(schedule_entries)
+        model = cp_model.CpModel()
+        index = ScheduleIndex(schedule_entries)
+        a = define_assignment_vars(1, index, [[1] * num_slots], model)
+        before = len(model.Proto().variables)
+        define_spacing_deviation_vars(index, a, {(0, "2025-07"): 3}, model)
+        return len(model.Proto().variables) - before
+
+    assert num_vars(30) <= 2 * num_vars(15) + 2
+
+
+
+# ------------------------------------------------------------------------- #
+#  Per-(employee, day) layer
+# ------------------------------------------------------------------------- #
+def test_day_layer_penalties():
+    schedule_entries = make_week(days=1)
+    index = ScheduleIndex(schedule_entries)
+    # Alice could work all three shifts, Bob only L3
+    availability = [[1, 1, 1], [0, 0, 1]]
+
+    model = cp_model.CpModel()
+    a = define_assignment_vars(2, index, availability, model)
+    day_work = define_day_work_vars(index, a, model)
+    overlap = define_day_overlap_penalty(index, day_work, model)
+    multi = define_multi_shift_penalties(index, day_work, model)
+
+    # Bob's lone slot is its own "works" literal; one multi-shift var (Alice)
+    assert day_work[1, date(2025, 6, 1)][0] is a[1, 2]
+    assert len(overlap) == 1 and len(multi) == 1
+
+    model.Add(a[0, 0] + a[0, 1] + a[1, 2] == 3)
+    model.Minimize(sum(overlap) + sum(multi))
+    solver = cp_model.CpSolver()
+    assert solver.Solve(model) == cp_model.OPTIMAL
+    assert solver.ObjectiveValue() == 2
+
+
+# ------------------------------------------------------------------------- #
+#  Base-model template cache
+# ------------------------------------------------------------------------- #
+def test_template_is_reused_across_cap_changes_but_not_availability_flips():
+    schedule_entries = make_week()
+    num_slots = len(schedule_entries)
+    employees = ["Alice", "Bob"]
+    availability = [[1] * num_slots for _ in employees]
+    index = ScheduleIndex(schedule_entries)
+    template.clear_template_cache()
+
+    base = template.base_model(2, index, availability)
+    assert template.base_model(2, ScheduleIndex(make_week()), availability) is base
+
+    availability[1][0] = 0
+    assert template.base_model(2, index, availability) is not base
+
+
+def test_cached_template_solves_like_a_fresh_build():
+    schedule_entries = make_week(days=3)
+    num_slots = len(schedule_entries)
+    employees = ["Alice", "Bob"]
+    availability = [[1] * num_slots for _ in employees]
+    config = SolverConfig(num_workers=1, random_seed=0)
+
+    def solve(cap):
+        caps = {(0, "2025-06"): cap, (1, "2025-06"): cap}
+        return schedule_with_fallback_days_only(employees, schedule_entries, availability, caps,
+                                                config=config)
+
+    template.clear_template_cache()
+    solve(1)                             # warms the cache with other caps
+    cached = solve(2)
+    template.clear_template_cache()
+    fresh = solve(2)
+
+    assert cached.status == fresh.status == "OPTIMAL"
+    assert cached.objective == fresh.objective
+    assert len(cached.uncovered_slots) == num_slots - 4
+    assert cached.model_stats == fresh.model_stats
+
+
+# ------------------------------------------------------------------------- #
+#  Warm start
+# ------------------------------------------------------------------------- #
+def test_warm_start_keeps_fixed_assignments():
+    schedule_entries = make_week()
+    num_slots = len(schedule_entries)
+    employees = ["Alice", "Bob"]
+    availability = [[1] * num_slots for _ in employees]
+    monthly_caps = {(0, "2025-06"): 3, (1, "2025-06"): 3}
+
+    hint = [None] * num_slots
+    hint[0], hint[4], hint[8] = "Bob", "Bob", "Alice"
+
+    final_schedule, _, _ = schedule_with_fallback_days_only(
+        employees, schedule_entries, availability, monthly_caps,
+        hint_schedule=hint, fixed_slots=[0, 4, 8]
+    )
+
+    assert [final_schedule[s] for s in (0, 4, 8)] == ["Bob", "Bob", "Alice"]
+
+
+def test_infeasible_fixed_warm_start_falls_back_to_hints():
+    schedule_entries = make_week()
+    num_slots = len(schedule_entries)
+    employees = ["Alice", "Bob"]
+    availability = [[1] * num_slots for _ in employees]
+    # Bob's cap dropped to one, but the previous schedule gave him three
+    monthly_caps = {(0, "2025-06"): 3, (1, "2025-06"): 1}
+
+    hint = [None] * num_slots
+    hint[0], hint[4], hint[8] = "Bob", "Bob", "Bob"
+
+    _, assignments_by_emp, _ = schedule_with_fallback_days_only(
+        employees, schedule_entries, availability, monthly_caps,
+        hint_schedule=hint, fixed_slots=[0, 4, 8]
+    )
+
+    assert len(assignments_by_emp["Bob"]) == 1
+
+
+
+# ------------------------------------------------------------------------- #
+#  Repair mode
+# ------------------------------------------------------------------------- #
+def test_repair_mode_leaves_assignments_outside_neighborhood_alone():
+    schedule_entries = make_week(days=14)
+    num_slots = len(schedule_entries)
+    employees = ["Alice", "Bob", "Cara"]
+    availability = [[1] * num_slots for _ in employees]
+    monthly_caps = {(e, "2025-06"): 4 for e in range(3)}
+
+    before, _, _ = schedule_with_fallback_days_only(
+        employees, schedule_entries, availability, monthly_caps
+    )
+
+    # Cara can no longer work June 8
+    changed = date(2025, 6, 8)
+    for s, se in enumerate(schedule_entries):
+        if se["date"] == changed:
+            availability[2][s] = 0
+
+    after, _, _ = schedule_with_fallback_days_only(
+        employees, schedule_entries, availability, monthly_caps,
+        hint_schedule=before,
+        repair_scope={"dates": {changed}, "radiologists": {"Cara"}},
+    )
+
+    for s, se in enumerate(schedule_entries):
+        if se["date"] == changed:
+            assert after[s] != "Cara"
+        elif abs((se["date"] - changed).days) > 1 and before[s] not in (None, "Cara"):
+            assert after[s] == before[s]
+
+
+def test_repair_mode_leaves_distant_uncovered_slots_uncovered():
+    schedule_entries = make_week(days=14)
+    num_slots = len(schedule_entries)
+    employees = ["Alice", "Bob"]
+    availability = [[1] * num_slots for _ in employees]
+    monthly_caps = {(0, "2025-06"): 20, (1, "2025-06"): 20}
+    changed = date(2025, 6, 8)
+
+    # nothing was covered before; only the days around June 8 may change now
+    after, _, _ = schedule_with_fallback_days_only(
+        employees, schedule_entries, availability, monthly_caps,
+        hint_schedule=[None] * num_slots, repair_scope={"dates": {changed}, "radiologists": set()},
+        config=INTERACTIVE,
+    )
+
+    near = [abs((se["date"] - changed).days) <= 1 for se in schedule_entries]
+    assert all(name is None for name, close in zip(after, near) if not close)
+    assert any(name is not None for name, close in zip(after, near) if close)
+
+
+def test_repair_mode_grows_neighborhood_when_infeasible():
+    schedule_entries = make_week()
+    num_slots = len(schedule_entries)
+    employees = ["Alice", "Bob"]
+    availability = [[1] * num_slots for _ in employees]
+    monthly_caps = {(0, "2025-06"): 3, (1, "2025-06"): 3}
+
+    hint = [None] * num_slots
+    hint[0], hint[18] = "Alice", "Bob"
+    # Alice now insists on June 7 L1, which Bob holds six days away
+    requested_shift_map = {(0, date(2025, 6, 7), "L1"): 1}
+
+    final_schedule, _, _ = schedule_with_fallback_days_only(
+        employees, schedule_entries, availability, monthly_caps, requested_shift_map,
+        hint_schedule=hint, repair_scope={"radiologists": {"Alice"}},
+    )
+
+    assert final_schedule[18] == "Alice"
+
+
+
+# ------------------------------------------------------------------------- #
+#  Solver profile + typed result
+# ------------------------------------------------------------------------- #
+def test_result_reports_status_objective_and_bound():
+    schedule_entries = make_week(days=3)
+    employees = ["Alice", "Bob"]
+    availability = [[1] * len(schedule_entries) for _ in employees]
+    monthly_caps = {(0, "2025-06"): 3, (1, "2025-06"): 3}
+
+    result = schedule_with_fallback_days_only(
+        employees, schedule_entries, availability, monthly_caps,
+        config=SolverConfig(max_time_in_seconds=10, num_workers=1, random_seed=7),
+    )
+    final_schedule, assignments_by_emp, uncovered = result
+
+    assert result.status == "OPTIMAL"
+    assert result.objective == result.best_bound
+    assert result.gap == 0
+    assert result.wall_time > 0
+    assert len(uncovered) == 3
+    assert final_schedule is result.final_schedule
+
+
+def test_infeasible_model_returns_empty_schedule():
+    schedule_entries = make_week(days=3)
+    employees = ["Alice", "Bob"]
+    availability = [[1] * len(schedule_entries) for _ in employees]
+    # Alice's request is hard, but her cap is zero
+    monthly_caps = {(0, "2025-06"): 0, (1, "2025-06"): 3}
+    requested_shift_map = {(0, date(2025, 6, 2), "L2"): 1}
+
+    result = schedule_with_fallback_days_only(
+        employees, schedule_entries, availability, monthly_caps, requested_shift_map,
+        config=INTERACTIVE,
+    )
+
+    assert result.status == "INFEASIBLE"
+    assert not result.has_solution
+    assert result.final_schedule == [None] * len(schedule_entries)
+    assert result.uncovered_slots == schedule_entries
+    assert result.objective is None
+
+
+
+def test_lexicographic_mode_matches_weighted_optimum_and_reports_tiers():
+    schedule_entries = make_week(days=4)
+    employees = ["Alice", "Bob"]
+    availability = [[1] * len(schedule_entries) for _ in employees]
+    availability[1][:6] = [0] * 6
+    monthly_caps = {(0, "2025-06"): 4, (1, "2025-06"): 3}
+    args = (employees, schedule_entries, availability, monthly_caps)
+
+    weighted = schedule_with_fallback_days_only(*args, config=SolverConfig(num_workers=1))
+    lexicographic = schedule_with_fallback_days_only(
+        *args, config=SolverConfig(num_workers=1, objective_mode="lexicographic", tier_time_limits=(5, 5))
+    )
+
+    assert weighted.status == lexicographic.status == "OPTIMAL"
+    assert lexicographic.objective == weighted.objective
+    assert len(lexicographic.uncovered_slots) == len(weighted.uncovered_slots)
+    assert set(lexicographic.tiers) == {"uncovered", "secondary"}
+    assert lexicographic.tiers["uncovered"]["objective"] == len(weighted.uncovered_slots)
+    assert all(t["wall_time"] > 0 for t in lexicographic.tiers.values())
+
+
+def test_bulk_extraction_matches_per_variable_reads():
+    schedule_entries = make_week(days=3)
+    employees = ["Alice", "Bob", "Cara"]
+    availability = [[1] * len(schedule_entries) for _ in employees]
+    availability[0][::2] = [0] * 5
+    index = ScheduleIndex(schedule_entries)
+
+    base = template.base_model(3, index, availability)
+    model, a, u, _, _ = base.instantiate()
+    model.Add(sum(a.values()) == 6)
+    model.Maximize(sum(var for (e, _), var in a.items() if e == 0))
+    solver = cp_model.CpSolver()
+    assert solver.Solve(model) == cp_model.OPTIMAL
+
+    final_schedule, assignments_by_emp, uncovered_slots = scheduler._extract(
+        solver.ResponseProto().solution, employees, schedule_entries, base
+    )
+    for s, se in enumerate(schedule_entries):
+        holders = [employees[e] for (e, t), var in a.items() if t == s and solver.BooleanValue(var)]
+        assert final_schedule[s] == (holders[0] if holders else None)
+        assert (se in uncovered_slots) == solver.BooleanValue(u[s])
+    assert len(assignments_by_emp["Alice"]) == 4
+    assert sum(map(len, assignments_by_emp.values())) == 6
+
+
+# ------------------------------------------------------------------------- #
+#  Per-month decomposition
+# ------------------------------------------------------------------------- #
+def test_month_decomposition_stitches_months_back_together():
+    schedule_entries = make_week(start=date(2025, 6, 28), days=5)   # Jun 28 – Jul 2
+    employees = ["Alice", "Bob"]
+    availability = [[1] * len(schedule_entries) for _ in employees]
+    availability[1][:3] = [0] * 3
+    monthly_caps = {(0, "2025-06"): 2, (1, "2025-06"): 2,
+                    (0, "2025-07"): 1, (1, "2025-07"): 2}
+    requested_shift_map = {(0, date(2025, 7, 2), "L3"): 1}
+    config = SolverConfig(num_workers=1, random_seed=0)
+    args = (employees, schedule_entries, availability, monthly_caps, requested_shift_map)
+
+    whole = schedule_with_fallback_days_only(*args, config=config)
+    by_month = schedule_with_fallback_days_only(*args, config=config.with_options(decompose_months=True))
+
+    assert by_month.model_stats["months"] == 2
+    assert by_month.status == whole.status == "OPTIMAL"
+    assert len(by_month.uncovered_slots) == len(whole.uncovered_slots) == 15 - 7
+    assert by_month.final_schedule[schedule_entries.index({"date": date(2025, 7, 2), "shift": "L3"})] == "Alice"
+    assert by_month.final_schedule[0] != "Bob"
+    june = [se for se in by_month.assignments_by_emp["Alice"] if se["date"].month == 6]
+    assert len(june) == 2 and len(by_month.assignments_by_emp["Alice"]) == 3
+
+
+# ------------------------------------------------------------------------- #
+#  Streaming intermediate solutions
+# ------------------------------------------------------------------------- #
+def test_progress_callback_streams_and_can_stop_search():
+    schedule_entries = make_week(days=14)
+    employees = ["Alice", "Bob", "Cara"]
+    availability = [[1] * len(schedule_entries) for _ in employees]
+    monthly_caps = {(e, "2025-06"): 10 for e in range(3)}
+    seen = []
+
+    def on_solution(progress):
+        seen.append(progress)
+        return True  # "use this one"
+
+    result = schedule_with_fallback_days_only(
+        employees, schedule_entries, availability, monthly_caps,
+        progress_callback=on_solution,
+    )
+
+    assert len(seen) == 1
+    assert seen[0].status == "FEASIBLE"
+    assert result.has_solution
+    assert result.objective == seen[0].objective
+    assert result.final_schedule == seen[0].final_schedule
+
+
+# ------------------------------------------------------------------------- #
+#  Slot model
+# ------------------------------------------------------------------------- #
+def legacy_uncovered_vars(index, a, model):
+    """Pre-ExactlyOne slot model: coverage var, at-most-one and c + u == 1."""
+    by_slot = group_vars_by_slot(a)
+    uncovered = {}
+    for s in range(index.num_slots):
+        slot_vars = by_slot.get(s, [])
+        c = model.NewBoolVar(f"coverage_s{s}")
+        model.Add(sum(slot_vars) == c)
+        model.Add(sum(slot_vars) <= 1)
+        uncovered[s] = model.NewBoolVar(f"uncovered_s{s}")
+        model.Add(c + uncovered[s] == 1)
+    return uncovered
+
+
+def test_exactly_one_slot_model_is_smaller_on_july_data():
+    # model build only; the objective check below solves a smaller instance
+    employees, schedule_entries, availability, _ = load_july_data()
+    index = ScheduleIndex(schedule_entries)
+
+    slim = template.BaseModel(len(employees), index, availability).model.Proto()
+    with mock.patch.object(template, "define_uncovered_vars", legacy_uncovered_vars):
+        legacy = template.BaseModel(len(employees), index, availability).model.Proto()
+
+    assert len(slim.variables) < len(legacy.variables)
+    assert len(slim.constraints) < len(legacy.constraints)
+    assert slim.ByteSize() < legacy.ByteSize()
+    # the legacy model spends one coverage var per slot on the same assignments
+    assert len(legacy.variables) - len(slim.variables) == index.num_slots
+
+
+def test_exactly_one_slot_model_matches_legacy_objective():
+    # small enough that both models are proven optimal on one worker
+    schedule_entries = make_week(days=7)
+    employees = ["Alice", "Bob", "Cara", "Dan"]
+    availability = [[int((s * 7 + e * 3) % 5 != 0) for s in range(len(schedule_entries))]
+                    for e in range(len(employees))]
+    caps = {(e, "2025-06"): cap for e, cap in enumerate([4, 5, 4, 3])}   # 16 caps for 21 slots
+    requested = {(0, date(2025, 6, 3), "L1"): 1, (2, date(2025, 6, 4), "L3"): 1}
+    config = SolverConfig(max_time_in_seconds=60, num_workers=1, random_seed=0)
+
+    def solve():
+        return schedule_with_fallback_days_only(
+            employees, schedule_entries, availability, caps, requested, config=config
+        )
+
+    slim = solve()
+    template.clear_template_cache()
+    with mock.patch.object(template, "define_uncovered_vars", legacy_uncovered_vars):
+        legacy = solve()
+    template.clear_template_cache()
+
+    assert slim.status == legacy.status == "OPTIMAL"
+    assert slim.objective == legacy.objective                       # full weighted objective
+    assert len(slim.uncovered_slots) == len(legacy.uncovered_slots) == 5
+    assert slim.model_stats["variables"] < legacy.model_stats["variables"]
+    assert slim.model_stats["constraints"] < legacy.model_stats["constraints"]
+    assert slim.model_stats["proto_bytes"] < legacy.model_stats["proto_bytes"]
+
+
+if __name__ == "__main__":
+    test_schedule_index_groupings()
+    test_availability_matrix_behaves_like_list_of_lists()
+    test_availability_matrix_bulk_updates_and_pickles_bit_packed()
+    test_alterations_accept_availability_matrix()
+    test_scheduler_accepts_availability_matrix()
+    test_candidates_respect_availability_caps_and_day_load()
+    test_assignment_edits_skip_moves_that_break_caps_and_warn_on_same_day()
+    test_schedule_state_applies_edit_batches_in_place()
+    test_refused_adds_leave_the_roster_alone()
+    test_bulk_edits_apply_from_csv()
+    test_bulk_edits_roll_back_on_first_bad_edit()
+    test_bulk_edits_throughput()
+    test_assignment_vars_only_for_available_pairs()
+    test_unavailable_slots_are_never_assigned()
+    test_spacing_penalty_sees_across_month_boundary()
+    test_spacing_penalty_is_linear_in_slots()
+    test_day_layer_penalties()
+    test_template_is_reused_across_cap_changes_but_not_availability_flips()
+    test_cached_template_solves_like_a_fresh_build()
+    test_warm_start_keeps_fixed_assignments()
+    test_infeasible_fixed_warm_start_falls_back_to_hints()
+    test_repair_mode_leaves_assignments_outside_neighborhood_alone()
+    test_repair_mode_leaves_distant_uncovered_slots_uncovered()
+    test_repair_mode_grows_neighborhood_when_infeasible()
+    test_result_reports_status_objective_and_bound()
+    test_infeasible_model_returns_empty_schedule()
+    test_lexicographic_mode_matches_weighted_optimum_and_reports_tiers()
+    test_bulk_extraction_matches_per_variable_reads()
+    test_month_decomposition_stitches_months_back_together()
+    test_progress_callback_streams_and_can_stop_search()
+    test_exactly_one_slot_model_is_smaller_on_july_data()
+    test_exactly_one_slot_model_matches_legacy_objective()
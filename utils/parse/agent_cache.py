@@ -0,0 +1,206 @@
+"""
+agent_cache.py – disk-backed, content-addressed cache for agent calls
+
+Re-ingesting an unchanged roster should not hit the network again, and
+identical notes ("Cannot cover Friday, Saturday, or Sunday shifts.")
+should cost one call, not one per radiologist.
+
+    runner = CachedRunner()
+    result = await runner.run(agent, input_text, check=parse_fn)
+    result.final_output
+
+Entries are keyed by agent name, model, a hash of the instructions and
+output schema, and the exact input text, so editing a prompt invalidates
+its entries automatically.  They live in SQLite and are evicted by age
+and, past max_entries, least recently used first.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from agents import Runner
+from pydantic import BaseModel
+
+
+CACHE_PATH = os.environ.get("AGENT_CACHE_PATH", ".agent_cache.sqlite")   # "" disables the cache
+MAX_ENTRIES = 20_000
+MAX_AGE_DAYS = 30
+
+
+@dataclass
+class CachedResult:
+    """Stands in for a RunResult served from the cache."""
+    final_output: Any
+
+
+def _fingerprint(agent) -> str:
+    instructions = agent.instructions if isinstance(agent.instructions, str) else repr(agent.instructions)
+    schema = ""
+    if isinstance(agent.output_type, type) and issubclass(agent.output_type, BaseModel):
+        schema = json.dumps(agent.output_type.model_json_schema(), sort_keys=True)
+    return hashlib.sha256(f"{instructions}\x00{schema}".encode()).hexdigest()
+
+
+def cache_key(agent, input_text: str) -> str:
+    parts = [agent.name, str(agent.model), _fingerprint(agent), input_text]
+    return hashlib.sha256("\x00".join(parts).encode()).hexdigest()
+
+
+class AgentCache:
+    """
+    SQLite table of key → serialized final_output.  Safe to share across
+    Streamlit's script threads (one connection guarded by a lock).
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = MAX_ENTRIES,
+                 max_age_days: float = MAX_AGE_DAYS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS agent_calls ("
+            " key TEXT PRIMARY KEY, agent TEXT, kind TEXT, value TEXT,"
+            " created REAL, last_used REAL)"
+        )
+        self._db.commit()
+        self.evict()
+
+    def get(self, key: str, agent) -> Optional[CachedResult]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT kind, value, created FROM agent_calls WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            kind, value, created = row
+            if time.time() - created > self.max_age:
+                self._db.execute("DELETE FROM agent_calls WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE agent_calls SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+
+        if kind == "model":
+            return CachedResult(agent.output_type.model_validate_json(value))
+        if kind == "json":
+            return CachedResult(json.loads(value))
+        return CachedResult(value)
+
+    def put(self, key: str, agent, final_output):
+        if isinstance(final_output, BaseModel):
+            kind, value = "model", final_output.model_dump_json()
+        elif isinstance(final_output, str):
+            kind, value = "text", final_output
+        else:
+            kind, value = "json", json.dumps(final_output)
+
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO agent_calls VALUES (?, ?, ?, ?, ?, ?)",
+                (key, agent.name, kind, value, now, now),
+            )
+            self._db.commit()
+
+    def evict(self):
+        """Drops entries past max_age_days, then the least recently used past max_entries."""
+        with self._lock:
+            self._db.execute("DELETE FROM agent_calls WHERE created < ?", (time.time() - self.max_age,))
+            self._db.execute(
+                "DELETE FROM agent_calls WHERE key IN ("
+                " SELECT key FROM agent_calls ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM agent_calls").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM agent_calls")
+            self._db.commit()
+
+
+class CachedRunner:
+    """
+    Drop-in for Runner().run(agent, input) that consults *cache* first and
+    shares one in-flight call between identical concurrent requests.
+
+    *check*, when given, is called on a fresh final_output before it is
+    stored; if it raises, nothing is cached and the error propagates so
+    the caller's retry reaches the model again.
+
+    Counters: calls (network round trips), hits (served from disk),
+    shared (waited on an identical in-flight call).
+    """
+
+    def __init__(self, cache: AgentCache | None = None):
+        self.cache = cache
+        self._in_flight: dict = {}
+        self.calls = self.hits = self.shared = 0
+
+    async def run(self, agent, input_text: str, check: Callable[[Any], Any] | None = None):
+        if self.cache is None:
+            return await self._call(agent, input_text, check)
+
+        key = cache_key(agent, input_text)
+        cached = self.cache.get(key, agent)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            self.shared += 1
+            return await asyncio.shield(pending)
+
+        pending = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = pending
+        try:
+            result = await self._call(agent, input_text, check)
+            self.cache.put(key, agent, result.final_output)
+            pending.set_result(CachedResult(result.final_output))
+            return result
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as err:
+            pending.set_exception(err)
+            pending.exception()                # retrieved: no "never retrieved" warning
+            raise
+        finally:
+            del self._in_flight[key]
+
+    async def _call(self, agent, input_text, check):
+        self.calls += 1
+        result = await Runner.run(agent, input_text)
+        if check is not None:
+            check(result.final_output)
+        return result
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "hits": self.hits, "shared": self.shared}
+
+
+def default_runner() -> CachedRunner:
+    """The process-wide runner, on the AGENT_CACHE_PATH cache (none when that is "")."""
+    global _default_runner
+    if _default_runner is None:
+        _default_runner = CachedRunner(AgentCache(CACHE_PATH) if CACHE_PATH else None)
+    return _default_runner
+
+
+_default_runner: CachedRunner | None = None
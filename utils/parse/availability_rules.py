@@ -0,0 +1,104 @@
+"""
+availability_rules.py – compact availability rules + their compiler
+
+The availability agent describes a note as a handful of rules instead of
+one digit per shift, so its output stays the same size whether the
+schedule spans one month or twelve.  compile_availability() expands the
+rules into the 0/1 row for any schedule_entries.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import List
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from utils.schedule.availability import AvailabilityMatrix
+from utils.schedule.index import ScheduleIndex
+
+
+class WeekdayRule(BaseModel):
+    """A weekly pattern, e.g. "no Fridays" or "only L1 on weekends"."""
+    weekdays: List[int] = Field(description="0=Monday … 6=Sunday")
+    shifts: List[str] = Field(default=[], description="Shifts affected; empty means every shift")
+    available: bool
+
+
+class DateRule(BaseModel):
+    """A date range (one day when start == end), optionally for some shifts only."""
+    start: str = Field(description="YYYY-MM-DD")
+    end: str = Field(description="YYYY-MM-DD, inclusive")
+    shifts: List[str] = Field(default=[], description="Shifts affected; empty means every shift")
+    available: bool
+
+
+class RequestedShift(BaseModel):
+    """A shift the radiologist asked to work – always available."""
+    date: str = Field(description="YYYY-MM-DD")
+    shift: str
+
+
+class AvailabilityRules(BaseModel):
+    """
+    Applied in order, later layers overriding earlier ones:
+        default_available → weekday_rules → date_rules → requests
+    """
+    default_available: bool = Field(description="Availability of any shift no rule mentions")
+    weekday_rules: List[WeekdayRule] = []
+    date_rules: List[DateRule] = []
+    requests: List[RequestedShift] = []
+
+
+def _ordinal(value: str) -> int:
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date().toordinal()
+    except ValueError:
+        raise ValueError(f"Expected a YYYY-MM-DD date, got {value!r}") from None
+
+
+def _shift_mask(shifts: np.ndarray, wanted) -> np.ndarray:
+    return np.isin(shifts, list(wanted)) if wanted else np.ones(len(shifts), dtype=bool)
+
+
+def compile_availability(rules: AvailabilityRules, schedule_entries=None,
+                         index: ScheduleIndex | None = None) -> np.ndarray:
+    """
+    The uint8 availability row (one value per schedule entry) described by
+    *rules*.  Each rule is one vectorized write over the slot arrays.
+    Raises ValueError for weekdays outside 0–6, malformed dates or
+    reversed ranges, so a bad agent answer can be retried.
+    """
+    index = index or ScheduleIndex(schedule_entries)
+    ordinals = np.asarray(index.ordinals, dtype=np.int64)
+    weekdays = np.asarray(index.weekdays, dtype=np.int64)
+    shifts = np.asarray(index.shifts, dtype=object)
+
+    row = np.full(index.num_slots, int(rules.default_available), dtype=np.uint8)
+
+    for rule in rules.weekday_rules:
+        if any(not 0 <= w <= 6 for w in rule.weekdays):
+            raise ValueError(f"Weekdays must be 0–6, got {rule.weekdays}")
+        row[np.isin(weekdays, rule.weekdays) & _shift_mask(shifts, rule.shifts)] = int(rule.available)
+
+    for rule in rules.date_rules:
+        start, end = _ordinal(rule.start), _ordinal(rule.end)
+        if end < start:
+            raise ValueError(f"Date range ends before it starts: {rule.start} … {rule.end}")
+        in_range = (ordinals >= start) & (ordinals <= end)
+        row[in_range & _shift_mask(shifts, rule.shifts)] = int(rule.available)
+
+    for request in rules.requests:
+        row[(ordinals == _ordinal(request.date)) & (shifts == request.shift)] = 1
+
+    return row
+
+
+def compile_availability_matrix(rules_list, schedule_entries) -> AvailabilityMatrix:
+    """One AvailabilityMatrix row per AvailabilityRules, in order."""
+    index = ScheduleIndex(schedule_entries)
+    matrix = AvailabilityMatrix(num_slots=index.num_slots)
+    for rules in rules_list:
+        matrix.append(compile_availability(rules, index=index))
+    return matrix
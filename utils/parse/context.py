@@ -0,0 +1,120 @@
+"""
+context.py – compact, note-filtered schedule context for agent prompts
+
+Prompts used to carry the whole roster's assignments (as datetime.date
+reprs) or every slot of the horizon as indented JSON, so input tokens
+grew with roster size × horizon.  These builders keep only what a note
+can be about – the requester, colleagues it names and the dates it
+mentions (± DATE_PADDING_DAYS) – one dense line per person or date:
+
+    Rad_1: 2025-07-03 L2, 2025-07-10 L3
+    2025-07-10 Thu: L1 Rad_0, L2 Rad_4, L3 Rad_1
+"""
+
+from __future__ import annotations
+
+import re
+from collections import defaultdict
+from datetime import timedelta
+
+from utils.parse.parse_non_AI import dates_in_note
+
+try:                                     # exact counts when tiktoken is installed
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:                        # ImportError, or no cached encoding offline
+    _ENCODING = None
+
+
+DATE_PADDING_DAYS = 1
+# print prompt tokens before / after trimming; building the untrimmed text
+# for the count costs what the trimming saves, so it is off by default
+LOG_CONTEXT_TRIM = False
+
+
+def estimate_tokens(text: str) -> int:
+    """Prompt tokens for *text* (tiktoken when available, else ~4 characters per token)."""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return (len(text) + 3) // 4
+
+
+def log_context_trim(label: str, full_text: str, trimmed_text: str):
+    print(f"✂️ {label} context: {estimate_tokens(full_text)} → {estimate_tokens(trimmed_text)} tokens")
+
+
+def note_window(note, start_date, end_date, padding=DATE_PADDING_DAYS):
+    """(first, last) date the note is about, padded, or None when it names no date."""
+    dates = dates_in_note(note, start_date, end_date)
+    if not dates:
+        return None
+    return dates[0] - timedelta(days=padding), dates[-1] + timedelta(days=padding)
+
+
+def _in_window(day, window):
+    return window is None or window[0] <= day <= window[1]
+
+
+def named_people(note, names):
+    """Roster names that appear in *note* as whole words (case-insensitive)."""
+    text = (note or "").lower()
+    return [n for n in names if re.search(rf"(?<!\w){re.escape(n.lower())}(?!\w)", text)]
+
+
+def assignment_context(note, name, assignments_by_emp, start_date):
+    """
+    The current assignments an edit note can touch: the requester's and
+    named colleagues' shifts within the note's date window, plus who
+    holds every shift on the dates it mentions.  With neither a known
+    person nor a date, everyone over the whole horizon (still dense).
+    """
+    names = list(assignments_by_emp)
+    all_dates = [s["date"] for slots in assignments_by_emp.values() for s in slots]
+    end_date = max(all_dates, default=start_date)
+    window = note_window(note, start_date, end_date)
+    mentioned = set(dates_in_note(note, start_date, end_date))
+
+    named = set(named_people(note, names))
+    people = [n for n in names if n == name or n in named]
+    if not people and window is None:
+        people = names
+
+    lines = []
+    for person in people:
+        slots = sorted(
+            (s["date"], s["shift"]) for s in assignments_by_emp[person] if _in_window(s["date"], window)
+        )
+        held = ", ".join(f"{d.isoformat()} {sh}" for d, sh in slots) or "none"
+        lines.append(f"{person}: {held}")
+
+    if mentioned:
+        holders = defaultdict(list)
+        for person, slots in assignments_by_emp.items():
+            for s in slots:
+                if s["date"] in mentioned:
+                    holders[s["date"]].append((s["shift"], person))
+        for day in sorted(mentioned):
+            shifts = ", ".join(f"{sh} {person}" for sh, person in sorted(holders[day])) or "no assignments"
+            lines.append(f"{day.isoformat()} {day.strftime('%a')}: {shifts}")
+
+    return "\n".join(lines)
+
+
+def shift_context(note, schedule_entries):
+    """
+    The schedulable shifts a request note can refer to, one line per
+    date ("2025-07-12 Sat: L1 L2 L3"), limited to the note's date window
+    when it names dates.
+    """
+    by_date = defaultdict(list)
+    for entry in schedule_entries:
+        by_date[entry["date"]].append(entry["shift"])
+    if not by_date:
+        return ""
+
+    window = note_window(note, min(by_date), max(by_date))
+    return "\n".join(
+        f"{day.isoformat()} {day.strftime('%a')}: {' '.join(shifts)}"
+        for day, shifts in sorted(by_date.items())
+        if _in_window(day, window)
+    )
@@ -0,0 +1,197 @@
+"""
+intent.py – decides which Step 2 agents a note actually needs
+
+"My maximum for this month is three shifts" only needs the monthly-cap
+agent; the flip, request and edit agents would each just return [].
+
+    route = await route_note(note)
+    if "caps" in route.intents: ...
+
+A keyword pass handles notes in tight templates only: every clause
+(split at sentence ends, commas and "but") must carry a cue word, apart
+from bare lists ("Saturday, or Sunday shifts") and filler ("please"),
+and the note may not use a word whose intent depends on context
+("take", "want", "prefer", "cover", "not", ...).  Dates are masked
+first, so "July 3 shift" is not read as a shift count.  Only then are
+the intents without a cue skipped.  Any other note – "I have jury duty
+July 7-9", "Rad_2 will take my July 8 L1" – goes to a small classifier
+model (when MODEL_FALLBACK is on), whose answer is merged with the
+keyword matches, or else to every agent.
+"""
+
+from __future__ import annotations
+
+import re
+from collections import Counter
+from dataclasses import dataclass
+
+from agents import Agent
+from pydantic import BaseModel
+
+from utils.parse.agent_cache import default_runner
+
+
+INTENTS = ("caps", "availability", "requests", "edits")
+MODEL_FALLBACK = True
+
+_NUMBER = r"(?:\d+|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|a couple of|a few)"
+INTENT_CUES = {
+    "caps": re.compile(
+        rf"\b(?:max(?:imum)?|cap|limit|up to|at most|no more than|at least|how many|"
+        rf"(?:{_NUMBER}\s+)?(?:more|fewer|less)\s+shifts?|{_NUMBER}\s+(?:total\s+)?shifts?)\b"
+    ),
+    "availability": re.compile(
+        r"\b(?:available|unavailable|availability|free|cannot|can't|can not|unable|not able|"
+        r"only|out|off|away|vacation|leave|holiday|conference|busy|conflict|block(?:ed)?)\b"
+    ),
+    "requests": re.compile(
+        r"\b(?:request(?:ing|ed)?|would like|like to|want|prefer|take|give me|assign me|sign me up|"
+        r"pick up|can work|could work|happy to work|put me on)\b"
+    ),
+    "edits": re.compile(
+        r"\b(?:swap|trade|switch|give|hand|cover for|replace|remove|drop|add|assign|move|"
+        r"take over|instead of)\b"
+    ),
+}
+
+
+class NoteIntents(BaseModel):
+    caps: bool
+    availability: bool
+    requests: bool
+    edits: bool
+
+
+intent_router_agent = Agent(
+    name="Intent Router Agent",
+    instructions="""
+You route a radiologist's scheduling note to the extractors it needs. Answer true for each that applies:
+- caps: the note changes how many shifts they will work in a month ("my maximum is 3", "I'll take 4 shifts").
+- availability: the note says when they can or cannot work ("out July 3–5", "only free on weekends").
+- requests: the note asks to work specific dates or shifts ("I'd like July 7 L2").
+- edits: the note asks to add, remove or swap someone on an already-assigned shift ("give my July 1 shift to Dr. Lee").
+When unsure, answer true.
+""",
+    model="gpt-4o-mini",
+    output_type=NoteIntents,
+)
+
+
+@dataclass(frozen=True)
+class NoteRoute:
+    intents: frozenset
+    source: str                       # "keywords" | "model" | "all"
+
+    @property
+    def skipped(self):
+        return [intent for intent in INTENTS if intent not in self.intents]
+
+
+class RouterStats:
+    """Running totals across notes, to confirm agent calls per note go down."""
+
+    def __init__(self):
+        self.notes = 0
+        self.agent_calls = 0
+        self.router_calls = 0
+        self.skipped = Counter()
+        self.sources = Counter()
+
+    def record(self, route: NoteRoute):
+        self.notes += 1
+        self.agent_calls += len(route.intents)
+        self.router_calls += route.source == "model"
+        self.skipped.update(route.skipped)
+        self.sources[route.source] += 1
+
+    @property
+    def calls_per_note(self) -> float:
+        return (self.agent_calls + self.router_calls) / self.notes if self.notes else 0.0
+
+    def __repr__(self):
+        return (f"RouterStats({self.notes} notes, {self.calls_per_note:.2f} LLM calls/note, "
+                f"skipped {dict(self.skipped)}, routed by {dict(self.sources)})")
+
+
+ROUTER_STATS = RouterStats()
+
+
+# words that read as more than one intent ("take my shift" / "Rad_2 will take
+# my shift", "prefer to work" / "prefer not to work") and negations
+_AMBIGUOUS = re.compile(
+    r"\b(?:take|takes|taking|want|wants|prefer|prefers|like|cover|covers|covering|"
+    r"not|no|never|cannot|can't|can not|won't|don't|doesn't)\b"
+)
+_MONTH = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?"
+_DATE_PHRASE = re.compile(
+    rf"\b{_MONTH}\s+\d{{1,2}}(?:st|nd|rd|th)?\b|\b\d{{4}}-\d{{1,2}}-\d{{1,2}}\b|"
+    r"\b\d{1,2}/\d{1,2}(?:/\d{2,4})?\b|\b\d{1,2}(?:st|nd|rd|th)\b"
+)
+_CLAUSE_SPLIT = re.compile(r"[.;:!?,]+|\bbut\b|\binstead\b")
+_FILLER = re.compile(r"\b(?:please|thanks|thank you|hi|hello|hey)\b")
+_LIST_ONLY = re.compile(
+    r"^(?:(?:and|or|&|the|shifts?|weekends?|weekdays?|l\d+|"
+    r"(?:mon|tues|wednes|thurs|fri|satur|sun)days?)\s*)+$"
+)
+
+
+def _normalize(note: str) -> str:
+    """Lower-cased *note* with dates masked ("July 3 shift" → "date shift")."""
+    text = (note or "").lower().replace("\u2019", "'")
+    return _DATE_PHRASE.sub(" date ", text)
+
+
+def keyword_intents(note: str) -> frozenset:
+    """The intents whose cue words appear in *note* (filler words ignored)."""
+    text = " ".join(_FILLER.sub(" ", _normalize(note)).split())
+    return frozenset(intent for intent, cue in INTENT_CUES.items() if cue.search(text))
+
+
+def _fully_explained(note: str) -> bool:
+    """True when every clause of *note* carries some intent's cue word."""
+    for clause in _CLAUSE_SPLIT.split(_normalize(note)):
+        clause = " ".join(_FILLER.sub(" ", clause).split())
+        if not clause or _LIST_ONLY.match(clause):
+            continue
+        if not any(cue.search(clause) for cue in INTENT_CUES.values()):
+            return False
+    return True
+
+
+def classify_note_locally(note: str):
+    """
+    The intents *note* needs when the keywords account for all of it,
+    else None (no cue at all, a clause no cue explains, or an ambiguous
+    verb or negation).
+    """
+    if _AMBIGUOUS.search(_normalize(note)):
+        return None
+    intents = keyword_intents(note)
+    if intents and _fully_explained(note):
+        return intents
+    return None
+
+
+async def route_note(note: str, model_fallback: bool | None = None) -> NoteRoute:
+    """Which Step 2 agents *note* needs (recorded in ROUTER_STATS)."""
+    if model_fallback is None:
+        model_fallback = MODEL_FALLBACK
+
+    intents = classify_note_locally(note)
+    if intents is not None:
+        route = NoteRoute(intents, "keywords")
+    elif model_fallback:
+        try:
+            result = await default_runner().run(intent_router_agent, note)
+            answer = result.final_output
+            # the model only adds to what the keywords already found
+            found = keyword_intents(note) | {i for i in INTENTS if getattr(answer, i)}
+            route = NoteRoute(frozenset(found), "model")
+        except Exception as err:
+            print(f"⚠️ Intent router failed, running every agent: {err}")
+            route = NoteRoute(frozenset(INTENTS), "all")
+    else:
+        route = NoteRoute(frozenset(INTENTS), "all")
+
+    ROUTER_STATS.record(route)
+    return route
@@ -1,8 +1,22 @@
-from agents import Agent, Runner
+from agents import Agent
 from datetime import datetime, timedelta
+from collections import Counter
+from typing import List
+import asyncio
 import json
 import ast
 
+from pydantic import BaseModel, Field
+
+from utils.parse.agent_cache import default_runner
+from utils.parse import context
+from utils.parse.context import log_context_trim, shift_context
+from utils.parse.availability_rules import AvailabilityRules, compile_availability
+from utils.parse.parse_non_AI import constraint_blocked_weekdays, parse_note_locally
+from utils.parse.throttle import CallLimiter
+from utils.schedule.availability import AvailabilityMatrix, slot_mask
+from utils.schedule.index import ScheduleIndex
+
 # Agent for availability
 availability_parser_agent = Agent(
     name="Availability Parser Agent",
@@ -11,8 +25,8 @@ You are a scheduling assistant. Your job is to analyze a natural language statem
 
 Rules:
 - 1 means available, 0 means unavailable.
-- Each day has three shifts: L1, L2, and L3 — in that order.
-- The list must be **as long as the number of days × 3** in the date range (inclusive).
+- Each day has the shifts listed in the input (normally L1, L2, and L3) — in that order.
+- The list must be **as long as the number of days × the number of shifts** in the date range (inclusive).
 - Your response must be a **list** of 1s and 0s, like this:
     - Example (2 days):
         Input: '0: 2025-07-01 (Tuesday)', '1: 2025-07-02 (Wednesday)'; The employee has said: "Can cover any weekday or weekend shift. Unavailable for July 2 L1 and L3."
@@ -20,13 +34,65 @@ Rules:
         Explanation: (Omitted in final output) — July 1: L1=1, L2=1, L3=1; July 2: L1=0, L2=1, L3=0
 - Do not return anything other than the list. No explanation.
 - If a radiologist requests a specific shift on a date, ensure their availability on that shift is set to 1, even if other availability patterns would exclude that time. Requests always override unavailability for that specific shift.
-- If a note says “unavailable on [date]” mark all three shifts for that date as 0.
+- If a note says “unavailable on [date]” mark all shifts for that date as 0.
 - If a note says “unavailable for [date] L2 and L3” mark only those specific shifts as 0.
 - I need the output to be formatted so it can be parsed by json.loads without ANY additional symbols or characters
 """,
     model="gpt-4o",
 )
 
+SHIFTS = ("L1", "L2", "L3")
+
+
+# Structured output for whole-window availability: one entry per day
+class DayAvailability(BaseModel):
+    date: str = Field(description="The day, YYYY-MM-DD, exactly as listed in the input")
+    available: List[int] = Field(description="1 (available) or 0 (unavailable) per shift, in the listed shift order")
+
+
+class WindowAvailability(BaseModel):
+    days: List[DayAvailability]
+
+
+# Agent for availability over a whole month / token-budgeted window
+availability_window_agent = Agent(
+    name="Availability Window Agent",
+    instructions="""
+You are a scheduling assistant. Your job is to read a natural language statement about someone's availability and fill in their availability for every listed day.
+
+Rules:
+- Return exactly one entry per listed day, in the listed order, with the date copied as given.
+- Each entry's "available" list has one value per shift, in the listed shift order: 1 means available, 0 means unavailable.
+- If a radiologist requests a specific shift on a date, that shift is 1, even if other availability patterns would exclude it. Requests always override unavailability for that specific shift.
+- If a note says “unavailable on [date]” mark every shift on that date as 0.
+- If a note says “unavailable for [date] L2 and L3” mark only those specific shifts as 0.
+- Days the note does not restrict are available on every shift.
+""",
+    model="gpt-4o",
+    output_type=WindowAvailability,
+)
+
+# Agent for availability as compact rules (size independent of the horizon)
+availability_rules_agent = Agent(
+    name="Availability Rules Agent",
+    instructions="""
+You are a scheduling assistant. Your job is to translate a natural language statement about someone's availability into a small set of rules covering the listed schedule period.
+
+Rules are applied in this order, later ones overriding earlier ones:
+1. default_available – true if the person is available for any shift no rule mentions (e.g. "can cover anything except …"), false if they list the only times they can work (e.g. "only available Mondays").
+2. weekday_rules – weekly patterns. weekdays use 0=Monday … 6=Sunday. shifts lists the affected shifts, or is empty for every shift.
+   Example: "No weekends" → {"weekdays": [5, 6], "shifts": [], "available": false}
+3. date_rules – specific dates or inclusive date ranges (YYYY-MM-DD; start == end for a single day), optionally for some shifts only.
+   Example: "Unavailable for July 2 L1 and L3" → {"start": "2025-07-02", "end": "2025-07-02", "shifts": ["L1", "L3"], "available": false}
+   Example: "On vacation July 10–14" → {"start": "2025-07-10", "end": "2025-07-14", "shifts": [], "available": false}
+4. requests – shifts the person explicitly asks to work. They are always available for these, even if another rule excludes them.
+
+Use only dates inside the schedule period and only the listed shift names. Use as few rules as faithfully describe the note; a note with no restrictions is just default_available = true.
+""",
+    model="gpt-4o",
+    output_type=AvailabilityRules,
+)
+
 # Agent for extracting requested shifts
 request_extraction_agent = Agent(
     name="Request Extraction Agent",
@@ -82,7 +148,7 @@ def extract_json_from_output(output_str):
                 if attempt == 2:
                     raise ValueError(f"Invalid format: {output_str}")
 
-async def extract_availability_chunk(note, chunk_start, chunk_end):
+async def extract_availability_chunk(note, chunk_start, chunk_end, shifts=SHIFTS):
     date_list = [
         f"{i}: {(chunk_start + timedelta(days=i)).strftime('%Y-%m-%d')} ({(chunk_start + timedelta(days=i)).strftime('%A')})"
         for i in range((chunk_end - chunk_start).days + 1)
@@ -96,80 +162,318 @@ Below is a list of days in the schedule, indexed by position:
 
 {indexed_days}
 
-Please return a Python-style list of 0s and 1s, one per shift. Each day has 3 shifts: L1, L2, L3 (in that order).
+Please return a Python-style list of 0s and 1s, one per shift. Each day has {len(shifts)} shifts: {", ".join(shifts)} (in that order).
+"""
+    expected = len(date_list) * len(shifts)
+
+    def check(output):
+        result = extract_list_from_output(output)
+        if len(result) != expected:
+            raise ValueError(f"Expected {expected} shift values, got {len(result)}")
+        return result
+
+    result = await default_runner().run(availability_parser_agent, input_text, check=check)
+    return check(result.final_output)
+
+
+def window_to_list(window, window_start, window_end, shifts=SHIFTS):
+    """
+    Flattens a WindowAvailability into the 0/1 list for window_start …
+    window_end, day-major.  Raises ValueError unless it has exactly the
+    listed days, in order, with one 0/1 per shift.
+    """
+    days = [window_start + timedelta(days=i) for i in range((window_end - window_start).days + 1)]
+    if [d.date for d in window.days] != [d.strftime("%Y-%m-%d") for d in days]:
+        raise ValueError(f"Expected days {days[0]} … {days[-1]}, got {[d.date for d in window.days]}")
+
+    flat = []
+    for day in window.days:
+        if len(day.available) != len(shifts) or any(x not in (0, 1) for x in day.available):
+            raise ValueError(f"Expected {len(shifts)} 0/1 values for {day.date}, got {day.available}")
+        flat.extend(day.available)
+    return flat
+
+
+async def extract_availability_window(note, window_start, window_end, shifts=SHIFTS):
+    """One structured-output call covering every day of window_start … window_end."""
+    date_list = [
+        f"{(window_start + timedelta(days=i)).strftime('%Y-%m-%d')} ({(window_start + timedelta(days=i)).strftime('%A')})"
+        for i in range((window_end - window_start).days + 1)
+    ]
+    indexed_days = "\n".join(date_list)
+
+    input_text = f"""
+The employee has said: "{note}"
+
+Shifts each day, in order: {", ".join(shifts)}
+
+Days:
+
+{indexed_days}
+"""
+    def check(window):
+        return window_to_list(window, window_start, window_end, shifts)
+
+    result = await default_runner().run(availability_window_agent, input_text, check=check)
+    return check(result.final_output)
+
+
+async def extract_availability_rules(note, start_date, end_date, shifts=SHIFTS) -> AvailabilityRules:
+    """One structured-output call describing the note as AvailabilityRules."""
+    input_text = f"""
+The employee has said: "{note}"
+
+Schedule period: {start_date.strftime('%Y-%m-%d')} ({start_date.strftime('%A')}) to {end_date.strftime('%Y-%m-%d')} ({end_date.strftime('%A')})
+Shifts each day: {", ".join(shifts)}
 """
-    runner = Runner()
-    result = await runner.run(availability_parser_agent, input_text)
-    return extract_list_from_output(result.final_output)
+    def check(rules):
+        return compile_availability(rules, window_entries(start_date, end_date, shifts))
+
+    result = await default_runner().run(availability_rules_agent, input_text, check=check)
+    return result.final_output
+
 
 async def extract_requested_shifts(note, schedule_entries):
     """
     Returns: dict[(employee_idx, date, shift)] = 1
     """
-    shift_list = [
-        {"date": entry["date"].strftime("%Y-%m-%d"), "shift": entry["shift"]}
-        for entry in schedule_entries
-    ]
-    shift_text = json.dumps(shift_list, indent=2)
+    shift_text = shift_context(note, schedule_entries)
+    if context.LOG_CONTEXT_TRIM:
+        full_list = [
+            {"date": entry["date"].strftime("%Y-%m-%d"), "shift": entry["shift"]}
+            for entry in schedule_entries
+        ]
+        log_context_trim("Requested-shift", json.dumps(full_list, indent=2), shift_text)
 
     input_text = f"""
 The employee has said: "{note}"
 
-Here are all possible shifts:
+Here are the possible shifts on the dates this note concerns (date weekday: shifts):
 
 {shift_text}
 
 Which shifts has the employee explicitly requested?
 """
-    runner = Runner()
     for attempt in range(3):
-        result = await runner.run(request_extraction_agent, input_text)
         try:
+            result = await default_runner().run(request_extraction_agent, input_text, check=extract_json_from_output)
             return extract_json_from_output(result.final_output)
         except ValueError:
             if attempt == 2:
                 raise
 
-async def extract_availability_matrix(radiologist_df, start_date, end_date):
-    availability_matrix = []
-    requested_shift_map = {}
+# Initial ingestion fans every window / request call out at once under these limits
+MAX_CONCURRENT_CALLS = 8
+CALLS_PER_SECOND = None           # e.g. 5.0 to stay under an account's rate limit
+
+# How availability is split into calls:
+#   "rules"    one call per radiologist returning AvailabilityRules, compiled locally
+#   "month"    one structured-output call per calendar month
+#   "adaptive" windows of as many days as fit in WINDOW_TOKEN_BUDGET output tokens
+#   "chunk"    the original 3-day list calls
+AVAILABILITY_MODE = "rules"
+WINDOW_TOKEN_BUDGET = 2000
+CHUNK_DAYS = 3
+
+# Rough output cost of one day entry: {"date":"2025-07-01","available":[1,1,1]},
+DAY_ENTRY_TOKENS = 16
+TOKENS_PER_SHIFT = 2
+
+
+def window_entries(start_date, end_date, shifts=SHIFTS):
+    """schedule_entries for every shift of every day in start_date … end_date."""
+    return [
+        {"date": start_date + timedelta(days=i), "shift": shift}
+        for i in range((end_date - start_date).days + 1)
+        for shift in shifts
+    ]
+
+
+def availability_windows(start_date, end_date, mode=AVAILABILITY_MODE, num_shifts=len(SHIFTS),
+                         token_budget=WINDOW_TOKEN_BUDGET):
+    """[(window_start, window_end), ...] covering start_date … end_date, in order."""
+    if mode == "rules":
+        return [(start_date, end_date)]
+
+    if mode == "month":
+        windows, ws = [], start_date
+        while ws <= end_date:
+            next_month = (ws.replace(day=28) + timedelta(days=4)).replace(day=1)
+            we = min(end_date, next_month - timedelta(days=1))
+            windows.append((ws, we))
+            ws = we + timedelta(days=1)
+        return windows
+
+    if mode == "adaptive":
+        size = max(1, token_budget // (DAY_ENTRY_TOKENS + TOKENS_PER_SHIFT * num_shifts))
+    elif mode == "chunk":
+        size = CHUNK_DAYS
+    else:
+        raise ValueError(f"Unknown availability extraction mode: {mode!r}")
+
+    total_days = (end_date - start_date).days + 1
+    return [
+        (start_date + timedelta(days=first),
+         min(end_date, start_date + timedelta(days=first + size - 1)))
+        for first in range(0, total_days, size)
+    ]
 
-    schedule_entries = []
-    for d in (start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)):
-        for shift in ["L1", "L2", "L3"]:
-            schedule_entries.append({"date": d, "shift": shift})
 
-    for i in range(len(radiologist_df)):
-        note = radiologist_df["Notes"].iloc[i]
+async def extract_availability_row(note, start_date, end_date, limiter, mode=AVAILABILITY_MODE,
+                                   shifts=SHIFTS, token_budget=WINDOW_TOKEN_BUDGET, on_call=None,
+                                   schedule_entries=None):
+    """
+    One radiologist's availability list over start_date … end_date.
 
-        # Parse availability in 9-shift chunks (i.e., 3-day chunks)
-        total_days = (end_date - start_date).days + 1
-        total_shifts = total_days * 3
-        chunk_size_days = 3
+    Every window (see availability_windows) is requested concurrently,
+    bounded by *limiter*; a window that comes back malformed is retried on
+    its own, up to three times.  In "rules" mode the whole range is one
+    window whose AvailabilityRules are compiled locally.  *on_call* is
+    invoked once per agent call.
 
+    The list has one value per shift of every day unless *schedule_entries*
+    (the uploaded schedule's slots) is given: it then follows them, the
+    rules compiled against them and the other modes' windows projected
+    onto them.
+    """
+    async def window(ws, we):
+        if mode == "rules" and schedule_entries is not None:
+            entries = schedule_entries
+        else:
+            entries = window_entries(ws, we, shifts)
+        expected = len(entries)
         for attempt in range(3):
-            full_list = []
-            for chunk_start_day in range(0, total_days, chunk_size_days):
-                cs = start_date + timedelta(days=chunk_start_day)
-                if cs > end_date:
-                    break
-                ce = min(end_date, cs + timedelta(days=chunk_size_days - 1))
-                chunk_result = await extract_availability_chunk(note, cs, ce)
-                full_list.extend(chunk_result)
-            if len(full_list) == total_shifts:
-                break
-            if attempt == 2:
-                raise ValueError(f"Agent failed 3 times to produce correct shift-level availability list length: {len(full_list)} vs {total_shifts}")
-        availability_matrix.append(full_list)
+            if on_call:
+                on_call()
+            async with limiter:
+                try:
+                    if mode == "chunk":
+                        result = await extract_availability_chunk(note, ws, we, shifts)
+                    elif mode == "rules":
+                        rules = await extract_availability_rules(note, ws, we, shifts)
+                        result = compile_availability(rules, entries).tolist()
+                    else:
+                        result = await extract_availability_window(note, ws, we, shifts)
+                except ValueError as err:
+                    print(f"⚠️ Retrying {ws} … {we}: {err}")
+                    result = []
+            if len(result) == expected:
+                return result
+        raise ValueError(f"Agent failed 3 times to produce correct shift-level availability list length: {len(result)} vs {expected}")
+
+    windows = availability_windows(start_date, end_date, mode, len(shifts), token_budget)
+    full_list = []
+    for window_result in await asyncio.gather(*(window(ws, we) for ws, we in windows)):   # gather keeps window order
+        full_list.extend(window_result)
+    if schedule_entries is not None and mode != "rules":
+        grid = {(e["date"], e["shift"]): k for k, e in enumerate(window_entries(start_date, end_date, shifts))}
+        full_list = [full_list[grid[e["date"], e["shift"]]] for e in schedule_entries]
+    return full_list
+
+
+async def extract_availability_matrix(radiologist_df, start_date, end_date,
+                                      max_concurrency=MAX_CONCURRENT_CALLS,
+                                      calls_per_second=CALLS_PER_SECOND,
+                                      mode=AVAILABILITY_MODE,
+                                      shifts=SHIFTS,
+                                      token_budget=WINDOW_TOKEN_BUDGET,
+                                      call_counts=None,
+                                      fast_path=True,
+                                      parsed_locally=None,
+                                      schedule_entries=None):
+    """
+    Returns (AvailabilityMatrix, requested_shift_map) for every radiologist
+    in *radiologist_df* over start_date … end_date.
+
+    Pass the uploaded schedule's *schedule_entries* so the rows line up
+    with its slots (and *shifts* defaults to the shifts it uses); without
+    them every shift in *shifts* is assumed on every day.
+
+    All window and request-extraction calls for all radiologists run
+    concurrently, at most *max_concurrency* in flight and at most
+    *calls_per_second* started per second; results are reassembled in
+    roster order, so wall time approaches that of the slowest call.
 
-        requested_list = await extract_requested_shifts(note, schedule_entries)
+    With *fast_path*, notes in the usual templates (see
+    parse_note_locally) are compiled without any agent call; only the
+    rest go to the agents.  The agents only read the note, so the
+    Availability_Constraint column is applied to their rows afterwards
+    (requested shifts stay open, as on the fast path).  *call_counts*,
+    when given, is filled with
+    {Radiologist_ID: agent calls} (retries included) and *parsed_locally*
+    with the Radiologist_IDs that took the fast path.
+    """
+    if schedule_entries is None:
+        schedule_entries = window_entries(start_date, end_date, shifts)
+    elif shifts is SHIFTS:
+        shifts = list(dict.fromkeys(entry["shift"] for entry in schedule_entries))
+
+    limiter = CallLimiter(max_concurrency, calls_per_second)
+    runner = default_runner()
+    calls_before, hits_before, shared_before = runner.calls, runner.hits, runner.shared
+    ids = list(radiologist_df["Radiologist_ID"])
+    calls = Counter()
+
+    notes = list(radiologist_df["Notes"])
+    constraints = list(radiologist_df.get("Availability_Constraint", [None] * len(notes)))
+    local_rules = [
+        parse_note_locally(note, constraint, start_date, end_date, shifts) if fast_path else None
+        for note, constraint in zip(notes, constraints)
+    ]
+    index = ScheduleIndex(schedule_entries)
+
+    async def row_for(rad_id, note, rules):
+        if rules is not None:
+            return compile_availability(rules, index=index)
+        return await extract_availability_row(note, start_date, end_date, limiter, mode, shifts, token_budget,
+                                              on_call=lambda: calls.update((rad_id,)),
+                                              schedule_entries=schedule_entries)
+
+    async def requests_for(rad_id, note, rules):
+        if rules is not None:
+            return [r.model_dump() for r in rules.requests]
+        calls[rad_id] += 1
+        async with limiter:
+            return await extract_requested_shifts(note, schedule_entries)
+
+    rows, requests = await asyncio.gather(
+        asyncio.gather(*(row_for(*args) for args in zip(ids, notes, local_rules))),
+        asyncio.gather(*(requests_for(*args) for args in zip(ids, notes, local_rules))),
+    )
+
+    availability_matrix = AvailabilityMatrix(num_slots=len(schedule_entries))
+    requested_shift_map = {}
+    for i, (note, row, requested_list) in enumerate(zip(notes, rows, requests)):
+        availability_matrix.append(row)
+        requested_slots = []
         for r in requested_list:
             req_date = datetime.strptime(r["date"], "%Y-%m-%d").date()
             shift = r["shift"]
             requested_shift_map[(i, req_date, shift)] = 1
+            if (req_date, shift) in index.slot_of:
+                requested_slots.append(index.slot_of[req_date, shift])
+
+        if local_rules[i] is None:
+            blocked = constraint_blocked_weekdays(constraints[i])
+            if blocked is None:
+                print(f"⚠️ Unknown Availability_Constraint for {ids[i]}: {constraints[i]!r}")
+            elif blocked:
+                mask = slot_mask(index, weekdays=blocked)
+                mask[requested_slots] = False
+                availability_matrix.fill(0, rows=i, slots=mask)
 
-        print(f"\n➡️ {radiologist_df['Radiologist_ID'][i]}: {note}")
-        print(f"📤 Availability: {availability_matrix[i]}")
-        print(f"📤 Requests: {requested_shift_map}")
+        print(f"\n➡️ {ids[i]}: {note}")
+        print(f"📤 Availability: {availability_matrix[i].tolist()}")
+        print(f"📡 {calls[ids[i]]} agent calls")
+    print(f"📤 Requests: {requested_shift_map}")
+    local_ids = [rad_id for rad_id, rules in zip(ids, local_rules) if rules is not None]
+    print(f"⚡ {len(local_ids)} of {len(notes)} notes parsed locally")
+    print(f"📡 {limiter.calls} agent calls for {len(notes)} radiologists ({mode} windows); "
+          f"{runner.calls - calls_before} sent, {runner.hits - hits_before} cached, "
+          f"{runner.shared - shared_before} deduplicated")
 
-    return availability_matrix, requested_shift_map
\ No newline at end of file
+    if call_counts is not None:
+        call_counts.update({rad_id: calls[rad_id] for rad_id in ids})
+    if parsed_locally is not None:
+        parsed_locally.extend(local_ids)
+    return availability_matrix, requested_shift_map
@@ -2,8 +2,11 @@ import pandas as pd
 from datetime import datetime
 
 from datetime import datetime
+import re
 import pandas as pd
 
+from utils.parse.availability_rules import AvailabilityRules, DateRule, RequestedShift, WeekdayRule
+
 def get_employee_names_and_caps(radiologist_df: pd.DataFrame, start_date: datetime.date, end_date: datetime.date):
     """
     Extracts:
@@ -39,4 +42,196 @@ def get_schedule_entries(schedule_df: pd.DataFrame):
         }
         schedule_entries.append(entry)
 
-    return schedule_entries
\ No newline at end of file
+    return schedule_entries
+
+
+EDIT_COLUMNS = ["action", "radiologist", "r1", "r2", "date", "shift"]
+
+def read_edit_csv(source):
+    """
+    Reads a bulk-edit CSV (path or file object) into edit dicts for
+    apply_bulk_edits.
+
+    Expected columns: action, date, shift, plus radiologist (add / remove)
+    or r1, r2 (swap).  Blank cells are left out of each dict.
+    """
+    edits_df = pd.read_csv(source, dtype=str, keep_default_na=False)
+    edits_df.columns = [c.strip().lower() for c in edits_df.columns]
+    columns = [c for c in EDIT_COLUMNS if c in edits_df.columns]
+
+    edits = []
+    for row in edits_df[columns].itertuples(index=False):
+        edits.append({c: v.strip() for c, v in zip(columns, row) if v.strip()})
+    return edits
+
+
+# --------------------------------------------------------------------------- #
+#  Fast path: the common note templates, parsed without an agent
+# --------------------------------------------------------------------------- #
+WEEKDAY_NUMBERS = {
+    name: i for i, name in enumerate(
+        ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+    )
+}
+MONTH_NUMBERS = {
+    name: i + 1 for i, name in enumerate(
+        ["january", "february", "march", "april", "may", "june", "july",
+         "august", "september", "october", "november", "december"]
+    )
+}
+MONTH_NUMBERS.update({name[:3]: n for name, n in list(MONTH_NUMBERS.items())})
+MONTH_NUMBERS["sept"] = 9
+
+# Availability_Constraint column → weekdays blocked outright
+CONSTRAINT_BLOCKED_WEEKDAYS = {
+    "any shift": [],
+    "weekday only": [4, 5, 6],          # Friday–Sunday count as the weekend here
+    "weekday + sunday": [4, 5],
+}
+
+_DATE = r"(?:\d{4}-\d{1,2}-\d{1,2}|\d{1,2}/\d{1,2}(?:/\d{2,4})?|[a-z]+\.? \d{1,2}(?:st|nd|rd|th)?)"
+_ANY_SHIFT_RE = re.compile(r"^(?:can cover |available for )?any (?:weekday or weekend )?shifts?$")
+_CANNOT_COVER_RE = re.compile(r"^(?:cannot|can't|can not) (?:cover|work) (?P<days>[a-z ,]+?)(?: shifts?)?$")
+_UNAVAILABLE_RE = re.compile(rf"^unavailable (?:on|for) (?P<date>{_DATE})(?:,? (?P<shifts>.+))?$")
+_REQUEST_RE = re.compile(rf"^requesting (?P<date>{_DATE})(?:,? (?P<shifts>.+))?$")
+_LIST_SPLIT_RE = re.compile(r",? (?:and|or) |, ")
+
+
+def constraint_blocked_weekdays(availability_constraint):
+    """
+    Weekdays (0=Mon … 6=Sun) an Availability_Constraint value rules out:
+    [] for "Any Shift" or an empty cell, None for a value not in
+    CONSTRAINT_BLOCKED_WEEKDAYS.
+    """
+    if not isinstance(availability_constraint, str) or not availability_constraint.strip():
+        return []
+    return CONSTRAINT_BLOCKED_WEEKDAYS.get(availability_constraint.strip().lower())
+
+
+def _split_list(text):
+    return [part.strip() for part in _LIST_SPLIT_RE.split(text) if part.strip()]
+
+
+def _parse_date(text, start_date, end_date):
+    """A note date ("July 7", "7/15", "2025-07-07") inside or nearest the schedule years."""
+    text = text.strip().rstrip(".")
+    try:
+        if "-" in text:
+            return datetime.strptime(text, "%Y-%m-%d").date()
+        if "/" in text:
+            parts = [int(p) for p in text.split("/")]
+            if len(parts) == 3:
+                year = parts[2] + 2000 if parts[2] < 100 else parts[2]
+                return datetime(year, parts[0], parts[1]).date()
+            month, day = parts
+        else:
+            name, day = text.split(" ")
+            month = MONTH_NUMBERS.get(name.rstrip("."))
+            day = int(re.sub(r"(st|nd|rd|th)$", "", day))
+            if month is None:
+                return None
+        for year in range(start_date.year, end_date.year + 1):
+            candidate = datetime(year, month, day).date()
+            if start_date <= candidate <= end_date:
+                return candidate
+        return datetime(start_date.year, month, day).date()
+    except ValueError:
+        return None
+
+
+def _parse_shifts(text, shifts):
+    """Shift names in *text* ("L1 and L2"), [] for "any shift", None if not understood."""
+    if text is None or text.strip() in ("any shift", "any shifts", "all shifts", "all day"):
+        return []
+    named = [part.upper() for part in _split_list(text.strip())]
+    if named and all(name in shifts for name in named):
+        return named
+    return None
+
+
+def parse_note_locally(note, availability_constraint, start_date, end_date, shifts=("L1", "L2", "L3")):
+    """
+    AvailabilityRules for a note written in the usual templates, or None
+    when any sentence falls outside them (the note then goes to the
+    agents).  Understood sentences:
+
+        Can cover any weekday or weekend shift.
+        Cannot cover Friday, Saturday, or Sunday shifts.
+        Unavailable on July 7.            Unavailable for July 2 L1 and L2.
+        Requesting July 12, L1.           Requesting 7/23, any shift.
+
+    The Availability_Constraint column ("Weekday Only", "Weekday + Sunday",
+    "Any Shift") is applied first.  A request without a shift gets one
+    picked by date, as the request agent would pick one for it.
+    """
+    rules = AvailabilityRules(default_available=True)
+
+    blocked = constraint_blocked_weekdays(availability_constraint)
+    if blocked is None:
+        return None
+    if blocked:
+        rules.weekday_rules.append(WeekdayRule(weekdays=blocked, available=False))
+
+    note = note if isinstance(note, str) else ""
+    for sentence in re.split(r"\.(?:\s+|$)", note.strip().lower()):
+        sentence = " ".join(sentence.split())
+        if not sentence:
+            continue
+
+        if _ANY_SHIFT_RE.match(sentence):
+            continue
+
+        match = _CANNOT_COVER_RE.match(sentence)
+        if match:
+            names = [re.sub(r"s$", "", day) for day in _split_list(match["days"])]
+            if not names or any(name not in WEEKDAY_NUMBERS for name in names):
+                return None
+            rules.weekday_rules.append(
+                WeekdayRule(weekdays=sorted(WEEKDAY_NUMBERS[n] for n in names), available=False)
+            )
+            continue
+
+        match = _UNAVAILABLE_RE.match(sentence) or _REQUEST_RE.match(sentence)
+        if match is None:
+            return None
+        day = _parse_date(match["date"], start_date, end_date)
+        named = _parse_shifts(match["shifts"], shifts)
+        if day is None or named is None:
+            return None
+
+        if match.re is _UNAVAILABLE_RE:
+            rules.date_rules.append(
+                DateRule(start=day.isoformat(), end=day.isoformat(), shifts=named, available=False)
+            )
+        else:
+            for shift in named or [shifts[day.toordinal() % len(shifts)]]:
+                rules.requests.append(RequestedShift(date=day.isoformat(), shift=shift))
+
+    return rules
+
+
+_DATE_SPAN_RE = re.compile(
+    r"\b(?P<month>[a-z]+)\.? (?P<first>\d{1,2})(?:st|nd|rd|th)?\s*(?:-|–|to|through|until)\s*"
+    r"(?P<last>\d{1,2})(?:st|nd|rd|th)?\b"
+)
+_DATE_TOKEN_RE = re.compile(rf"(?=\b({_DATE})\b)")      # overlapping: "and 7/20"
+
+
+def dates_in_note(note, start_date, end_date):
+    """
+    Every date a note mentions ("July 7", "7/15", "2025-07-07", and both
+    ends of "July 3-5"), sorted.  Words that only look like dates are
+    skipped.
+    """
+    text = " ".join((note or "").lower().split())
+    found = set()
+    for match in _DATE_TOKEN_RE.finditer(text):
+        day = _parse_date(match.group(1), start_date, end_date)
+        if day is not None:
+            found.add(day)
+    for match in _DATE_SPAN_RE.finditer(text):
+        for day_text in (match["first"], match["last"]):
+            day = _parse_date(f"{match['month']} {day_text}", start_date, end_date)
+            if day is not None:
+                found.add(day)
+    return sorted(found)
@@ -1,10 +1,16 @@
 from datetime import date, datetime
 from agents import Agent, Runner
+import asyncio
 import json
 import ast
 
-from utils.schedule.alterations import build_availability_matrix_from_changes, update_assigned_shifts, update_monthly_caps, update_requested_shifts
+from utils.parse import context as prompt_context
+from utils.parse.context import assignment_context, log_context_trim
+from utils.parse.intent import ROUTER_STATS, route_note
+from utils.schedule.alterations import ScheduleState, describe_edit
+from utils.schedule.availability import AvailabilityMatrix
 from utils.schedule.scheduler import schedule_with_fallback_days_only
+from utils.schedule.solver import INTERACTIVE
 
 
 # Agent to detect and extract monthly cap change requests
@@ -231,6 +237,11 @@ async def get_assignment_edits(
     if start_date is None:
         start_date = date.today()
     fallback_year = start_date.year
+    assignments_by_emp = assignments_by_emp or {}
+
+    context = assignment_context(note, name, assignments_by_emp, start_date)
+    if prompt_context.LOG_CONTEXT_TRIM:
+        log_context_trim("Assignment", str(assignments_by_emp), context)
 
     prompt = f"""
 Radiologist: {name or 'Unknown'}
@@ -238,7 +249,8 @@ Note: "{note}"
 
 Extract assignment change operations. If a date is mentioned without a year or with an incorrect year, assume the year is {fallback_year}.
 
-Here are the current employee assignments: {assignments_by_emp}
+Current assignments of the people and dates this note concerns:
+{context}
 
 Return a list in this format:
 [
@@ -304,66 +316,101 @@ async def extract_monthly_cap_updates(note: str, name: str | None = None, year:
 
     return parse_json_list(output_str)
 
-async def process_note_against_schedule(note, name, start_date, availability_matrix, assignments_by_emp, requested_shift_map, monthly_caps, schedule_entries, final_schedule):
-    num_slots = len(schedule_entries)
-    uncovered = []
-    radiologists = list(assignments_by_emp.keys())
+def note_repair_scope(name, cap_updates, flip_ops, request_ops):
+    """
+    Radiologists and dates a note touches, for the scheduler's repair mode:
+    the requestor, everyone named by a parsed operation, and every date
+    that appears in an availability flip or a requested shift.
+    """
+    radiologists = {name} if name else set()
+    radiologists.update(op["name"] for op in cap_updates + flip_ops + request_ops if "name" in op)
+
+    dates = set()
+    for entry in [f for op in flip_ops for f in op.get("flips", [])] + \
+                 [sh for op in request_ops for sh in op.get("shifts", [])]:
+        date_val = entry.get("date")
+        if isinstance(date_val, str):
+            try:
+                date_val = datetime.strptime(date_val, "%Y-%m-%d").date()
+            except ValueError:
+                continue
+        if isinstance(date_val, date):
+            dates.add(date_val)
+
+    return {"dates": dates, "radiologists": radiologists}
+
+async def _skipped():
+    return []
+
+async def process_note_against_schedule(note, name, start_date, availability_matrix, assignments_by_emp, requested_shift_map, monthly_caps, schedule_entries, final_schedule, routing=None, edit_report=None, state=None):
+    """
+    Applies one radiologist's note to the schedule.  Only the agents the
+    intent router picks for the note are called; *routing*, when given,
+    is filled with that note's route (intents, skipped agents, source).
+    *edit_report*, when given, is filled with the assignment edits that
+    were skipped and those applied with a warning, one line each.
+
+    Pass the caller's live ScheduleState as *state* (built over these same
+    objects) to skip its O(slots) build; the edits then go straight into it.
+    """
+    if state is None:
+        num_slots = len(schedule_entries)
+        radiologists = list(assignments_by_emp.keys())
+        # sessions saved before the compact matrix still hold a list of lists
+        availability_matrix = AvailabilityMatrix.coerce(availability_matrix, num_slots)
+        # one indexed state for every alteration below; all edits apply in O(1)
+        state = ScheduleState(final_schedule, assignments_by_emp, [], schedule_entries,
+                              availability_matrix, requested_shift_map, monthly_caps, radiologists)
+    final_schedule, assignments_by_emp, _ = state.result()
+    radiologists, schedule_entries = state.employees, state.schedule_entries
+    availability_matrix, requested_shift_map, monthly_caps = (
+        state.availability_matrix, state.requested_shift_map, state.monthly_caps
+    )
 
-    cap_updates = await extract_monthly_cap_updates(note, name, start_date.year, start_date.month, radiologists)
-    monthly_caps, radiologists, availability_matrix = update_monthly_caps(
-        cap_updates, monthly_caps, radiologists, availability_matrix, default_availability_length=num_slots
+    # 🧭 skip the agents this note has nothing for
+    route = await route_note(note)
+    print(f"🧭 Route ({route.source}): {sorted(route.intents)}; skipped {route.skipped}")
+    print(f"🧭 {ROUTER_STATS}")
+    if routing is not None:
+        routing.update(intents=sorted(route.intents), skipped=route.skipped, source=route.source)
+
+    # ⚡ the agents only read the note and the current schedule, so ask them
+    # all at once; their results are still applied below in a fixed order
+    cap_updates, flip_ops, request_ops, edit_ops = await asyncio.gather(
+        extract_monthly_cap_updates(note, name, start_date.year, start_date.month, list(radiologists))
+        if "caps" in route.intents else _skipped(),
+        get_availability_flips(note, name, default_year=start_date.year)
+        if "availability" in route.intents else _skipped(),
+        get_requested_shifts(note, name, start_date.year)
+        if "requests" in route.intents else _skipped(),
+        get_assignment_edits(note, name, start_date, assignments_by_emp)
+        if "edits" in route.intents else _skipped(),
     )
+
+    state.update_monthly_caps(cap_updates)
     print("✅ Monthly cap update successful:", cap_updates)
     
-    flip_ops = await get_availability_flips(note, name, default_year=start_date.year)
-    availability_matrix = build_availability_matrix_from_changes(flip_ops, availability_matrix, radiologists, schedule_entries)
+    state.flip_availability(flip_ops)
     print("✅ Availability flip:", flip_ops)
     print("Availability Matrix # of Rows: ", len(availability_matrix))
     # print("Availability Matrix: ", availability_matrix[-1])
     
-    request_ops = await get_requested_shifts(note, name, start_date.year)
-    requested_shift_map = update_requested_shifts(request_ops, requested_shift_map, radiologists)
+    state.update_requested_shifts(request_ops)
     print("✅ Requested shifts:", request_ops)
 
-    for rad in radiologists:
-        if rad not in assignments_by_emp:
-            assignments_by_emp[rad] = []
+    # new names from the cap agent get their (empty) assignment lists
+    final_schedule, assignments_by_emp, uncovered = state.result()
 
-    radiologists = list(assignments_by_emp.keys())
-
-    edit_ops = await get_assignment_edits(note, name, start_date, assignments_by_emp)
-    # Ensure any new names in edit_ops are accounted for
+    # new names in edit_ops are added (with the default cap) only by edits that apply
     for edit in edit_ops:
-        involved = []
-        if edit["action"] == "swap":
-            involved = [edit["r1"], edit["r2"]]
-        elif edit["action"] in {"add", "remove"}:
-            involved = [edit["radiologist"]]
-        for r in involved:
-            if r not in assignments_by_emp:
-                print(f"🆕 Detected new radiologist in edit: {r} — initializing")
-                assignments_by_emp[r] = []
-                if r not in radiologists:
-                    radiologists.append(r)
-                if len(availability_matrix) < len(radiologists):
-                    availability_matrix.append([1] * len(schedule_entries))
-            # 🛡️ Ensure monthly cap is set for new radiologists
-        month_str = f"{start_date.year}-{start_date.month:02d}"
-        for r in involved:
-            idx = radiologists.index(r)
-            cap_key = (idx, month_str)
-            if cap_key not in monthly_caps:
-                monthly_caps[cap_key] = 5  # default cap
-    final_schedule, assignments_by_emp, uncovered = update_assigned_shifts(
-            edits=edit_ops,
-            final_schedule=final_schedule,
-            assignments_by_emp=assignments_by_emp,
-            uncovered_slots=uncovered,
-            schedule_entries=schedule_entries,
-            availability_matrix=availability_matrix,
-            requested_shift_map=requested_shift_map,
-            monthly_caps=monthly_caps,
-            employees=radiologists
+        for r in (edit.get("r2"), edit.get("radiologist")):
+            if r is not None and r not in state.name_to_idx:
+                print(f"🆕 Detected new radiologist in edit: {r}")
+    final_schedule, assignments_by_emp, uncovered = state.apply_edits(edit_ops).result()
+    if edit_report is not None:
+        edit_report.update(
+            skipped=[f"{describe_edit(edit)}: {reason}" for edit, reason in state.skipped],
+            warnings=[f"{describe_edit(edit)}: {warning}" for edit, warning in state.warnings],
         )
     
     if not edit_ops:
@@ -373,7 +420,17 @@ async def process_note_against_schedule(note, name, start_date, availability_mat
                 print(f"❌ Invalid key in requested_shift_map: {k}")
             else:
                 print(f"✅ Valid key: {k}")
-        final_schedule, assignments_by_emp, uncovered = schedule_with_fallback_days_only(radiologists, schedule_entries, availability_matrix, monthly_caps, requested_shift_map)
+        # ♻️ Warm-started repair: only re-optimize around what the note touched
+        scope = note_repair_scope(name, cap_updates, flip_ops, request_ops)
+        result = schedule_with_fallback_days_only(
+            radiologists, schedule_entries, availability_matrix, monthly_caps, requested_shift_map,
+            hint_schedule=final_schedule, repair_scope=scope, config=INTERACTIVE
+        )
+        print(f"🧮 Solver status: {result.status} in {result.wall_time:.2f}s (objective {result.objective})")
+        if result.has_solution:
+            final_schedule, assignments_by_emp, uncovered = result
+        else:
+            print("⚠️ Keeping the previous schedule")
     print("✅ Assignment edit:", edit_ops)
     print_result("Final Schedule After Request", (final_schedule, assignments_by_emp, uncovered))
 
@@ -0,0 +1,63 @@
+"""
+throttle.py – bounded concurrency + token-bucket rate limit for LLM calls
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+
+class CallLimiter:
+    """
+    Async context manager guarding one LLM round trip:
+
+        limiter = CallLimiter(max_concurrency=8, calls_per_second=5)
+        async with limiter:
+            await Runner.run(agent, text)
+
+    At most *max_concurrency* calls are in flight at once, and call starts
+    are spaced by a token bucket refilled at *calls_per_second* that holds
+    up to *burst* tokens (default: max_concurrency).  calls_per_second=None
+    disables the rate limit.
+
+    Create it inside the running event loop (asyncio.run gives each
+    Streamlit click its own loop).
+    """
+
+    def __init__(self, max_concurrency: int = 8, calls_per_second: float | None = None,
+                 burst: int | None = None):
+        self._slots = asyncio.Semaphore(max(1, max_concurrency))
+        self._rate = calls_per_second
+        self._capacity = float(burst or max(1, max_concurrency))
+        self._tokens = self._capacity
+        self._refilled = time.monotonic()
+        self._bucket_lock = asyncio.Lock()
+        self.calls = 0
+
+    async def __aenter__(self):
+        await self._slots.acquire()
+        try:
+            await self._take_token()
+        except BaseException:
+            self._slots.release()
+            raise
+        self.calls += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        self._slots.release()
+        return False
+
+    async def _take_token(self):
+        if not self._rate:
+            return
+        async with self._bucket_lock:          # first come, first served
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._refilled) * self._rate)
+                self._refilled = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self._rate)
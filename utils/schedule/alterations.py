@@ -1,16 +1,47 @@
-from typing import List, Dict, Optional, Tuple
+import os
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Set, Tuple, Union
 from datetime import date, datetime
+from .availability import AvailabilityMatrix
+from .candidates import CoverageIndex
+from .index import ScheduleIndex
 from .scheduler import schedule_with_fallback_days_only
+from utils.parse.parse_non_AI import read_edit_csv
 
+# Every mutator accepts the compact matrix or the historical list of lists
+Availability = Union[AvailabilityMatrix, List[List[int]]]
+
+DEFAULT_MONTHLY_CAP = 5     # cap given to radiologists first seen in an edit
+
+
+class EditRejected(ValueError):
+    """An assignment edit that cannot be applied; *index* is its position in the batch."""
+
+    def __init__(self, index: int, edit: Dict, reason: str):
+        super().__init__(f"Edit {index + 1} {edit}: {reason}")
+        self.index = index
+        self.edit = edit
+        self.reason = reason
+
+
+def _to_date(value) -> date:
+    """datetime.date from a 'YYYY-MM-DD' string (dates pass through)."""
+    if isinstance(value, str):
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    return value
+
+
+def _name_index(names: List[str]) -> Dict[str, int]:
+    return {name: i for i, name in enumerate(names)}
 
 
 def update_monthly_caps(
     requests: List[Dict[str, str]],
     monthly_caps: Dict[Tuple[int, str], int],
     radiologist_names: List[str],
-    availability_matrix: List[List[int]],
+    availability_matrix: Availability,
     default_availability_length: int
-) -> Tuple[Dict[Tuple[int, str], int], List[str], List[List[int]]]:
+) -> Tuple[Dict[Tuple[int, str], int], List[str], Availability]:
     """
     Modifies monthly_caps in-place. Adds radiologists and availability if new.
 
@@ -18,42 +49,31 @@ def update_monthly_caps(
         requests: List of dicts with keys 'name', 'new_max', 'month'
         monthly_caps: Dict mapping (radiologist index, 'YYYY-MM') to int
         radiologist_names: List of radiologist names
-        availability_matrix: List of availability lists per radiologist
+        availability_matrix: AvailabilityMatrix (or list of lists) per radiologist
         default_availability_length: Length of the shift list to initialize new availability
 
     Returns:
         Tuple containing updated (monthly_caps, radiologist_names, availability_matrix)
     """
-    for r in requests:
-        name = r["name"]
-        cap = r["new_max"]
-        month = r["month"]
-
-        if name not in radiologist_names:
-            idx = len(radiologist_names)
-            radiologist_names.append(name)
-            availability_matrix.append([1] * default_availability_length)
-        else:
-            idx = radiologist_names.index(name)
-
-        monthly_caps[(idx, month)] = cap
-
+    _apply_cap_updates(requests, monthly_caps, radiologist_names, availability_matrix,
+                       default_availability_length, _name_index(radiologist_names))
     return monthly_caps, radiologist_names, availability_matrix
 
 
 def build_availability_matrix_from_changes(
     changes: List[Dict],
-    availability_matrix: List[List[int]],
+    availability_matrix: Availability,
     radiologist_names: List[str],
     schedule_entries: List[Dict[str, date]]
-) -> List[List[int]]:
+) -> Availability:
     """
     Update the availability_matrix in-place using explicitly provided True/False availability
     for specific (date, shift) combinations for each radiologist.
 
     Args:
         changes: List of dicts with 'name' and 'flips' (with 'date', 'shift', 'available')
-        availability_matrix: The current matrix (will be modified)
+        availability_matrix: The current matrix (will be modified); an
+            AvailabilityMatrix takes each radiologist's flips in one write
         radiologist_names: Ordered list of radiologist names
         schedule_entries: List of schedule entries with 'date' and 'shift'
 
@@ -65,41 +85,7 @@ def build_availability_matrix_from_changes(
         (entry["date"], entry["shift"]): i
         for i, entry in enumerate(schedule_entries)
     }
-
-    for change in changes:
-        name = change["name"]
-        flips = change["flips"]
-
-        if name not in radiologist_names:
-            print(f"⚠️ Skipping unknown radiologist: {name}")
-            continue
-
-        idx = radiologist_names.index(name)
-
-        for flip in flips:
-            try:
-                date_val = flip["date"]
-                shift = flip["shift"]
-                available = flip.get("available", True)
-
-                # Parse string date if needed
-                if isinstance(date_val, str):
-                    date_obj = datetime.strptime(date_val, "%Y-%m-%d").date()
-                else:
-                    date_obj = date_val
-
-                key = (date_obj, shift)
-                shift_idx = shift_to_index.get(key)
-
-                if shift_idx is not None:
-                    availability_matrix[idx][shift_idx] = int(available)
-                else:
-                    print(f"⚠️ Shift not found in schedule: {key}")
-
-            except Exception as e:
-                print("❌ Error processing flip:", e)
-                continue
-
+    _apply_flips(changes, availability_matrix, _name_index(radiologist_names), shift_to_index)
     return availability_matrix
 
 def update_requested_shifts(
@@ -118,25 +104,7 @@ def update_requested_shifts(
     Returns:
         Updated requested_shift_map
     """
-    for change in changes:
-        name = change["name"]
-        action = change["action"]
-        shifts = change["shifts"]
-        if name not in radiologist_names:
-            continue
-        idx = radiologist_names.index(name)
-
-        for shift in shifts:
-            # 🛠️ Normalize date string to datetime.date
-            date_val = shift["date"]
-            if isinstance(date_val, str):
-                date_val = datetime.strptime(date_val, "%Y-%m-%d").date()
-            key = (idx, date_val, shift["shift"])
-            if action == "add":
-                requested_shift_map[key] = 1
-            elif action == "remove":
-                requested_shift_map.pop(key, None)
-
+    _apply_request_changes(changes, requested_shift_map, _name_index(radiologist_names))
     return requested_shift_map
 
 def update_assigned_shifts(
@@ -145,7 +113,7 @@ def update_assigned_shifts(
     assignments_by_emp: Dict[str, List[Dict]],
     uncovered_slots: List[Dict],
     schedule_entries: List[Dict],
-    availability_matrix: List[List[int]],
+    availability_matrix: Availability,
     requested_shift_map: Dict[Tuple[int, datetime.date, str], int],
     monthly_caps: Dict[Tuple[int, str], int],
     employees: List[str]
@@ -154,13 +122,21 @@ def update_assigned_shifts(
     Applies assignment edits to the current shift allocation.
     If a reoptimization flag is present, triggers full schedule recomputation.
 
+    Swaps and adds go through a CoverageIndex first: an edit that would put
+    someone on a slot they are unavailable for or over their monthly cap
+    is skipped with a warning.  A second shift the same day is applied
+    (the edit was asked for explicitly) but warned about.
+
+    Builds a ScheduleState (one O(slots) pass) and applies every edit in
+    O(1); keep a ScheduleState alive to skip the build across batches.
+
     Args:
         edits: Either list of edit dicts or a single dict with {"action": "reoptimize"}
         final_schedule: List of names (or None) for each shift slot
         assignments_by_emp: Dict mapping employee to their assigned shift entries
         uncovered_slots: List of unfilled shift entries
         schedule_entries: All remaining unassigned shift entries
-        availability_matrix: 2D list of availability
+        availability_matrix: AvailabilityMatrix or 2D list of availability
         requested_shift_map: Dict of explicit requests
         monthly_caps: Dict of (index, 'YYYY-MM') → max shifts
         radiologist_names: List of names corresponding to matrix indices
@@ -168,107 +144,469 @@ def update_assigned_shifts(
     Returns:
         Updated (final_schedule, assignments_by_emp, uncovered_slots)
     """
-    # print(edits)
-
-    for edit in edits:
-        action = edit.get("action")
-
-        if action == "swap":
-            r1 = edit["r1"]
-            r2 = edit["r2"]
-            date = datetime.strptime(edit["date"], "%Y-%m-%d").date()
-            shift = edit["shift"]
-
-            # 1. Update assignments_by_emp
-            assignments_by_emp[r1] = [
-                se for se in assignments_by_emp[r1]
-                if not (se["date"] == date and se["shift"] == shift)
-            ]
-            assignments_by_emp[r2].append({"date": date, "shift": shift})
-
-            # 2. Update final_schedule
-            for i, se in enumerate(schedule_entries):
-                if se["date"] == date and se["shift"] == shift:
-                    final_schedule[i] = r2
-                    break
-
-            # 3. Update requested_shift_map
-            r1_idx = employees.index(r1) if r1 in employees else None
-            r2_idx = employees.index(r2) if r2 in employees else None
-
-            # Remove old request
-            if r1_idx is not None:
-                key = (r1_idx, date, shift)
-                requested_shift_map.pop(key, None)
+    state = ScheduleState(
+        final_schedule, assignments_by_emp, uncovered_slots, schedule_entries,
+        availability_matrix, requested_shift_map, monthly_caps, employees
+    )
+    return state.apply_edits(edits).result()
 
-            # Add new request
-            if r2_idx is not None:
-                key = (r2_idx, date, shift)
-                requested_shift_map[key] = 1
 
-        elif action == "remove":
-            r = edit["radiologist"]
-            date = datetime.strptime(edit["date"], "%Y-%m-%d").date()
-            shift = edit["shift"]
-
-            # Remove from assignments
-            assignments_by_emp[r] = [
-                se for se in assignments_by_emp[r]
-                if not (se["date"] == date and se["shift"] == shift)
-            ]
-
-            # Update final_schedule and uncovered_slots
-            for i, se in enumerate(schedule_entries):
-                if se["date"] == date and se["shift"] == shift:
-                    final_schedule[i] = None
-                    uncovered_slots.append(se)
-                    break
-
-            # Update availability_matrix to mark as unavailable
-            if r in employees:
-                r_idx = employees.index(r)
-                for i, se in enumerate(schedule_entries):
-                    if se["date"] == date and se["shift"] == shift:
-                        availability_matrix[r_idx][i] = 0
-                        break
-
-        elif action == "add":
-            r = edit["radiologist"]
-            date = datetime.strptime(edit["date"], "%Y-%m-%d").date()
-            shift = edit["shift"]
-
-            if r not in employees:
-                employees.append(r)
-                # 🛡️ Ensure cap exists for this radiologist
-            r_idx = employees.index(r)
-            month_str = datetime.now().strftime("%Y-%m")  # or pass in explicitly
-            cap_key = (r_idx, month_str)
-            if cap_key not in monthly_caps:
-                monthly_caps[cap_key] = 5
-            if r not in assignments_by_emp:
-                assignments_by_emp[r] = []
-            if len(employees) > len(availability_matrix):
-                availability_matrix.append([1]*len(schedule_entries))
-
-            # Check if the radiologist already has this shift
-            if any(s["date"] == date and s["shift"] == shift for s in assignments_by_emp.get(r, [])):
-                continue  # Skip to avoid duplicate
-
-            for i, se in enumerate(schedule_entries):
-                if se["date"] == date and se["shift"] == shift:
-                    if final_schedule[i] is not None:
-                        break  # Slot is already filled by someone else
-
-                    # Assign shift
-                    final_schedule[i] = r
-                    assignments_by_emp[r].append({"date": date, "shift": shift})
-                    if se in uncovered_slots:
-                        uncovered_slots.remove(se)
-
-                    # Add to requested_shift_map
-                    if r in employees:
-                        r_idx = employees.index(r)
-                        key = (r_idx, date, shift)
-                        requested_shift_map[key] = 1
-
-    return final_schedule, assignments_by_emp, uncovered_slots
+def apply_bulk_edits(
+    edits,
+    final_schedule: List[Optional[str]],
+    assignments_by_emp: Dict[str, List[Dict]],
+    uncovered_slots: List[Dict],
+    schedule_entries: List[Dict],
+    availability_matrix: Availability,
+    requested_shift_map: Dict[Tuple[int, datetime.date, str], int],
+    monthly_caps: Dict[Tuple[int, str], int],
+    employees: List[str]
+) -> Tuple[List[Optional[str]], Dict[str, List[Dict]], List[Dict]]:
+    """
+    Applies a whole batch of swap / add / remove edits (e.g. the month-end
+    requests) as one all-or-nothing transaction.
+
+    Every edit is checked, in order, against availability, monthly caps
+    and who holds the slot.  If any edit fails, nothing is changed and
+    EditRejected names the first failing edit.  Edits that give someone a
+    second shift the same day still apply and are printed as warnings.
+    Derived state (assignment lists, uncovered slots) is refreshed once
+    at the end.
+
+    Args:
+        edits: list of edit dicts (as for update_assigned_shifts), or a CSV
+            path / file object with columns action, radiologist, r1, r2, date, shift
+        (remaining arguments as for update_assigned_shifts)
+
+    Returns:
+        Updated (final_schedule, assignments_by_emp, uncovered_slots)
+    """
+    if isinstance(edits, (str, os.PathLike)) or hasattr(edits, "read"):
+        edits = read_edit_csv(edits)
+
+    state = ScheduleState(
+        final_schedule, assignments_by_emp, uncovered_slots, schedule_entries,
+        availability_matrix, requested_shift_map, monthly_caps, employees
+    )
+    with state.transaction():
+        state.apply_edits(edits, strict=True)
+    return state.result()
+
+
+# --------------------------------------------------------------------------- #
+#  Indexed schedule state
+# --------------------------------------------------------------------------- #
+class ScheduleState:
+    """
+    One schedule plus the lookups every alteration needs:
+
+        slot_of        (date, shift) → slot        (ScheduleIndex)
+        name_to_idx    radiologist → matrix row
+        assigned       radiologist → {slot, ...}
+        uncovered      {slot, ...}
+        coverage       CoverageIndex for availability / cap / day checks
+        skipped        [(edit, reason)] refused by the last apply_edits()
+        warnings       [(edit, warning)] applied by it, but worth a look
+
+    final_schedule, the availability matrix, requested_shift_map,
+    monthly_caps, employees, assignments_by_emp and uncovered_slots are
+    the caller's objects and are updated in place.  Every edit is O(1);
+    result() rewrites only the assignment lists of radiologists an edit
+    touched, so k edits on a live state cost O(k) whatever the horizon.
+    """
+
+    def __init__(self, final_schedule, assignments_by_emp, uncovered_slots, schedule_entries,
+                 availability_matrix, requested_shift_map, monthly_caps, employees,
+                 index: Optional[ScheduleIndex] = None):
+        self.final_schedule = final_schedule
+        self.assignments_by_emp = assignments_by_emp
+        self.uncovered_slots = uncovered_slots
+        self.schedule_entries = schedule_entries
+        self.availability_matrix = availability_matrix
+        self.requested_shift_map = requested_shift_map
+        self.monthly_caps = monthly_caps
+        self.employees = employees
+
+        self.index = index or ScheduleIndex(schedule_entries)
+        self.slot_of = self.index.slot_of
+        self.name_to_idx = _name_index(employees)
+        self.coverage = CoverageIndex(employees, schedule_entries, availability_matrix,
+                                      monthly_caps, final_schedule, self.index)
+
+        self.assigned: Dict[str, Set[int]] = {name: set() for name in assignments_by_emp}
+        for s, name in enumerate(final_schedule):
+            if name is not None:
+                self.assigned.setdefault(name, set()).add(s)
+        self.uncovered: Set[int] = {
+            self.slot_of[se["date"], se["shift"]] for se in uncovered_slots
+            if (se["date"], se["shift"]) in self.slot_of
+        }
+
+        self.skipped: List[Tuple[Dict, str]] = []
+        self.warnings: List[Tuple[Dict, str]] = []
+
+        self._known = len(employees)           # roster size the lookups cover
+        self._touched: Set[str] = set()        # names whose list result() rewrites
+        self._uncovered_changed = False
+
+    # ------------------------------------------------------------------ #
+    #  Caps, availability, requests
+    # ------------------------------------------------------------------ #
+    def update_monthly_caps(self, requests: List[Dict]) -> "ScheduleState":
+        _apply_cap_updates(requests, self.monthly_caps, self.employees, self.availability_matrix,
+                           self.index.num_slots, self.name_to_idx)
+        self._sync_roster()
+        for r in requests:
+            self.coverage.set_cap(r["name"], r["month"], r["new_max"])
+        return self
+
+    def flip_availability(self, changes: List[Dict]) -> "ScheduleState":
+        self._sync_roster()
+        _apply_flips(changes, self.availability_matrix, self.name_to_idx, self.slot_of)
+        return self
+
+    def update_requested_shifts(self, changes: List[Dict]) -> "ScheduleState":
+        self._sync_roster()
+        _apply_request_changes(changes, self.requested_shift_map, self.name_to_idx)
+        return self
+
+    def add_radiologist(self, name: str, month: Optional[str] = None,
+                        default_cap: int = DEFAULT_MONTHLY_CAP) -> int:
+        """
+        Row index of *name*, adding them first if new: full availability,
+        an empty assignment list and *default_cap* for *month* unless a cap
+        is already set.
+        """
+        if name not in self.name_to_idx:
+            self.employees.append(name)
+            self._sync_roster()
+        e = self.name_to_idx[name]
+        if len(self.employees) > len(self.availability_matrix):
+            self.availability_matrix.append([1] * self.index.num_slots)
+        if month is not None and (e, month) not in self.monthly_caps:
+            self.monthly_caps[e, month] = default_cap
+            self.coverage.set_cap(name, month, default_cap)
+        if name not in self.assigned:
+            self.assigned[name] = set()
+            self._touched.add(name)
+        return e
+
+    def _sync_roster(self):
+        """Picks up names appended to *employees* (here, by a helper or by the caller)."""
+        for e in range(self._known, len(self.employees)):
+            name = self.employees[e]
+            self.name_to_idx[name] = e
+            if name not in self.assigned:
+                self.assigned[name] = set()
+                self._touched.add(name)
+        if len(self.employees) > self._known:
+            self._known = len(self.employees)
+            self.coverage.add_employee(self.employees[-1], self.monthly_caps)
+
+    # ------------------------------------------------------------------ #
+    #  Assignment edits
+    # ------------------------------------------------------------------ #
+    def apply_edits(self, edits: List[Dict], strict: bool = False) -> "ScheduleState":
+        """
+        Applies swap / remove / add edits in order.
+
+        By default an edit that cannot be applied is skipped and recorded
+        in *skipped* with its reason, and unknown actions (e.g. "reoptimize")
+        are ignored.  With *strict* the first such edit raises EditRejected
+        instead; wrap the call in transaction() to undo the edits applied
+        before it.  Applied edits that leave someone on two shifts in one
+        day are recorded in *warnings*.
+        """
+        self._sync_roster()
+        self.skipped, self.warnings = [], []
+        handlers = {"swap": self._swap_edit, "remove": self._remove_edit, "add": self._add_edit}
+        for i, edit in enumerate(edits):
+            action = edit.get("action")
+            handler = handlers.get(action)
+            if handler is None:
+                if strict:
+                    raise EditRejected(i, edit, f"unknown action {action!r}")
+                continue
+            try:
+                problem = handler(edit)
+            except (KeyError, ValueError) as e:
+                problem = f"malformed edit ({e})"
+            if problem:
+                if strict:
+                    raise EditRejected(i, edit, problem)
+                print(f"⚠️ Skipping {action}: {problem}")
+                self.skipped.append((edit, problem))
+                continue
+            warning = self._day_warning(edit)
+            if warning:
+                print(f"⚠️ {warning}")
+                self.warnings.append((edit, warning))
+        return self
+
+    def _day_warning(self, edit) -> Optional[str]:
+        """Set when an applied swap / add gave someone a second shift that day."""
+        if edit["action"] == "remove":
+            return None
+        name = edit["r2"] if edit["action"] == "swap" else edit["radiologist"]
+        day = _to_date(edit["date"])
+        count = self.coverage.shifts_on_day(name, (day, edit["shift"]))
+        if count > 1:
+            return f"{name} now works {count} shifts on {day}"
+        return None
+
+    def _swap_edit(self, edit):
+        return self.swap(edit["r1"], edit["r2"], _to_date(edit["date"]), edit["shift"])
+
+    def _remove_edit(self, edit):
+        return self.remove(edit["radiologist"], _to_date(edit["date"]), edit["shift"])
+
+    def _add_edit(self, edit):
+        return self.add(edit["radiologist"], _to_date(edit["date"]), edit["shift"])
+
+    def swap(self, r1: str, r2: str, day: date, shift: str) -> Optional[str]:
+        """
+        Hands (day, shift) from r1 to r2.  r2's request replaces r1's; a new
+        r2 is added (as by add_radiologist) only once the swap is accepted.
+        Returns why the swap was refused, or None once it is applied.
+        """
+        s = self.slot_of.get((day, shift))
+        if s is None:
+            return f"{day} {shift} is not in the schedule"
+        if self.final_schedule[s] != r1:
+            return f"{r1} does not hold {day} {shift}"
+        if r2 in self.name_to_idx:
+            problem = self.coverage.violation(r2, s, one_shift_per_day=False)
+            if problem:
+                return problem
+        else:
+            # new radiologists start fully available and under the default cap
+            self.add_radiologist(r2, self.index.months[s])
+
+        self._release(s)
+        self._assign(s, r2)
+
+        if r1 in self.name_to_idx:
+            self.requested_shift_map.pop((self.name_to_idx[r1], day, shift), None)
+        self.requested_shift_map[self.name_to_idx[r2], day, shift] = 1
+        return None
+
+    def remove(self, r: str, day: date, shift: str) -> Optional[str]:
+        """
+        Takes r off (day, shift), leaves it uncovered and marks r unavailable
+        there.  Returns why that was refused, or None once it is applied.
+        """
+        s = self.slot_of.get((day, shift))
+        if s is None:
+            return f"{day} {shift} is not in the schedule"
+        if self.final_schedule[s] != r:
+            return f"{r} does not hold {day} {shift}"
+
+        self._release(s)
+        self.uncovered.add(s)
+        self._uncovered_changed = True
+        if r in self.name_to_idx:
+            self.availability_matrix[self.name_to_idx[r]][s] = 0
+        return None
+
+    def add(self, r: str, day: date, shift: str) -> Optional[str]:
+        """
+        Puts r on an open (day, shift).  A radiologist the edit creates gets
+        full availability and the default cap for the slot's month; anyone
+        else is checked against the caps they have (none set = uncapped,
+        as for swap).  Returns why that was refused, or None once it is
+        applied.  Nothing (roster, availability, caps) changes for a
+        refused add.
+        """
+        s = self.slot_of.get((day, shift))
+        if s is None:
+            return f"{day} {shift} is not in the schedule"
+        holder = self.final_schedule[s]
+        if holder is not None:
+            return f"{day} {shift} is already covered by {holder}"
+
+        if r in self.name_to_idx:
+            problem = self.coverage.violation(r, s, one_shift_per_day=False)
+            if problem:
+                return problem
+            e = self.name_to_idx[r]
+        else:
+            # the cap that matters is the one for the edited slot's month
+            e = self.add_radiologist(r, self.index.months[s])
+
+        self._assign(s, r)
+        self.requested_shift_map[e, day, shift] = 1
+        return None
+
+    # ------------------------------------------------------------------ #
+    #  All-or-nothing batches
+    # ------------------------------------------------------------------ #
+    @contextmanager
+    def transaction(self):
+        """
+        Any exception inside the block puts the schedule, caps, requests,
+        availability and roster back as they were when it was entered,
+        then re-raises.  Pending results are flushed first.
+        """
+        self.result()
+        saved = (
+            list(self.final_schedule),
+            dict(self.requested_shift_map),
+            dict(self.monthly_caps),
+            len(self.employees),
+            _copy_availability(self.availability_matrix),
+        )
+        try:
+            yield self
+        except Exception:
+            self._restore(*saved)
+            raise
+
+    def _restore(self, final_schedule, requested_shift_map, monthly_caps, num_employees, availability):
+        self.final_schedule[:] = final_schedule
+        self.requested_shift_map.clear()
+        self.requested_shift_map.update(requested_shift_map)
+        self.monthly_caps.clear()
+        self.monthly_caps.update(monthly_caps)
+        for name in self.employees[num_employees:]:
+            self.assignments_by_emp.pop(name, None)
+        del self.employees[num_employees:]
+        _restore_availability(self.availability_matrix, availability)
+
+        # the derived lookups are rebuilt from the restored objects
+        self.__init__(self.final_schedule, self.assignments_by_emp, self.uncovered_slots,
+                      self.schedule_entries, self.availability_matrix, self.requested_shift_map,
+                      self.monthly_caps, self.employees, self.index)
+
+    # ------------------------------------------------------------------ #
+    #  Slot bookkeeping
+    # ------------------------------------------------------------------ #
+    def _assign(self, s: int, name: str):
+        self.final_schedule[s] = name
+        self.assigned.setdefault(name, set()).add(s)
+        self._touched.add(name)
+        self.coverage.assign(s, name)
+        if s in self.uncovered:
+            self.uncovered.discard(s)
+            self._uncovered_changed = True
+
+    def _release(self, s: int):
+        holder = self.final_schedule[s]
+        if holder is not None:
+            self.assigned[holder].discard(s)
+            self._touched.add(holder)
+        self.final_schedule[s] = None
+        self.coverage.unassign(s)
+
+    def result(self) -> Tuple[List[Optional[str]], Dict[str, List[Dict]], List[Dict]]:
+        """
+        (final_schedule, assignments_by_emp, uncovered_slots), refreshing
+        only the assignment lists (chronological) that edits touched.
+        """
+        for name in self._touched:
+            self.assignments_by_emp[name] = [self.schedule_entries[s] for s in sorted(self.assigned[name])]
+        self._touched.clear()
+        if self._uncovered_changed:
+            self.uncovered_slots[:] = [self.schedule_entries[s] for s in sorted(self.uncovered)]
+            self._uncovered_changed = False
+        return self.final_schedule, self.assignments_by_emp, self.uncovered_slots
+
+
+def describe_edit(edit: Dict) -> str:
+    """One line for an edit dict, e.g. "swap 2025-07-03 L1 Rad_1 → Rad_2"."""
+    action = edit.get("action")
+    when = f"{edit.get('date')} {edit.get('shift')}"
+    if action == "swap":
+        return f"swap {when} {edit.get('r1')} → {edit.get('r2')}"
+    return f"{action} {edit.get('radiologist')} {when}"
+
+
+def _copy_availability(availability_matrix):
+    if isinstance(availability_matrix, AvailabilityMatrix):
+        return availability_matrix.array.copy()
+    return [list(row) for row in availability_matrix]
+
+
+def _restore_availability(availability_matrix, saved):
+    """Puts a _copy_availability() snapshot back into the same object."""
+    if isinstance(availability_matrix, AvailabilityMatrix):
+        availability_matrix.truncate(len(saved))
+        availability_matrix.array[:] = saved
+    else:
+        del availability_matrix[len(saved):]
+        for row, old in zip(availability_matrix, saved):
+            row[:] = old
+
+
+# --------------------------------------------------------------------------- #
+#  Shared appliers (module functions and ScheduleState methods)
+# --------------------------------------------------------------------------- #
+def _apply_cap_updates(requests, monthly_caps, radiologist_names, availability_matrix,
+                       default_availability_length, name_to_idx):
+    for r in requests:
+        name = r["name"]
+        cap = r["new_max"]
+        month = r["month"]
+
+        if name not in name_to_idx:
+            idx = len(radiologist_names)
+            radiologist_names.append(name)
+            name_to_idx[name] = idx
+            availability_matrix.append([1] * default_availability_length)
+        else:
+            idx = name_to_idx[name]
+
+        monthly_caps[(idx, month)] = cap
+
+
+def _apply_flips(changes, availability_matrix, name_to_idx, shift_to_index):
+    for change in changes:
+        name = change["name"]
+        flips = change["flips"]
+
+        if name not in name_to_idx:
+            print(f"⚠️ Skipping unknown radiologist: {name}")
+            continue
+
+        idx = name_to_idx[name]
+        columns, values = [], []
+
+        for flip in flips:
+            try:
+                key = (_to_date(flip["date"]), flip["shift"])
+                available = flip.get("available", True)
+                shift_idx = shift_to_index.get(key)
+
+                if shift_idx is not None:
+                    columns.append(shift_idx)
+                    values.append(int(available))
+                else:
+                    print(f"⚠️ Shift not found in schedule: {key}")
+
+            except Exception as e:
+                print("❌ Error processing flip:", e)
+                continue
+
+        if isinstance(availability_matrix, AvailabilityMatrix):
+            # fancy-index write: later flips of the same slot win, as before
+            availability_matrix[idx, columns] = values
+        else:
+            for shift_idx, available in zip(columns, values):
+                availability_matrix[idx][shift_idx] = available
+
+
+def _apply_request_changes(changes, requested_shift_map, name_to_idx):
+    for change in changes:
+        name = change["name"]
+        action = change["action"]
+        shifts = change["shifts"]
+        if name not in name_to_idx:
+            continue
+        idx = name_to_idx[name]
+
+        for shift in shifts:
+            # 🛠️ Normalize date string to datetime.date
+            key = (idx, _to_date(shift["date"]), shift["shift"])
+            if action == "add":
+                requested_shift_map[key] = 1
+            elif action == "remove":
+                requested_shift_map.pop(key, None)
@@ -0,0 +1,177 @@
+"""
+availability.py – compact employee × slot availability matrix
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+from .index import ScheduleIndex
+
+
+class AvailabilityMatrix:
+    """
+    Availability (1 = available, 0 = not) for every (employee, slot) pair,
+    held in one uint8 array instead of a list of Python int lists.
+
+    Behaves like the historical list of lists, so existing callers keep
+    working unchanged:
+        len(m), m[e][s], m[e][s] = 0, m.append(row), for row in m, m[:E]
+
+    Bulk edits go through NumPy instead of per-cell loops:
+        m[e, slots] = values
+        m.fill(0, rows=[e], slots=slot_mask(index, weekdays={4, 5, 6}))
+
+    Rows grow with amortized doubling.  m[e] is a view into the buffer and
+    is only valid until the next append().  Pickles bit-packed, one bit
+    per cell, so the Streamlit session snapshot stays small.
+    """
+
+    def __init__(self, rows=(), num_slots: int | None = None):
+        data = np.array(rows, dtype=np.uint8)
+        if data.size == 0:
+            data = np.zeros((0, num_slots or 0), dtype=np.uint8)
+        if data.ndim != 2:
+            raise ValueError(f"Availability rows must all have the same length, got shape {data.shape}")
+        if num_slots is not None and data.shape[1] != num_slots:
+            raise ValueError(f"Expected {num_slots} slots per row, got {data.shape[1]}")
+        self._data = data
+        self._rows = data.shape[0]
+
+    @classmethod
+    def ones(cls, num_employees: int, num_slots: int) -> "AvailabilityMatrix":
+        return cls(np.ones((num_employees, num_slots), dtype=np.uint8), num_slots)
+
+    @classmethod
+    def coerce(cls, matrix, num_slots: int | None = None) -> "AvailabilityMatrix":
+        """*matrix* itself when it already is one, else a copy of the list of lists."""
+        if isinstance(matrix, cls):
+            return matrix
+        return cls(matrix, num_slots)
+
+    # ------------------------------------------------------------------ #
+    #  Shape + list-of-lists protocol
+    # ------------------------------------------------------------------ #
+    @property
+    def array(self) -> np.ndarray:
+        """Live (employees, slots) view of the used rows."""
+        return self._data[:self._rows]
+
+    @property
+    def num_slots(self) -> int:
+        return self._data.shape[1]
+
+    @property
+    def shape(self):
+        return self._rows, self.num_slots
+
+    def __len__(self):
+        return self._rows
+
+    def __iter__(self):
+        return iter(self.array)
+
+    def __getitem__(self, key):
+        return self.array[key]
+
+    def __setitem__(self, key, value):
+        self.array[key] = value
+
+    def __eq__(self, other):
+        if isinstance(other, AvailabilityMatrix):
+            other = other.array
+        try:
+            return np.array_equal(self.array, np.asarray(other, dtype=np.uint8))
+        except ValueError:
+            return False
+
+    __hash__ = None
+
+    def __repr__(self):
+        available = int(self.array.sum())
+        return f"AvailabilityMatrix({self._rows}×{self.num_slots}, {available} available)"
+
+    def tolist(self):
+        return self.array.tolist()
+
+    # ------------------------------------------------------------------ #
+    #  Growth + bulk updates
+    # ------------------------------------------------------------------ #
+    def append(self, row=None, fill: int = 1):
+        """
+        Adds one employee row (*row*, or *fill* everywhere).  The buffer
+        doubles when full, so n appends cost O(n) copies overall.
+        """
+        if row is not None:
+            row = np.asarray(row, dtype=np.uint8)
+            if self._rows == 0 and self._data.shape[1] == 0:
+                self._data = np.zeros((0, len(row)), dtype=np.uint8)
+            if row.shape != (self.num_slots,):
+                raise ValueError(f"Expected {self.num_slots} slots, got {row.shape[0]}")
+
+        if self._rows == self._data.shape[0]:
+            grown = np.zeros((max(4, 2 * self._rows), self.num_slots), dtype=np.uint8)
+            grown[:self._rows] = self._data[:self._rows]
+            self._data = grown
+
+        self._data[self._rows] = fill if row is None else row
+        self._rows += 1
+
+    def truncate(self, num_rows: int):
+        """Drops every row from *num_rows* on (the buffer is kept for regrowth)."""
+        self._rows = min(self._rows, max(0, num_rows))
+
+    def fill(self, value: int, rows=None, slots=None):
+        """
+        Sets every cell in rows × slots to *value* in one vectorized write.
+        *rows* / *slots* may be an index, a list of indices or a boolean
+        mask; None means all of them.
+        """
+        rows = slice(None) if rows is None else np.atleast_1d(rows)
+        slots = slice(None) if slots is None else np.atleast_1d(slots)
+        if isinstance(rows, slice) or isinstance(slots, slice):
+            self.array[rows, slots] = value
+        else:
+            self.array[np.ix_(rows, slots)] = value
+
+    def take_slots(self, slots) -> "AvailabilityMatrix":
+        """A copy restricted to *slots* (e.g. one month of the horizon)."""
+        return AvailabilityMatrix(self.array[:, np.asarray(slots, dtype=np.int64)], len(slots))
+
+    # ------------------------------------------------------------------ #
+    #  Serialization
+    # ------------------------------------------------------------------ #
+    def __getstate__(self):
+        return {"shape": self.shape, "bits": np.packbits(self.array != 0, axis=None).tobytes()}
+
+    def __setstate__(self, state):
+        rows, num_slots = state["shape"]
+        bits = np.unpackbits(np.frombuffer(state["bits"], dtype=np.uint8), count=rows * num_slots)
+        self._data = bits.reshape(rows, num_slots)
+        self._rows = rows
+
+
+def availability_array(availability_matrix, num_employees: int, num_slots: int) -> np.ndarray:
+    """
+    (≤ num_employees, num_slots) uint8 array over either an
+    AvailabilityMatrix (a view, no copy) or a plain list of lists.
+    """
+    if isinstance(availability_matrix, AvailabilityMatrix):
+        return availability_matrix.array[:num_employees, :num_slots]
+    rows = [row[:num_slots] for row in availability_matrix[:num_employees]]
+    return np.array(rows, dtype=np.uint8).reshape(len(rows), num_slots)
+
+
+def slot_mask(index: ScheduleIndex, dates=None, shifts=None, weekdays=None) -> np.ndarray:
+    """
+    Boolean mask over the slots of *index* matching every given filter:
+    *dates* (datetime.date), *shifts* ("L1" …) and *weekdays* (0=Mon … 6=Sun).
+    """
+    mask = np.ones(index.num_slots, dtype=bool)
+    if dates is not None:
+        mask &= np.isin(index.ordinals, [d.toordinal() for d in dates])
+    if shifts is not None:
+        mask &= np.isin(index.shifts, list(shifts))
+    if weekdays is not None:
+        mask &= np.isin(index.weekdays, list(weekdays))
+    return mask
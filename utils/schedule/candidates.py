@@ -0,0 +1,192 @@
+"""
+candidates.py – "who can cover this slot?" without running the solver
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .availability import AvailabilityMatrix
+from .index import ScheduleIndex
+
+
+UNCAPPED = np.iinfo(np.int32).max   # months without a cap entry are unconstrained
+
+
+@dataclass(frozen=True)
+class Candidate:
+    """One radiologist who could take a slot right now."""
+    name: str
+    index: int
+    month_load: int                 # shifts already held in the slot's month
+    remaining: Optional[int]        # cap - month_load, None when uncapped
+
+
+class CoverageIndex:
+    """
+    Eligibility of every radiologist for every slot, kept next to the
+    availability matrix:
+
+        availability   read live from the matrix (slot → available
+                       radiologists is one column), so flips need no sync
+        month load     (employee, month) counters against monthly_caps
+        day load       (employee, day) counters – one shift per day here
+        holder         current assignee per slot (-1 = uncovered)
+
+    A candidate for slot s is available for s, under their cap for s's
+    month and not yet working s's day.  Candidates are ranked by remaining
+    cap (most first), then by total load, then roster order.
+
+    Call assign() / unassign() / set_cap() / add_employee() as edits land
+    so the counters stay in step with the schedule.  *employees* and an
+    AvailabilityMatrix are shared, not copied.
+    """
+
+    def __init__(self, employees, schedule_entries, availability_matrix, monthly_caps,
+                 final_schedule=None, index: ScheduleIndex | None = None):
+        self.index = index or ScheduleIndex(schedule_entries)
+        self.employees = employees
+        self.availability = availability_matrix
+        self._name_to_idx = {name: e for e, name in enumerate(employees)}
+
+        self._months = {ym: m for m, ym in enumerate(sorted(self.index.month_to_slots))}
+        days = {d: i for i, d in enumerate(self.index.date_to_slots)}
+        self._slot_month = np.array([self._months[ym] for ym in self.index.months], dtype=np.int64)
+        self._slot_day = np.array([days[d] for d in self.index.dates], dtype=np.int64)
+
+        E = len(employees)
+        self._caps = np.full((E, len(self._months)), UNCAPPED, dtype=np.int64)
+        self._load = np.zeros((E, len(self._months)), dtype=np.int64)
+        self._day_load = np.zeros((E, len(days)), dtype=np.int64)
+        self._holder = np.full(self.index.num_slots, -1, dtype=np.int64)
+
+        for (e, ym), cap in monthly_caps.items():
+            if e < E and ym in self._months:
+                self._caps[e, self._months[ym]] = cap
+        for s, name in enumerate((final_schedule or [])[:self.index.num_slots]):
+            if name in self._name_to_idx:
+                self.assign(s, name)
+
+    # ------------------------------------------------------------------ #
+    #  Queries
+    # ------------------------------------------------------------------ #
+    def slot(self, slot) -> int:
+        """Slot number for an int, an (date, shift) pair or a {date, shift} entry."""
+        if isinstance(slot, dict):
+            slot = (slot["date"], slot["shift"])
+        if isinstance(slot, tuple):
+            return self.index.slot_of[slot]
+        return slot
+
+    def candidates(self, slot, limit: int | None = None) -> List[Candidate]:
+        """Ranked radiologists who could take *slot* without breaking a hard rule."""
+        s = self.slot(slot)
+        m, d = self._slot_month[s], self._slot_day[s]
+        E = len(self._name_to_idx)
+
+        eligible = self._available_column(s, E) != 0
+        eligible &= self._load[:E, m] < self._caps[:E, m]
+        eligible &= self._day_load[:E, d] == 0
+        emps = np.flatnonzero(eligible)
+
+        remaining = self._caps[emps, m] - self._load[emps, m]
+        order = np.lexsort((emps, self._load[emps].sum(axis=1), -remaining))
+        emps = emps[order][:limit]
+
+        return [
+            Candidate(
+                name=self.employees[e],
+                index=e,
+                month_load=int(self._load[e, m]),
+                remaining=None if self._caps[e, m] == UNCAPPED else int(self._caps[e, m] - self._load[e, m]),
+            )
+            for e in emps.tolist()
+        ]
+
+    def candidates_for(self, slots, limit: int | None = None) -> Dict[int, List[Candidate]]:
+        """{slot: ranked candidates} for many slots at once."""
+        return {self.slot(s): self.candidates(s, limit) for s in slots}
+
+    def violation(self, name: str, slot, one_shift_per_day: bool = True) -> Optional[str]:
+        """
+        Why *name* may not take *slot* (one sentence), or None when they may.
+        Whoever holds the slot now does not count against *name*'s day.
+        With *one_shift_per_day* off, a second shift that day is allowed
+        (the solver only penalizes it); see shifts_on_day().
+        """
+        e = self._name_to_idx.get(name)
+        if e is None:
+            return f"{name} is not on the roster"
+        s = self.slot(slot)
+        m, d = self._slot_month[s], self._slot_day[s]
+        if not self._available_column(s, e + 1)[e]:
+            return f"{name} is unavailable for {self.index.dates[s]} {self.index.shifts[s]}"
+        if self._holder[s] == e:
+            return f"{name} already holds {self.index.dates[s]} {self.index.shifts[s]}"
+        if self._load[e, m] >= self._caps[e, m]:
+            return f"{name} is at their monthly cap of {self._caps[e, m]}"
+        if one_shift_per_day and self._day_load[e, d]:
+            return f"{name} already works {self.index.dates[s]}"
+        return None
+
+    def shifts_on_day(self, name: str, slot) -> int:
+        """How many shifts *name* holds on *slot*'s day."""
+        e = self._name_to_idx.get(name)
+        if e is None:
+            return 0
+        return int(self._day_load[e, self._slot_day[self.slot(slot)]])
+
+    def _available_column(self, s, num_employees):
+        """Availability of the first *num_employees* for slot *s* (missing rows = 0)."""
+        column = np.zeros(num_employees, dtype=np.uint8)
+        if isinstance(self.availability, AvailabilityMatrix):
+            known = self.availability.array[:num_employees, s]
+        else:
+            known = [row[s] for row in self.availability[:num_employees]]
+        column[:len(known)] = known
+        return column
+
+    # ------------------------------------------------------------------ #
+    #  Maintenance
+    # ------------------------------------------------------------------ #
+    def assign(self, slot, name: str):
+        """Records *name* as the holder of *slot* (replacing any holder)."""
+        s = self.slot(slot)
+        self.unassign(s)
+        e = self._name_to_idx[name]
+        self._holder[s] = e
+        self._load[e, self._slot_month[s]] += 1
+        self._day_load[e, self._slot_day[s]] += 1
+
+    def unassign(self, slot):
+        s = self.slot(slot)
+        e = self._holder[s]
+        if e >= 0:
+            self._load[e, self._slot_month[s]] -= 1
+            self._day_load[e, self._slot_day[s]] -= 1
+            self._holder[s] = -1
+
+    def set_cap(self, name: str, month: str, cap: int):
+        if month in self._months:
+            self._caps[self._name_to_idx[name], self._months[month]] = cap
+
+    def add_employee(self, name: str, monthly_caps=None):
+        """
+        Registers a radiologist appended to *employees* (or appends them),
+        picking up any caps already in *monthly_caps* for their index.
+        """
+        if name not in self.employees:
+            self.employees.append(name)
+        while len(self._name_to_idx) < len(self.employees):
+            e = len(self._name_to_idx)
+            self._name_to_idx[self.employees[e]] = e
+            self._caps = np.vstack([self._caps, np.full((1, self._caps.shape[1]), UNCAPPED, dtype=np.int64)])
+            self._load = np.vstack([self._load, np.zeros((1, self._load.shape[1]), dtype=np.int64)])
+            self._day_load = np.vstack([self._day_load, np.zeros((1, self._day_load.shape[1]), dtype=np.int64)])
+            for ym, m in self._months.items():
+                cap = (monthly_caps or {}).get((e, ym))
+                if cap is not None:
+                    self._caps[e, m] = cap
@@ -0,0 +1,44 @@
+"""
+index.py – precomputed slot groupings shared by every model builder
+"""
+
+from collections import defaultdict
+
+
+class ScheduleIndex:
+    """
+    Built once per *schedule_entries* list.
+
+    Every define_* helper reads its groupings from here instead of
+    re-deriving them (and re-formatting "YYYY-MM" strings) on each call.
+
+    Per-slot arrays (parallel to schedule_entries):
+        dates, shifts, ordinals, weekdays (0=Mon … 6=Sun), months ("YYYY-MM")
+    Groupings:
+        month_to_slots   "YYYY-MM"      → [slot, ...]
+        date_to_slots    date           → [slot, ...]   (chronological)
+        slot_of          (date, shift)  → slot
+    """
+
+    def __init__(self, schedule_entries):
+        self.num_slots = len(schedule_entries)
+        self.dates = [se["date"] for se in schedule_entries]
+        self.shifts = [se["shift"] for se in schedule_entries]
+        self.ordinals = [d.toordinal() for d in self.dates]
+        self.weekdays = [d.weekday() for d in self.dates]
+
+        # one strftime-equivalent per distinct date, not per slot per cap
+        month_of_date = {d: f"{d.year:04d}-{d.month:02d}" for d in set(self.dates)}
+        self.months = [month_of_date[d] for d in self.dates]
+
+        month_to_slots = defaultdict(list)
+        date_to_slots = defaultdict(list)
+        for s, (d, ym) in enumerate(zip(self.dates, self.months)):
+            month_to_slots[ym].append(s)
+            date_to_slots[d].append(s)
+        self.month_to_slots = dict(month_to_slots)
+        self.date_to_slots = dict(sorted(date_to_slots.items()))
+
+        self.slot_of = {
+            (d, sh): s for s, (d, sh) in enumerate(zip(self.dates, self.shifts))
+        }
@@ -5,8 +5,16 @@ objective.py – weighted multi-criteria objective
 from ortools.sat.python import cp_model
 
 
+DEFAULT_WEIGHTS = {
+    "uncovered":   10_000,
+    "spacing":       800,
+    "overlap":       800,
+    "multi_shift": 1_000,
+}
+
+
 def build_objective(model: cp_model.CpModel,
-                    coverage_vars: dict,
+                    uncovered_vars: dict,
                     spacing_vars: list,
                     overlap_vars,
                     multi_shift_penalties,
@@ -16,29 +24,33 @@ def build_objective(model: cp_model.CpModel,
     Tier-1: Minimize uncovered slots
     Tier-2: Minimize clustering (spacing)
     Requests are treated as HARD constraints: must be fulfilled.
+
+    Sets the weighted objective and returns the two tiers as separate
+    expressions (uncovered, secondary) for lexicographic solving.
     """
     if weights is None:
-        weights = {
-            "uncovered":   10_000,
-            "spacing":       800,
-            "overlap":       800,
-            "multi_shift": 1_000,
-        }
-
-    # uncovered = 1 – covered
-    uncovered_vars = []
-    for s, cv in coverage_vars.items():
-        u = model.NewBoolVar(f"uncovered_s{s}")
-        model.Add(cv + u == 1)
-        uncovered_vars.append(u)
+        weights = DEFAULT_WEIGHTS
 
     # All requests treated as hard
     for var in request_penalty_vars:
         model.Add(var == 1)
 
-    model.Minimize(
-          weights["uncovered"]   * sum(uncovered_vars)
-        + weights["spacing"]     * sum(spacing_vars)
+    uncovered = sum(uncovered_vars.values())
+    secondary = (
+          weights["spacing"]     * sum(spacing_vars)
         + weights["overlap"]     * sum(overlap_vars)
         + weights["multi_shift"] * sum(multi_shift_penalties)
-    )
\ No newline at end of file
+    )
+
+    model.Minimize(weighted_objective(uncovered, secondary, weights))
+    return uncovered, secondary
+
+
+def weighted_objective(uncovered, secondary, weights=None):
+    """
+    Big-M mix of the two tiers; also used to report lexicographic results
+    on the same scale as weighted ones.
+    """
+    if weights is None:
+        weights = DEFAULT_WEIGHTS
+    return weights["uncovered"] * uncovered + secondary
@@ -1,18 +1,25 @@
 # scheduler.py  (TOP OF FILE)
 
 from __future__ import annotations
+import multiprocessing
+import os
+import threading
+import time
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 from ortools.sat.python import cp_model
 
 # ⬇️  use *relative* imports so Python sees sibling modules
 from .variables import (                       # CHANGED
-    define_assignment_vars,
-    define_coverage_vars,
     define_spacing_deviation_vars,
-    define_day_overlap_penalty,
-    define_multi_shift_penalties,
     define_requested_shift_vars
 )
-from .objective import build_objective         # CHANGED
+from .objective import build_objective, weighted_objective
+from .availability import AvailabilityMatrix
+from .index import ScheduleIndex
+from .template import base_model
+from .solver import BATCH, ScheduleResult, SolverConfig
 
 
 # --------------------------------------------------------------------------- #
@@ -23,72 +30,457 @@ def schedule_with_fallback_days_only(
     schedule_entries,                     # list[{date, shift}]
     availability_matrix,
     monthly_caps,                         # {(emp_idx,"YYYY-MM"): int}
-    requested_shift_map=None
-):
+    requested_shift_map=None,
+    hint_schedule=None,                   # previous final_schedule (warm start)
+    fixed_slots=None,                     # slots whose hinted assignee is kept
+    repair_scope=None,                    # {"dates": {...}, "radiologists": {...}}
+    neighborhood_days=1,
+    config: SolverConfig | None = None,   # defaults to the BATCH profile
+    progress_callback=None,               # fn(ScheduleResult) -> bool (True = stop)
+    stop_event: threading.Event | None = None
+) -> ScheduleResult:
     """
-    Returns (final_schedule, assignments_by_emp, uncovered_slots)
+    Returns a ScheduleResult, which unpacks as
+    (final_schedule, assignments_by_emp, uncovered_slots) and also carries
+    the solver status, objective, best bound and wall time.
 
     *final_schedule* parallels schedule_entries (value = employee name | None)
+
+    *hint_schedule* is passed to CP-SAT as a solution hint.  For every slot
+    in *fixed_slots* the hinted state is fixed outright: the hinted assignee
+    (when still available), or uncovered when the hint has no one there.
+    That shrinks re-solves after a small edit to a tiny model.  If the
+    fixed model turns out infeasible, it is re-solved with hints only.
+
+    Repair mode (*repair_scope* + *hint_schedule*): every slot is frozen –
+    assigned slots to their holder, uncovered ones as uncovered – except
+    those held by the scope's radiologists or dated within
+    *neighborhood_days* of the scope's dates, so a local repair cannot
+    reshuffle coverage on distant days.  If that neighborhood is
+    infeasible the radius doubles, ending in an unrestricted warm-started solve.
+
+    *progress_callback* receives every improving solution as a FEASIBLE
+    ScheduleResult (wall_time = seconds since the solve started).  It runs
+    on a solver thread; returning True stops the search and keeps that
+    solution.  Setting *stop_event* from any thread does the same.
+
+    With config.decompose_months a multi-month horizon is split into one
+    model per month, solved in parallel processes (see solve_by_month);
+    *progress_callback* and *stop_event* do not reach those processes.
     """
-    model = cp_model.CpModel()
-    E = len(employees)
+    index = ScheduleIndex(schedule_entries)   # shared by every define_* helper
+    config = config or BATCH
+
+    if config.decompose_months and repair_scope is None and not fixed_slots:
+        blocks = month_blocks(index)
+        if blocks:
+            return solve_by_month(employees, schedule_entries, blocks, availability_matrix,
+                                  monthly_caps, requested_shift_map or {}, config, hint_schedule)
+
+    args = (employees, schedule_entries, index, availability_matrix, monthly_caps,
+            requested_shift_map or {}, config, progress_callback, stop_event)
+    spent = 0.0
+
+    if repair_scope is not None and hint_schedule is not None:
+        for radius, frozen in repair_neighborhoods(index, hint_schedule, repair_scope, neighborhood_days):
+            result = _solve(*args, hint_schedule, frozen)
+            spent += result.wall_time
+            if result.has_solution:
+                print(f"🔧 Repaired within ±{radius} day(s), {len(frozen)} slots frozen")
+                result.wall_time = spent
+                return result
+            print(f"⚠️ Repair neighborhood ±{radius} day(s) {result.status} — growing")
+        fixed_slots = None
+
+    result = _solve(*args, hint_schedule, fixed_slots)
+    spent += result.wall_time
+
+    if fixed_slots and not result.has_solution:
+        print(f"⚠️ Fixed warm start {result.status} — re-solving with hints only")
+        result = _solve(*args, hint_schedule, None)
+        spent += result.wall_time
+
+    if not result.has_solution:
+        print(f"❌ Solver returned {result.status} — no schedule produced")
+    result.wall_time = spent
+    return result
+
+
+# --------------------------------------------------------------------------- #
+#  Repair neighborhoods  (LNS-style)
+# --------------------------------------------------------------------------- #
+def repair_neighborhoods(index, hint_schedule, repair_scope, neighborhood_days=1):
+    """
+    Yields (radius, frozen_slots) for growing neighborhoods around the scope.
+
+    A slot stays free when its hinted assignee is one of the scope's
+    radiologists or its date lies within *radius* days of a scope date;
+    every other slot is frozen, uncovered ones included.  The radius doubles until
+    the neighborhood spans the whole horizon.  When the scope names no
+    dates, the dates currently held by its radiologists seed the search.
+    """
+    radiologists = set(repair_scope.get("radiologists") or ())
+    hinted = list(hint_schedule[:index.num_slots])
+    hinted += [None] * (index.num_slots - len(hinted))
+
+    centers = {d.toordinal() for d in repair_scope.get("dates") or ()}
+    if not centers:
+        centers = {index.ordinals[s] for s, name in enumerate(hinted) if name in radiologists}
+    if not centers or not index.num_slots:
+        return
+
+    centers = sorted(centers)
+    horizon = max(index.ordinals) - min(index.ordinals)
+
+    def distance(day):
+        i = bisect_left(centers, day)
+        near = centers[max(0, i - 1):i + 1]
+        return min(abs(day - c) for c in near)
+
+    dist = [distance(o) for o in index.ordinals]
+    radius = max(0, neighborhood_days)
+    while radius < horizon:
+        frozen = [
+            s for s, name in enumerate(hinted)
+            if name not in radiologists and dist[s] > radius
+        ]
+        yield radius, frozen
+        radius = max(1, radius * 2)
+
+
+# --------------------------------------------------------------------------- #
+#  Per-month decomposition
+# --------------------------------------------------------------------------- #
+def month_blocks(index):
+    """
+    {"YYYY-MM": [slot, ...]} in month order when the horizon spans more
+    than one month, else None.
+
+    Caps are per month and overlap / multi-shift / requests per day or
+    slot, so months only interact through the spacing window that looks
+    back across a month boundary.  Decomposing drops that seam term:
+    each month's spacing chain starts fresh on its first day.
+    """
+    if len(index.month_to_slots) < 2:
+        return None
+    return {ym: index.month_to_slots[ym] for ym in sorted(index.month_to_slots)}
+
+
+def solve_by_month(employees, schedule_entries, blocks, availability_matrix, monthly_caps,
+                   requested_shift_map, config, hint_schedule=None):
+    """
+    Solves every month in *blocks* in its own process and stitches the
+    months back into one ScheduleResult over the full horizon.
+
+    Each month keeps the full time limit; the CPU cores are shared out
+    between the months that run at once.  Status is the weakest month
+    status; if any month has no solution the whole result is empty.
+    """
+    started = time.perf_counter()
+    processes = max(1, min(len(blocks), os.cpu_count() or 1))
+    month_config = config.with_options(
+        decompose_months=False,
+        num_workers=config.num_workers or max(1, (os.cpu_count() or 1) // processes),
+    )
+
+    availability = AvailabilityMatrix.coerce(availability_matrix, len(schedule_entries))
+    jobs = []
+    for ym, slots in blocks.items():
+        date_set = {schedule_entries[s]["date"] for s in slots}
+        jobs.append((
+            employees,
+            [schedule_entries[s] for s in slots],
+            availability.take_slots(slots),          # pickles bit-packed
+            {key: cap for key, cap in monthly_caps.items() if key[1] == ym},
+            {key: v for key, v in requested_shift_map.items() if key[1] in date_set},
+            month_config,
+            [hint_schedule[s] if s < len(hint_schedule) else None for s in slots]
+            if hint_schedule is not None else None,
+        ))
+
+    # "spawn": forking a process that already runs solver threads is unsafe
+    with ProcessPoolExecutor(max_workers=processes,
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        results = list(pool.map(_solve_month, jobs))
+
     S = len(schedule_entries)
+    wall_time = time.perf_counter() - started
+    statuses = [r.status for r in results]
+    model_stats = {key: sum(r.model_stats.get(key, 0) for r in results)
+                   for key in ("variables", "constraints", "proto_bytes")}
+    model_stats["months"] = len(blocks)
+
+    if not all(r.has_solution for r in results):
+        status = next(st for st in statuses if st not in ("OPTIMAL", "FEASIBLE"))
+        print(f"❌ Month decomposition: {statuses}")
+        return ScheduleResult(
+            final_schedule=[None] * S,
+            assignments_by_emp={emp: [] for emp in employees},
+            uncovered_slots=list(schedule_entries),
+            status=status,
+            wall_time=wall_time,
+            model_stats=model_stats,
+        )
+
+    final_schedule = [None] * S
+    for slots, result in zip(blocks.values(), results):
+        for s, name in zip(slots, result.final_schedule):
+            final_schedule[s] = name
+
+    assignments_by_emp = {emp: [] for emp in employees}
+    uncovered_slots = []
+    for se, name in zip(schedule_entries, final_schedule):
+        if name is None:
+            uncovered_slots.append(se)
+        else:
+            assignments_by_emp[name].append(se)
+
+    return ScheduleResult(
+        final_schedule=final_schedule,
+        assignments_by_emp=assignments_by_emp,
+        uncovered_slots=uncovered_slots,
+        status="OPTIMAL" if all(st == "OPTIMAL" for st in statuses) else "FEASIBLE",
+        objective=sum(r.objective for r in results),
+        best_bound=sum(r.best_bound for r in results),
+        wall_time=wall_time,
+        model_stats=model_stats,
+    )
+
 
-    # 1. decision vars
-    a = define_assignment_vars(E, S, model)
+def _solve_month(job):
+    """Process-pool entry point: one month, no further decomposition."""
+    employees, schedule_entries, availability, caps, requests, config, hint = job
+    return schedule_with_fallback_days_only(
+        employees, schedule_entries, availability, caps, requests,
+        hint_schedule=hint, config=config,
+    )
 
-    # ⛔ Enforce hard availability: cannot assign if unavailable
-    for (e, s), var in a.items():
-        if availability_matrix[e][s] == 0:
-            model.Add(var == 0)
+
+# --------------------------------------------------------------------------- #
+#  Model build + solve
+# --------------------------------------------------------------------------- #
+def _solve(employees, schedule_entries, index, availability_matrix, monthly_caps, requested_shift_map,
+           config, progress_callback=None, stop_event=None, hint_schedule=None, fixed_slots=None):
+    """
+    Builds and solves one CP-SAT model.  Returns a ScheduleResult.
+
+    The availability-dependent skeleton comes from the template cache
+    (see template.py); only caps, spacing, requests and hints are built here.
+    """
+    E = len(employees)
+    S = index.num_slots
+
+    # 1–2. Cached base: sparse assignment vars (hard availability), the
+    #      per-slot ExactlyOne + uncovered literal, the (employee, day)
+    #      layer with its overlap / multi-shift penalties
+    template = base_model(E, index, availability_matrix)
+    model, a, u, inter_day_overlap_penalties, multi_shift_penalties = template.instantiate()
 
     # ⛔ REMOVE unavailability penalties — no longer needed
     # p = define_unavailability_penalty_vars(availability_matrix, a, model)
 
-    c = define_coverage_vars(E, S, a, model)
-    spacing_vars = define_spacing_deviation_vars(schedule_entries, a, monthly_caps, model)
-    inter_day_overlap_penalties = define_day_overlap_penalty(schedule_entries, a, model)
-    multi_shift_penalties = define_multi_shift_penalties(schedule_entries, a, model)
-    request_penalties = define_requested_shift_vars(schedule_entries, a, requested_shift_map or {}, model)
-
-    # 2. “At-most-one” employee per slot
-    for s in range(S):
-        model.Add(sum(a[e, s] for e in range(E)) <= 1)
+    spacing_vars = define_spacing_deviation_vars(index, a, monthly_caps, model)
+    request_penalties = define_requested_shift_vars(index, a, requested_shift_map, model)
 
     # 3. Hard monthly caps
     for (e, ym), cap in monthly_caps.items():
-        slots = [
-            s for s, se in enumerate(schedule_entries)
-            if se["date"].strftime("%Y-%m") == ym
-        ]
-        model.Add(sum(a[e, s] for s in slots) <= cap)
+        slots = index.month_to_slots.get(ym, [])
+        model.Add(sum(a[e, s] for s in slots if (e, s) in a) <= cap)
 
     # 4. Objective: remove unavailability penalties since now hard
-    build_objective(model, c, spacing_vars, inter_day_overlap_penalties, multi_shift_penalties, request_penalties)
-    # 5. Solve
-    solver = cp_model.CpSolver()
-    solver.parameters.max_time_in_seconds = 30
-    status = solver.Solve(model)
-
-    # 6. Extract
-    final_schedule = []
-    for s in range(S):
-        assigned = None
-        for e in range(E):
-            if solver.BooleanValue(a[e, s]):
-                assigned = employees[e]
-                break
-        final_schedule.append(assigned)
+    uncovered, secondary = build_objective(
+        model, u, spacing_vars, inter_day_overlap_penalties, multi_shift_penalties, request_penalties
+    )
+
+    # 5. Warm start from the previous schedule
+    if hint_schedule is not None:
+        name_to_idx = {name: e for e, name in enumerate(employees)}
+        hinted = [name_to_idx.get(name) for name in hint_schedule[:S]]
+        hinted += [None] * (S - len(hinted))
+        for (e, s), var in a.items():
+            model.AddHint(var, hinted[s] == e)
+        for s, us in u.items():
+            model.AddHint(us, not (hinted[s] is not None and (hinted[s], s) in a))
+        for s in fixed_slots or ():
+            e = hinted[s]
+            if e is None:
+                model.Add(u[s] == 1)          # stays uncovered
+            elif (e, s) in a:
+                model.Add(a[e, s] == 1)
+
+    # 6. Solve
+    proto = model.Proto()
+    model_stats = {
+        "variables": len(proto.variables),
+        "constraints": len(proto.constraints),
+        "proto_bytes": proto.ByteSize(),
+    }
+    streamer = None
+    if progress_callback is not None:
+        streamer = _SolutionStreamer(progress_callback, employees, schedule_entries, template)
+
+    if config.objective_mode == "lexicographic":
+        solver, status, tiers = _solve_lexicographic(model, uncovered, secondary, config, streamer, stop_event)
+        wall_time = sum(t["wall_time"] for t in tiers.values())
+    else:
+        solver, status = _run(model, config, streamer, stop_event)
+        tiers, wall_time = {}, solver.WallTime()
+
+    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        # Nothing to read back — BooleanValue would return arbitrary values
+        return ScheduleResult(
+            final_schedule=[None] * S,
+            assignments_by_emp={emp: [] for emp in employees},
+            uncovered_slots=list(schedule_entries),
+            status=solver.StatusName(status),
+            wall_time=wall_time,
+            tiers=tiers,
+            model_stats=model_stats,
+        )
+
+    # 7. Extract
+    final_schedule, assignments_by_emp, uncovered_slots = _extract(
+        solver.ResponseProto().solution, employees, schedule_entries, template
+    )
+
+    if tiers:
+        # report on the weighted scale so both modes compare directly
+        objective = solver.Value(weighted_objective(uncovered, secondary))
+        # no tier-2 solution (or no tier 2 at all): 0 is the only safe bound
+        secondary_bound = tiers.get("secondary", {}).get("best_bound") or 0
+        best_bound = weighted_objective(tiers["uncovered"]["best_bound"], secondary_bound)
+    else:
+        objective, best_bound = solver.ObjectiveValue(), solver.BestObjectiveBound()
+
+    return ScheduleResult(
+        final_schedule=final_schedule,
+        assignments_by_emp=assignments_by_emp,
+        uncovered_slots=uncovered_slots,
+        status=solver.StatusName(status),
+        objective=objective,
+        best_bound=best_bound,
+        wall_time=wall_time,
+        tiers=tiers,
+        model_stats=model_stats,
+    )
+
+
+def _run(model, config, streamer=None, stop_event=None):
+    """Solves *model* once under *config*.  Returns (solver, status)."""
+    solver = config.make_solver()
+    finished = threading.Event()
+    if stop_event is not None:
+        threading.Thread(target=_stop_when_set, args=(stop_event, solver, finished), daemon=True).start()
+    try:
+        status = solver.Solve(model, streamer)
+    finally:
+        finished.set()
+    return solver, status
+
+
+def _solve_lexicographic(model, uncovered, secondary, config, streamer=None, stop_event=None):
+    """
+    Tier 1 minimizes uncovered slots within its own budget.  That value is
+    then fixed as a constraint, the tier-1 solution becomes the hint, and
+    tier 2 minimizes the secondary penalties.
 
+    Returns (solver, status, tiers).  If tier 2 finds nothing, or the search
+    was stopped during tier 1, the tier-1 solver is returned.  The status is
+    only OPTIMAL when both tiers were proven optimal.
+    """
+    first, second = config.tier_configs()
+
+    model.Minimize(uncovered)
+    solver, status = _run(model, first, streamer, stop_event)
+    tiers = {"uncovered": _tier_summary(solver, status)}
+    stopped = (stop_event is not None and stop_event.is_set()) or (streamer is not None and streamer.stopped)
+    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE) or stopped:
+        return solver, status, tiers
+
+    model.Add(uncovered <= round(solver.ObjectiveValue()))
+    model.ClearHints()
+    solution = solver.ResponseProto().solution
+    model.Proto().solution_hint.vars.extend(range(len(solution)))
+    model.Proto().solution_hint.values.extend(solution)
+
+    model.Minimize(secondary)
+    solver2, status2 = _run(model, second, streamer, stop_event)
+    tiers["secondary"] = _tier_summary(solver2, status2)
+    if status2 not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        return solver, cp_model.FEASIBLE, tiers
+    if status == cp_model.FEASIBLE:
+        status2 = cp_model.FEASIBLE
+    return solver2, status2, tiers
+
+
+def _tier_summary(solver, status):
+    solved = status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+    return {
+        "status": solver.StatusName(status),
+        "objective": solver.ObjectiveValue() if solved else None,
+        "best_bound": solver.BestObjectiveBound() if solved else None,
+        "wall_time": solver.WallTime(),
+    }
+
+
+def _extract(solution, employees, schedule_entries, template):
+    """
+    (final_schedule, assignments_by_emp, uncovered_slots) from a raw
+    solution vector (ResponseProto().solution or a callback's Response()).
+
+    One bulk copy into NumPy, then the template's proto-index layout picks
+    out the assignment and uncovered literals – no per-variable calls.
+    """
+    values = np.fromiter(solution, dtype=np.int64, count=len(solution))
+    chosen = values[template.a_index] == 1
+
+    assignee = np.full(len(schedule_entries), -1, dtype=np.int64)
+    assignee[template.a_slot[chosen]] = template.a_emp[chosen]
+
+    final_schedule = [employees[e] if e >= 0 else None for e in assignee.tolist()]
     assignments_by_emp = {emp: [] for emp in employees}
-    for s, assignee in zip(range(S), final_schedule):
-        if assignee is not None:
-            assignments_by_emp[assignee].append(schedule_entries[s])
+    for se, name in zip(schedule_entries, final_schedule):
+        if name is not None:
+            assignments_by_emp[name].append(se)
+
+    uncovered_slots = [schedule_entries[s] for s in np.flatnonzero(values[template.u_index]).tolist()]
+    return final_schedule, assignments_by_emp, uncovered_slots
+
+
+# --------------------------------------------------------------------------- #
+#  Streaming intermediate solutions
+# --------------------------------------------------------------------------- #
+class _SolutionStreamer(cp_model.CpSolverSolutionCallback):
+    """
+    Hands every improving solution to *on_solution* as a ScheduleResult.
+    In lexicographic mode the objective is that of the tier being solved.
+    """
+
+    def __init__(self, on_solution, employees, schedule_entries, template):
+        super().__init__()
+        self._on_solution = on_solution
+        self._args = (employees, schedule_entries, template)
+        self.stopped = False
+
+    def on_solution_callback(self):
+        final_schedule, assignments_by_emp, uncovered_slots = _extract(self.Response().solution, *self._args)
+        progress = ScheduleResult(
+            final_schedule=final_schedule,
+            assignments_by_emp=assignments_by_emp,
+            uncovered_slots=uncovered_slots,
+            status="FEASIBLE",
+            objective=self.ObjectiveValue(),
+            best_bound=self.BestObjectiveBound(),
+            wall_time=self.WallTime(),
+        )
+        if self._on_solution(progress):
+            self.stopped = True
+            self.StopSearch()
 
-    uncovered_slots = [
-        schedule_entries[s]
-        for s in range(S)
-        if solver.BooleanValue(c[s]) == 0
-    ]
 
-    return final_schedule, assignments_by_emp, uncovered_slots
\ No newline at end of file
+def _stop_when_set(stop_event, solver, finished, poll_seconds=0.05):
+    """Watcher thread: stop *solver* once *stop_event* fires."""
+    while not finished.wait(poll_seconds):
+        if stop_event.is_set():
+            solver.StopSearch()
+            return
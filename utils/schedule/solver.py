@@ -0,0 +1,114 @@
+"""
+solver.py – CP-SAT solver profiles and the typed schedule result
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Tuple
+
+from ortools.sat.python import cp_model
+
+
+# --------------------------------------------------------------------------- #
+#  Solver configuration
+# --------------------------------------------------------------------------- #
+@dataclass(frozen=True)
+class SolverConfig:
+    """
+    Knobs handed to CpSolver.parameters for one solve.
+
+    num_workers         – parallel search workers; 0 = one per available core
+    relative_gap_limit  – stop once (objective - bound) / objective ≤ this
+    random_seed         – fixes the search seed (combine with num_workers=1
+                          for bit-for-bit reproducible runs)
+    objective_mode      – "weighted": one big-M objective over all tiers
+                          "lexicographic": minimize uncovered slots first, fix
+                          that value, then minimize the secondary penalties
+    tier_time_limits    – (uncovered, secondary) seconds in lexicographic
+                          mode; None splits max_time_in_seconds evenly
+    decompose_months    – multi-month horizons are solved one model per
+                          month in a process pool (each month gets the full
+                          time limit) and stitched back together
+    """
+    max_time_in_seconds: float = 30.0
+    num_workers: int = 0
+    relative_gap_limit: float = 0.0
+    random_seed: Optional[int] = None
+    log_search_progress: bool = False
+    objective_mode: str = "weighted"
+    tier_time_limits: Optional[Tuple[float, float]] = None
+    decompose_months: bool = False
+
+    def with_options(self, **changes) -> "SolverConfig":
+        return replace(self, **changes)
+
+    def make_solver(self) -> cp_model.CpSolver:
+        solver = cp_model.CpSolver()
+        params = solver.parameters
+        params.max_time_in_seconds = self.max_time_in_seconds
+        params.num_workers = self.num_workers or os.cpu_count() or 1
+        if self.relative_gap_limit:
+            params.relative_gap_limit = self.relative_gap_limit
+        if self.random_seed is not None:
+            params.random_seed = self.random_seed
+        params.log_search_progress = self.log_search_progress
+        return solver
+
+    def tier_configs(self) -> Tuple["SolverConfig", "SolverConfig"]:
+        """Per-tier configs for lexicographic mode."""
+        first, second = self.tier_time_limits or (self.max_time_in_seconds / 2,) * 2
+        return (self.with_options(max_time_in_seconds=first),
+                self.with_options(max_time_in_seconds=second))
+
+
+# Step 2 notes: answer quickly, accept a near-optimal schedule
+INTERACTIVE = SolverConfig(max_time_in_seconds=5.0, relative_gap_limit=0.02)
+
+# Initial "Create Schedule" run: full budget, prove as much as possible
+BATCH = SolverConfig(max_time_in_seconds=30.0)
+
+
+# --------------------------------------------------------------------------- #
+#  Typed result
+# --------------------------------------------------------------------------- #
+@dataclass
+class ScheduleResult:
+    """
+    Outcome of one scheduling call.
+
+    Unpacks like the historical 3-tuple:
+        final_schedule, assignments_by_emp, uncovered_slots = result
+
+    When the solver found no solution (INFEASIBLE / UNKNOWN / MODEL_INVALID)
+    the schedule is empty and every slot is reported uncovered.
+
+    *tiers* is filled in lexicographic mode: per tier ("uncovered",
+    "secondary") its status, objective, best bound and wall time.
+    *model_stats* holds the size of the solved model (variables,
+    constraints, proto_bytes).
+    """
+    final_schedule: List[Optional[str]]
+    assignments_by_emp: Dict[str, List[dict]]
+    uncovered_slots: List[dict]
+    status: str = "UNKNOWN"
+    objective: Optional[float] = None
+    best_bound: Optional[float] = None
+    wall_time: float = 0.0
+    tiers: Dict[str, dict] = field(default_factory=dict)
+    model_stats: Dict[str, int] = field(default_factory=dict)
+
+    def __iter__(self):
+        return iter((self.final_schedule, self.assignments_by_emp, self.uncovered_slots))
+
+    @property
+    def has_solution(self) -> bool:
+        return self.status in ("OPTIMAL", "FEASIBLE")
+
+    @property
+    def gap(self) -> Optional[float]:
+        """Relative optimality gap, or None without a solution."""
+        if self.objective is None or self.best_bound is None:
+            return None
+        return abs(self.objective - self.best_bound) / max(1.0, abs(self.objective))
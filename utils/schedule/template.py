@@ -0,0 +1,121 @@
+"""
+template.py – cached base models keyed on schedule shape
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from ortools.sat.python import cp_model
+
+from .availability import availability_array
+from .index import ScheduleIndex
+from .variables import (
+    define_assignment_vars,
+    define_uncovered_vars,
+    define_day_work_vars,
+    define_day_overlap_penalty,
+    define_multi_shift_penalties,
+)
+
+
+TEMPLATE_CACHE_SIZE = 8
+
+_templates = OrderedDict()          # fingerprint → BaseModel (LRU order)
+_lock = threading.Lock()            # streaming solves run on worker threads
+
+
+# --------------------------------------------------------------------------- #
+#  Fingerprint
+# --------------------------------------------------------------------------- #
+def fingerprint(num_employees: int, index: ScheduleIndex, availability_matrix) -> str:
+    """
+    Hash of everything the base model depends on: the (date, shift) slots,
+    the roster size and which (employee, slot) pairs are available.
+
+    Caps, requests and hints are NOT part of it – they are added per solve.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((num_employees, index.ordinals, index.shifts)).encode())
+    h.update((availability_array(availability_matrix, num_employees, index.num_slots) != 0).tobytes())
+    return h.hexdigest()
+
+
+# --------------------------------------------------------------------------- #
+#  Base model
+# --------------------------------------------------------------------------- #
+class BaseModel:
+    """
+    The availability-dependent skeleton of a schedule model:
+
+        assignment vars, per-slot ExactlyOne + uncovered literal,
+        the (employee, day) layer, overlap and multi-shift penalties
+
+    Built once, then *instantiate()* hands out an independent clone with
+    fresh variable handles so each solve can add its own deltas (caps,
+    spacing, requests, objective, hints, fixed slots).
+
+    Proto-index layout for bulk solution reads (clones keep the indices):
+        a_emp, a_slot, a_index   one entry per assignment var
+        u_index                  uncovered literal per slot
+    """
+
+    def __init__(self, num_employees: int, index: ScheduleIndex, availability_matrix):
+        model = cp_model.CpModel()
+        a = define_assignment_vars(num_employees, index, availability_matrix, model)
+        u = define_uncovered_vars(index, a, model)
+        day_work = define_day_work_vars(index, a, model)
+        overlap = define_day_overlap_penalty(index, day_work, model)
+        multi = define_multi_shift_penalties(index, day_work, model)
+
+        self.model = model
+        # proto indices, so handles can be rebuilt on a clone
+        self._a = {key: var.Index() for key, var in a.items()}
+        self._u = {s: var.Index() for s, var in u.items()}
+        self._overlap = [var.Index() for var in overlap]
+        self._multi = [var.Index() for var in multi]
+
+        self.a_emp = np.fromiter((e for e, _ in self._a), dtype=np.int64, count=len(self._a))
+        self.a_slot = np.fromiter((s for _, s in self._a), dtype=np.int64, count=len(self._a))
+        self.a_index = np.fromiter(self._a.values(), dtype=np.int64, count=len(self._a))
+        self.u_index = np.array([self._u[s] for s in range(index.num_slots)], dtype=np.int64)
+
+    def instantiate(self):
+        """
+        Returns (model, a, u, overlap_vars, multi_shift_penalties) on a
+        fresh clone of the base model.
+        """
+        model = self.model.clone()
+        var = model.GetBoolVarFromProtoIndex
+        a = {key: var(i) for key, i in self._a.items()}
+        u = {s: var(i) for s, i in self._u.items()}
+        overlap = [var(i) for i in self._overlap]
+        multi = [var(i) for i in self._multi]
+        return model, a, u, overlap, multi
+
+
+def base_model(num_employees: int, index: ScheduleIndex, availability_matrix) -> BaseModel:
+    """
+    Cached BaseModel for this shape.  Only a change to the slots, the
+    roster size or availability itself (e.g. an availability flip) builds
+    a new one.
+    """
+    key = fingerprint(num_employees, index, availability_matrix)
+    with _lock:
+        template = _templates.get(key)
+        if template is not None:
+            _templates.move_to_end(key)
+            return template
+
+    template = BaseModel(num_employees, index, availability_matrix)
+    with _lock:
+        _templates[key] = template
+        while len(_templates) > TEMPLATE_CACHE_SIZE:
+            _templates.popitem(last=False)
+    return template
+
+
+def clear_template_cache():
+    with _lock:
+        _templates.clear()
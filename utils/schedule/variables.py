@@ -2,25 +2,46 @@
 variables.py – decision-variable helpers
 """
 
+from collections import defaultdict
+
+import numpy as np
 from ortools.sat.python import cp_model
 
+from .availability import availability_array
+from .index import ScheduleIndex
+
 
 # --------------------------------------------------------------------------- #
 #  Primary assignment variables
 # --------------------------------------------------------------------------- #
 def define_assignment_vars(num_employees: int,
-                           num_slots: int,
+                           index: ScheduleIndex,
+                           availability_matrix,
                            model: cp_model.CpModel):
     """
     BoolVar (e,s) == 1  ⇢  employee *e* is assigned to slot *s*
+
+    Sparse: a variable only exists where availability_matrix[e][s] == 1,
+    so unavailable pairs never reach the model (no `var == 0` pinning).
     """
+    available = availability_array(availability_matrix, num_employees, index.num_slots)
+    emps, slots = np.nonzero(available)            # row-major: same order as e, s loops
     return {
         (e, s): model.NewBoolVar(f"a_e{e}_s{s}")
-        for e in range(num_employees)
-        for s in range(num_slots)
+        for e, s in zip(emps.tolist(), slots.tolist())
     }
 
 
+def group_vars_by_slot(assignment_vars):
+    """
+    {slot: [var, ...]} over the sparse assignment map.
+    """
+    by_slot = defaultdict(list)
+    for (_, s), var in assignment_vars.items():
+        by_slot[s].append(var)
+    return by_slot
+
+
 # --------------------------------------------------------------------------- #
 #  Penalty for assigning on a declared-unavailable slot
 # --------------------------------------------------------------------------- #
@@ -40,170 +61,211 @@ def define_unavailability_penalty_vars(availability_matrix,
 
 
 # --------------------------------------------------------------------------- #
-#  NEW: coverage indicator  (anyone assigned to slot s?)
+#  Slot model: exactly one of (assignees…, uncovered) per slot
 # --------------------------------------------------------------------------- #
-def define_coverage_vars(num_employees: int,
-                         num_slots: int,
-                         assignment_vars,
-                         model: cp_model.CpModel):
-    coverage = {}
-    for s in range(num_slots):
-        c = model.NewBoolVar(f"covered_s{s}")
-        model.Add(sum(assignment_vars[e, s] for e in range(num_employees)) == c)
-        coverage[s] = c
-    return coverage
+def define_uncovered_vars(index: ScheduleIndex,
+                          assignment_vars,
+                          model: cp_model.CpModel):
+    """
+    {slot: BoolVar} – true when nobody covers the slot.
+
+    One ExactlyOne([a[e,s]…, uncovered_s]) per slot replaces the old
+    coverage var, the "at most one" row and the covered + uncovered == 1
+    link.  "Covered" is simply uncovered_s.Not().
+    """
+    by_slot = group_vars_by_slot(assignment_vars)
+    uncovered = {}
+    for s in range(index.num_slots):
+        u = model.NewBoolVar(f"uncovered_s{s}")
+        model.AddExactlyOne(by_slot.get(s, []) + [u])
+        uncovered[s] = u
+    return uncovered
 
 
 # --------------------------------------------------------------------------- #
 #  NEW: cluster (spacing) penalty  – minimise back-to-back shifts
 # --------------------------------------------------------------------------- #
-def define_spacing_deviation_vars(schedule_entries,
+def define_spacing_deviation_vars(index: ScheduleIndex,
                                    assignment_vars,
                                    monthly_caps,
                                    model):
     """
     For each employee, penalize deviations from ideal spacing.
     This is softer and more general than fixed cluster windows.
+
+    Linear-size encoding: each employee gets a running shift count over the
+    days they can work (one IntVar per day), and every such day carries one
+    window constraint  load(d-gap, d] <= 1 + z_d.  z_d is the number of
+    shifts crowding the window, so the model grows with slots per employee
+    rather than with pairs of slots.  Days are real ordinals, so windows
+    reach back across a month boundary.
     """
-    from collections import defaultdict
+    from bisect import bisect_right
 
-    dates = [se["date"] for se in schedule_entries]
-    emp_to_slots = defaultdict(list)
-    num_employees = max(e for e, _ in assignment_vars) + 1
+    ordinals = index.ordinals
+    months = index.months
 
-    for e in range(num_employees):
-        for s in range(len(schedule_entries)):
-            emp_to_slots[e].append((s, dates[s]))
+    # employee -> {day ordinal: [assignment vars that day]}
+    emp_day_vars = defaultdict(lambda: defaultdict(list))
+    day_to_month = {}
+    for (e, s), var in assignment_vars.items():
+        emp_day_vars[e][ordinals[s]].append(var)
+        day_to_month[ordinals[s]] = months[s]
+
+    # employee -> {"YYYY-MM": [day ordinals]}
+    emp_month_days = defaultdict(lambda: defaultdict(list))
+    for e, day_vars in emp_day_vars.items():
+        for d in sorted(day_vars):
+            emp_month_days[e][day_to_month[d]].append(d)
+
+    prefix_cache = {}
+
+    def running_load(e):
+        """Running shift count for employee e, one IntVar per workable day."""
+        if e not in prefix_cache:
+            days = sorted(emp_day_vars[e])
+            prefix, totals = [], []
+            for i, d in enumerate(days):
+                todays = emp_day_vars[e][d]
+                totals.append((totals[i - 1] if i else 0) + len(todays))
+                p = model.NewIntVar(0, totals[i], f"load_e{e}_d{d}")
+                model.Add(p == (prefix[i - 1] if i else 0) + sum(todays))
+                prefix.append(p)
+            prefix_cache[e] = (days, prefix, totals)
+        return prefix_cache[e]
 
     deviation_penalties = []
     for (e, ym), cap in monthly_caps.items():
-        # Only slots within this month
-        slots_this_month = [(s, d) for s, d in emp_to_slots[e]
-                            if d.strftime("%Y-%m") == ym]
         if cap <= 1:
             continue  # can't space 1 shift
 
-        slots_this_month = [
-            (i, s["date"].month * 31 + s["date"].day)
-            for i, s in enumerate(schedule_entries)
-            if s["date"].strftime("%Y-%m") == ym
-            and (e, i) in assignment_vars
-        ]
-
-        if not slots_this_month:
+        month_days = emp_month_days.get(e, {}).get(ym)
+        if not month_days:
             continue  # skip if no assignments possible for this employee-month
-        
+
         # Ideal spacing (in days)
-        first = min(d for _, d in slots_this_month)
-        last = max(d for _, d in slots_this_month)
-        span = (last - first) + 1
+        span = (month_days[-1] - month_days[0]) + 1
         ideal_gap = span // max(1, cap - 1)
+        if ideal_gap < 1:
+            continue
 
-        # Penalize too-small gaps between any two assigned shifts
-        for i in range(len(slots_this_month)):
-            for j in range(i + 1, len(slots_this_month)):
-                s1, d1 = slots_this_month[i]
-                s2, d2 = slots_this_month[j]
-                gap_days = abs(d2 - d1)  # ✅ both are integers
-
-                # Create penalty var if gap is smaller than ideal
-                if gap_days < ideal_gap:
-                    z = model.NewBoolVar(f"gap_e{e}_s{s1}_s{s2}")
-                    model.AddBoolAnd([assignment_vars[e, s1],
-                                      assignment_vars[e, s2]]).OnlyEnforceIf(z)
-                    model.AddBoolOr([assignment_vars[e, s1].Not(),
-                                     assignment_vars[e, s2].Not()]).OnlyEnforceIf(z.Not())
-                    deviation_penalties.append(z)
+        days, prefix, totals = running_load(e)
+        for d in month_days:
+            i = bisect_right(days, d) - 1
+            j = bisect_right(days, d - ideal_gap) - 1  # last day outside window
+            if j >= 0:
+                window, room = prefix[i] - prefix[j], totals[i] - totals[j]
+            else:
+                window, room = prefix[i], totals[i]
+            if room <= 1:
+                continue  # window can never hold two shifts
+            z = model.NewIntVar(0, room - 1, f"gap_e{e}_d{d}")
+            model.Add(window <= 1 + z)
+            deviation_penalties.append(z)
 
     return deviation_penalties
 
-def define_day_overlap_penalty(schedule_entries,
-                                assignment_vars,
-                                model):
-    from collections import defaultdict
+def group_vars_by_emp_day(index: ScheduleIndex, assignment_vars):
+    """
+    {(employee, date): [var, ...]} over the sparse assignment map.
+    """
+    by_emp_day = defaultdict(list)
+    for (e, s), var in assignment_vars.items():
+        by_emp_day[e, index.dates[s]].append(var)
+    return by_emp_day
 
-    # Step 1: Group slot indices by date (regardless of shift)
-    date_to_slots = defaultdict(list)
-    for s, se in enumerate(schedule_entries):
-        date_to_slots[se["date"]].append(s)
 
-    num_employees = max(e for e, _ in assignment_vars) + 1
-    overlap_vars = []
+# --------------------------------------------------------------------------- #
+#  Shared per-(employee, day) layer
+# --------------------------------------------------------------------------- #
+def define_day_work_vars(index: ScheduleIndex,
+                         assignment_vars,
+                         model: cp_model.CpModel):
+    """
+    {(employee, date): (works, shift_vars)}  – one entry per workable day.
 
-    for d, slots_on_day in date_to_slots.items():
-        working_today_flags = []  # ⬅️ keep separate from the slot list
+    *works* is true when the employee holds any shift that day.  With a
+    single workable slot it is that slot's own literal; otherwise one
+    BoolVar with  sum(shifts) ≤ n·works.  Every consumer only penalizes
+    *works*, so minimization keeps it tight without the reverse direction.
+    """
+    day_work = {}
+    for (e, d), shift_vars in group_vars_by_emp_day(index, assignment_vars).items():
+        if len(shift_vars) == 1:
+            works = shift_vars[0]
+        else:
+            works = model.NewBoolVar(f"works_{d}_e{e}")
+            model.Add(sum(shift_vars) <= len(shift_vars) * works)
+        day_work[e, d] = (works, shift_vars)
+    return day_work
 
-        # For each employee: are they working *any* shift that day?
-        for e in range(num_employees):
-            flags = [assignment_vars[e, s] for s in slots_on_day]
-            if not flags:
-                continue
-            is_working_today = model.NewBoolVar(f"works_{d}_e{e}")
-            model.AddMaxEquality(is_working_today, flags)
-            working_today_flags.append(is_working_today)
 
-        # Sum employees working this day
-        count = model.NewIntVar(0, num_employees, f"workers_on_{d}")
-        model.Add(count == sum(working_today_flags))
+def define_day_overlap_penalty(index: ScheduleIndex,
+                                day_work,
+                                model):
+    """
+    One BoolVar per date that fires when 2+ employees work that day:
+        sum(works) ≤ 1 + (k-1)·overlap
+    Dates with at most one possible worker get no penalty at all.
+    """
+    date_to_works = defaultdict(list)
+    for (e, d), (works, _) in day_work.items():
+        date_to_works[d].append(works)
+
+    overlap_vars = []
+    for d in index.date_to_slots:
+        working_today_flags = date_to_works.get(d, [])
+        k = len(working_today_flags)
+        if k <= 1:
+            continue
 
-        # Penalize if >1 employee is scheduled that day
         overlap_penalty = model.NewBoolVar(f"overlap_day_{d}")
-        model.Add(count > 1).OnlyEnforceIf(overlap_penalty)
-        model.Add(count <= 1).OnlyEnforceIf(overlap_penalty.Not())
+        model.Add(sum(working_today_flags) <= 1 + (k - 1) * overlap_penalty)
         overlap_vars.append(overlap_penalty)
 
     return overlap_vars
 
-def define_multi_shift_penalties(schedule_entries,
-                                  assignment_vars,
+def define_multi_shift_penalties(index: ScheduleIndex,
+                                  day_work,
                                   model):
     """
     For each (employee, date), add a BoolVar that fires if they are assigned
     to 2+ shifts that day. Used as a soft penalty.
+        sum(shifts) ≤ 1 + (n-1)·penalty
     """
-    from collections import defaultdict
-
-    num_employees = max(e for e, _ in assignment_vars) + 1
-    emp_date_to_slots = defaultdict(list)
-
-    for (e, s), var in assignment_vars.items():
-        d = schedule_entries[s]["date"]
-        emp_date_to_slots[(e, d)].append(var)
-
     multi_shift_penalties = []
-    for (e, d), shift_vars in emp_date_to_slots.items():
-        if len(shift_vars) <= 1:
+    for (e, d), (_, shift_vars) in day_work.items():
+        n = len(shift_vars)
+        if n <= 1:
             continue
 
-        count = model.NewIntVar(0, len(shift_vars), f"num_shifts_e{e}_{d}")
-        model.Add(count == sum(shift_vars))
-
-        # Penalize if count > 1
         penalty = model.NewBoolVar(f"multi_shift_e{e}_{d}")
-        model.Add(count > 1).OnlyEnforceIf(penalty)
-        model.Add(count <= 1).OnlyEnforceIf(penalty.Not())
+        model.Add(sum(shift_vars) <= 1 + (n - 1) * penalty)
         multi_shift_penalties.append(penalty)
 
     return multi_shift_penalties
 
-def define_requested_shift_vars(schedule_entries, assignment_vars, requested_map, model):
+def define_requested_shift_vars(index: ScheduleIndex, assignment_vars, requested_map, model):
     request_penalties = []
 
     # First, group requests by (date, shift)
-    from collections import defaultdict
     request_groups = defaultdict(list)
     for (e, d, sh), val in requested_map.items():
         if val:
             request_groups[(d, sh)].append(e)
 
-    for idx, se in enumerate(schedule_entries):
-        d = se["date"]
-        sh = se["shift"]
-        key = (d, sh)
-        if key not in request_groups:
+    for (d, sh), requesters in request_groups.items():
+        idx = index.slot_of.get((d, sh))
+        if idx is None:
             continue
 
-        requesters = request_groups[key]
+        # Requests on slots the employee is unavailable for have no variable
+        missing = [e for e in requesters if (e, idx) not in assignment_vars]
+        for e in missing:
+            print(f"⚠️ Ignoring request on unavailable slot: e{e} {d} {sh}")
+        requesters = [e for e in requesters if (e, idx) in assignment_vars]
+        if not requesters:
+            continue
 
         if len(requesters) == 1:
             # Hard constraint: exactly one requester, must be assigned